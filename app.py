@@ -1,21 +1,50 @@
 import os
+import copy
+import atexit
+import hmac
+import math
 import json
 import re
-import unicodedata
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
-# ============== OpenAI (để hiểu intent & “mượt hóa” câu trả lời) ==============
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+from catalog import BASE_DIR, CatalogManager
+from text_norm import fold_case, normalize_text
+import indexes  # noqa: F401  (đăng ký toàn bộ index catalog)
+from fulltext import search_products_fulltext
+from ngram_search import search_ngram
+from fuzzy_lookup import find_similar_products
+from inline_search import PRODUCT_HITS, code_from_result_id, record_product_hit, search_inline
+from openai_usage import USAGE
+from telegram_sender import TelegramSender
+from bot_store import BotStore
+from broadcast import BroadcastRunner
+from scheduler import ReminderScheduler, format_due, parse_when
+from canned import format_canned_stats, menu_commands, record_canned_hit
+from chat_context import ContextStore
+from singleflight import SingleFlight
+from speculation import SpeculationStats, SpeculativeLookups
+from profiling import MODES as PROFILE_MODES, Profiler, parse_profile_command
+from keyword_flags import KeywordMatcher, keyword_flags
+from pricing import describe_range, format_vnd, parse_price_range, wants_combo
+from compliance import (
+    format_claim_stats,
+    format_rule_stats,
+    match_force_upline,
+    record_claim_hits,
+    record_rule_hits,
+)
 
 # ============== ENV ==============
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
+# Đổi được để chạy với Telegram giả lập khi bench / test nội bộ
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 # Hotline, link điều hướng, tuyến trên
@@ -41,77 +70,53 @@ LOG_SHEET_WEBHOOK_URL = os.getenv("LOG_SHEET_WEBHOOK_URL", "")
 if not TELEGRAM_TOKEN:
     raise ValueError("Thiếu TELEGRAM_TOKEN trong .env")
 
-# ============== OpenAI CLIENT ==============
-client = None
-if OpenAI and OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+# ============== OpenAI CLIENT (để hiểu intent & “mượt hóa” câu trả lời) ==============
+# Import openai (kéo theo pydantic, httpx) tốn vài trăm ms, nên chỉ tạo client
+# khi cần lần đầu hoặc trong thread warm-up, không chặn Flask mở port.
+_openai_client = None
+_openai_unavailable = False
+_openai_lock = threading.Lock()
+
+
+# Lượt gọi OpenAI giống hệt nhau đang chạy cùng lúc chỉ gọi 1 lần (singleflight.py),
+# lượt chờ quá OPENAI_FLIGHT_WAIT giây thì tự gọi riêng.
+OPENAI_FLIGHT_WAIT = float(os.getenv("OPENAI_FLIGHT_WAIT", "20") or 20)
+OPENAI_FLIGHT = SingleFlight(wait_timeout=OPENAI_FLIGHT_WAIT)
+
+
+def get_openai_client():
+    global _openai_client, _openai_unavailable
+    if _openai_client is not None or _openai_unavailable or not OPENAI_API_KEY:
+        return _openai_client
+    with _openai_lock:
+        if _openai_client is None and not _openai_unavailable:
+            try:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+            except ImportError:
+                print("[WARN] Chưa cài thư viện openai, dùng fallback keyword.")
+                _openai_unavailable = True
+    return _openai_client
 
 # ============== FLASK APP ==============
 app = Flask(__name__)
 
-# ============== ĐƯỜNG DẪN JSON ==============
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PRODUCTS_PATH = os.path.join(BASE_DIR, "products.json")
-COMBOS_PATH = os.path.join(BASE_DIR, "combos.json")
-FAQ_BUY_PATH = os.path.join(BASE_DIR, "faq_buy.json")
-FAQ_PAYMENT_PATH = os.path.join(BASE_DIR, "faq_payment.json")
-FAQ_BUSINESS_PATH = os.path.join(BASE_DIR, "faq_business.json")
-
-# 2 file mới:
-HEALTH_TAGS_MAP_PATH = os.path.join(BASE_DIR, "health_tags_map.json")
-SYNONYMS_PATH = os.path.join(BASE_DIR, "synonyms.json")
-
-# ============== TẢI DỮ LIỆU JSON ==============
-def safe_load_json(path, default=None):
-    if default is None:
-        default = {}
-    try:
-        if not os.path.exists(path):
-            return default
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"[WARN] Không đọc được JSON {path}: {e}")
-        return default
-
-
-def extract_list(data, key=None):
-    """
-    combos.json: { "combos": [ ... ] }
-    products.json: { "products": [ ... ] }
-    """
-    if isinstance(data, list):
-        return data
-    if isinstance(data, dict) and key and isinstance(data.get(key), list):
-        return data[key]
-    return []
-
+# ============== CATALOG (products, combos, faq, synonyms...) ==============
+# Dữ liệu nằm trong snapshot bất biến, reload bằng /reload (tuyến trên)
+# hoặc tự động khi file JSON đổi (CATALOG_WATCH_INTERVAL giây, 0 = tắt).
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "0") or 0)
+# Artifact do `python compile_catalog.py` build lúc deploy; production bắt buộc có,
+# dev thiếu / cũ hơn JSON thì đọc thẳng JSON.
+CATALOG_ARTIFACT = os.getenv("CATALOG_ARTIFACT", os.path.join(BASE_DIR, "catalog.bin"))
+APP_ENV = os.getenv("APP_ENV", "dev")
 
-# đọc dữ liệu thật sự dùng
-combos_raw = safe_load_json(COMBOS_PATH, default={"combos": []})
-products_raw = safe_load_json(PRODUCTS_PATH, default={"products": []})
-faq_buy_data = safe_load_json(FAQ_BUY_PATH, default=[])
-faq_payment_data = safe_load_json(FAQ_PAYMENT_PATH, default=[])
-faq_business_data = safe_load_json(FAQ_BUSINESS_PATH, default=[])
+CATALOG = CatalogManager(BASE_DIR, artifact_path=CATALOG_ARTIFACT, dev_mode=APP_ENV != "production")
 
-combos_list = extract_list(combos_raw, "combos")
-products_list = extract_list(products_raw, "products")
 
-# 2 file mới
-health_tags_map_data = safe_load_json(HEALTH_TAGS_MAP_PATH, default={})
-synonyms_data = safe_load_json(SYNONYMS_PATH, default={})
+def get_catalog():
+    return CATALOG.current()
 
 # ============== HÀM TIỆN ÍCH CHUNG ==============
-def normalize_text(text: str) -> str:
-    if not text:
-        return ""
-    text = text.lower().strip()
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    return text
-
-
 def strip_markdown(text: str) -> str:
     """
     Loại bỏ các ký hiệu markdown đơn giản như **bold**, *italic* trong chuỗi.
@@ -129,21 +134,20 @@ def text_contains(text: str, keyword: str) -> bool:
     return normalize_text(keyword) in normalize_text(text)
 
 
-def send_telegram_message(chat_id, text, reply_to_message_id=None, parse_mode="HTML"):
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": parse_mode,
-        "disable_web_page_preview": False,
-    }
-    if reply_to_message_id:
-        payload["reply_to_message_id"] = reply_to_message_id
+# Mọi tin gửi đi qua 1 sender chung: giới hạn TELEGRAM_RATE tin/giây, tự chờ khi bị 429.
+# Limiter nằm trong từng process: gunicorn nhiều worker thì chia đều ngân sách cho các worker
+# (chạy nhiều node sau ingress thì đặt TELEGRAM_RATE của mỗi node = 30 / số node).
+# BOT_ROLE=node: gunicorn.conf.py ép 1 worker bất kể WEB_CONCURRENCY
+WEB_WORKERS = 1 if os.getenv("BOT_ROLE") == "node" else max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", "30") or 30) / WEB_WORKERS
+SENDER = TelegramSender(TELEGRAM_API_BASE, TELEGRAM_TOKEN, rate=TELEGRAM_RATE)
 
+
+def send_telegram_message(chat_id, text, reply_to_message_id=None, parse_mode="HTML"):
     try:
-        resp = requests.post(url, json=payload, timeout=15)
-        if resp.status_code != 200:
-            print("[ERROR] Telegram sendMessage:", resp.text)
+        res = SENDER.send_message(chat_id, text, parse_mode=parse_mode, reply_to_message_id=reply_to_message_id)
+        if not res.ok:
+            print("[ERROR] Telegram sendMessage:", res.status, res.error)
     except Exception as e:
         print("[ERROR] Gửi tin nhắn Telegram lỗi:", e)
 
@@ -239,17 +243,11 @@ def apply_synonyms(text: str) -> str:
     Thay thế các cụm từ theo synonyms.json (bao tử -> dạ dày, v.v.)
     Không phá vỡ nội dung, chỉ chuẩn hóa cách gọi.
     """
-    if not text or not isinstance(synonyms_data, dict):
+    if not text:
         return text
     result = text
-    for k, v in synonyms_data.items():
-        if not k or not v:
-            continue
-        try:
-            pattern = re.compile(re.escape(k), flags=re.IGNORECASE)
-            result = pattern.sub(v, result)
-        except re.error:
-            continue
+    for pattern, v in get_catalog().index("synonyms") or ():
+        result = pattern.sub(v, result)
     return result
 
 
@@ -272,22 +270,12 @@ def expand_health_issue(health_issue: str):
 
     try:
         h_norm = normalize_text(base)
-        if isinstance(health_tags_map_data, dict):
-            for key, tags in health_tags_map_data.items():
-                try:
-                    key_norm = normalize_text(str(key))
-                except Exception:
-                    continue
-                if not key_norm:
-                    continue
-                if key_norm in h_norm or h_norm in key_norm:
-                    if isinstance(tags, list):
-                        for t in tags:
-                            if t and t not in res:
-                                res.append(t)
-                    else:
-                        if tags and tags not in res:
-                            res.append(tags)
+        # key của health_tags_map đã normalize sẵn trong index
+        for key_norm, tags in get_catalog().index("search_fields")["health_tags_map"]:
+            if key_norm in h_norm or h_norm in key_norm:
+                for t in tags:
+                    if t not in res:
+                        res.append(t)
     except Exception as e:
         print("[WARN] expand_health_issue:", e)
 
@@ -305,23 +293,27 @@ def search_combo_by_health_issue(health_issue: str):
     best_score = 0
     best_combo = None
 
-    for combo in combos_list:
-        name = combo.get("name", "")
-        aliases = combo.get("aliases", [])
-        health_tags = combo.get("health_tags", [])
-        fields = [name] + aliases + health_tags
-
+    cat = get_catalog()
+    i_norms = [normalize_text(issue) for issue in issues]
+    # tên, alias, tag của combo đã normalize sẵn (index search_fields)
+    for combo, fields in zip(cat.combos, cat.index("search_fields")["combo_health"]):
         score = 0
-        for issue in issues:
-            i_norm = normalize_text(issue)
+        for i_norm in i_norms:
             for field in fields:
-                if text_contains(field, i_norm) or text_contains(i_norm, field):
+                if i_norm in field or field in i_norm:
                     score += 1
 
         if score > best_score:
             best_score = score
             best_combo = combo
 
+    if best_combo is None:
+        # Gõ không dấu / sai chính tả: thử TF-IDF trigram trên tên, alias, tag combo
+        for issue in issues:
+            hits = search_ngram(get_catalog(), "combo", issue, k=1, min_score=0.6)
+            if hits:
+                return hits[0][0]
+
     return best_combo
 
 
@@ -334,28 +326,21 @@ def search_product_by_health_issue(health_issue: str):
         issues = [health_issue]
 
     results = []
-    for p in products_list:
-        fields = []
-        fields.append(p.get("name", ""))
-        fields.extend(p.get("aliases", []))
-        fields.extend(p.get("health_tags", []))
-        main_tag = p.get("main_health_tag")
-        if main_tag:
-            fields.append(main_tag)
-
-        match = False
-        for issue in issues:
-            i_norm = normalize_text(issue)
-            for field in fields:
-                if text_contains(field, i_norm) or text_contains(i_norm, field):
-                    match = True
-                    break
-            if match:
-                break
-
-        if match:
+    cat = get_catalog()
+    i_norms = [normalize_text(issue) for issue in issues]
+    for p, fields in zip(cat.products, cat.index("search_fields")["product_health"]):
+        if any(i_norm in field or field in i_norm for i_norm in i_norms for field in fields):
             results.append(p)
 
+    # Bổ sung bằng BM25 trên benefits/ingredients/usage khi tag không đủ
+    # (đa số sản phẩm chưa có health_tags)
+    if len(results) < 3:
+        seen = {id(p) for p in results}
+        for p, score in search_products_fulltext(get_catalog(), " ".join(issues), k=3, min_ratio=0.5):
+            if id(p) not in seen:
+                results.append(p)
+                seen.add(id(p))
+
     return results[:3]
 
 
@@ -367,25 +352,83 @@ def search_product_by_name_or_code(query: str):
     best_score = 0
     best_product = None
 
-    for p in products_list:
-        code = p.get("code", "")
-        name = p.get("name", "")
-        aliases = p.get("aliases", [])
-        fields = [code, name] + aliases
+    cat = get_catalog()
+    for p, fields in zip(cat.products, cat.index("search_fields")["product_name"]):
         score = 0
         for field in fields:
-            if not field:
-                continue
-            if text_contains(field, q_norm) or text_contains(q_norm, field):
+            if q_norm in field or field in q_norm:
                 score += 1
         if score > best_score:
             best_score = score
             best_product = p
 
+    if best_product is None:
+        # Gõ sai 1-2 ký tự ("antigem 01", mã sai 1 số): chỉ tự chọn khi có 1 ứng viên gần nhất rõ ràng,
+        # nhiều ứng viên ngang nhau thì trả None để hỏi lại "ý anh/chị là ...?"
+        similar = find_similar_products(get_catalog(), query, k=2)
+        if similar:
+            if similar[0][1] <= 1 and (len(similar) == 1 or similar[0][1] < similar[1][1]):
+                return similar[0][0]
+            return None
+
+        hits = search_ngram(get_catalog(), "product", query, k=1)
+        if hits:
+            best_product = hits[0][0]
+
     return best_product
 
+# Prompt tĩnh, byte-identical giữa các lượt gọi (không chèn gì động vào) để provider
+# cache được phần prefix; phần thay đổi (câu hỏi, nội dung) luôn nằm ở message cuối.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+CLASSIFY_SYSTEM_PROMPT = """Bạn là trợ lý AI nội bộ hỗ trợ tư vấn viên (TVV) công ty thực phẩm chăm sóc sức khỏe.
+Phân tích câu hỏi của TVV, chỉ trả về 1 JSON hợp lệ.
+
+intent:
+- HEALTH_COMBO: combo cho 1 vấn đề sức khỏe (tiểu đường, huyết áp, mỡ máu...)
+- HEALTH_PRODUCT: sản phẩm lẻ cho 1 vấn đề sức khỏe
+- PRODUCT_DETAIL: chi tiết 1 sản phẩm cụ thể (theo mã hoặc tên)
+- HOW_TO_BUY: cách mua / đặt hàng
+- HOW_TO_PAY: thanh toán, chuyển khoản, COD
+- BUSINESS_QUESTION: chính sách kinh doanh, hoa hồng, chiết khấu, thưởng, quy định nội bộ
+- NAVIGATION: link fanpage, kênh telegram, website, group chính thức
+- SMALL_TALK: chào hỏi, cảm ơn, chuyện chung
+- META_HISTORY: hỏi về chính cuộc trò chuyện ("anh vừa hỏi gì nhỉ?", "xem lại lịch sử")
+TVV muốn gặp / kết nối / chuyển câu hỏi cho tuyến trên -> intent BUSINESS_QUESTION, ask_upline true.
+
+needs (nhiều giá trị): combo, products, usage, duration, product_links, benefits, ingredients, how_to_buy, how_to_pay.
+ask_upline: true nếu BUSINESS_QUESTION khó / nhạy cảm nên chuyển tuyến trên, còn lại false.
+
+Câu ghép nhiều ý ("combo tiểu đường giá bao nhiêu, cách thanh toán thế nào, và sản phẩm 070700 dùng sao"):
+sub_intents = mỗi ý 1 object {intent, health_issue, product_query, needs, text} theo thứ tự trong câu,
+text = đoạn nguyên văn của ý đó trong câu hỏi; các field ngoài lấy theo ý đầu tiên. Câu 1 ý thì sub_intents = [].
+
+Tin có thể mở đầu bằng khối [NGỮ CẢNH] (sản phẩm/combo vừa trả lời, các lượt gần đây) rồi [CÂU HỎI].
+Chỉ phân loại [CÂU HỎI]; ngữ cảnh dùng để hiểu câu nối tiếp ("cái đó", "sản phẩm này", "combo nào rẻ hơn"):
+điền product_query (mã sản phẩm) / health_issue từ ngữ cảnh khi câu hỏi không nói rõ.
+
+JSON:
+{"intent": "...", "health_issue": "... hoặc null", "product_query": "... hoặc null", "needs": [],
+ "ask_upline": false, "sub_intents": [], "raw_reasoning": "lý do ngắn gọn"}"""
+
+STYLE_SYSTEM_PROMPT = """Bạn là trợ lý bán hàng AI nội bộ, xưng "em", gọi TVV là "anh/chị".
+Viết lại NỘI DUNG CỐT LÕI thành câu trả lời tiếng Việt thân thiện, rõ ràng, dễ đọc cho câu hỏi của TVV.
+Bắt buộc:
+- Chỉ dùng HTML của Telegram (<b>, <i>). Không Markdown, không dùng ký tự * hay **.
+- Không xoá, không bịa thêm thông tin về sản phẩm, liều dùng, giá, thời gian sử dụng. Giữ nguyên mọi link.
+- Các dòng dạng [[K1]], [[K2]]... là khối giữ nguyên (giá, liều dùng, link): chép lại y nguyên,
+  mỗi mã trên 1 dòng riêng, đúng thứ tự, không sửa, không bỏ, không thêm mã mới."""
+
+
 # ============== OPENAI – PHÂN TÍCH INTENT & NHU CẦU ==============
-def classify_intent_with_openai(user_text: str) -> dict:
+# Tách câu ghép khi không có OpenAI: "combo tiểu đường giá bao nhiêu, cách thanh toán thế nào".
+# Dấu phẩy chỉ tách khi sau nó là khoảng trắng + chữ cái: "1,5 triệu" giữ nguyên.
+_COMPOUND_SPLIT_RE = re.compile(r"[?;\n]+|,\s+(?=[^\W\d_])|\s+(?:và|với lại|còn)\s+", flags=re.IGNORECASE)
+_PRODUCT_CODE_RE = re.compile(r"\b\d{5,6}\b")
+MAX_SUB_INTENTS = 4
+
+
+def _classify_keywords_single(user_text: str) -> dict:
     base_result = {
         "intent": "SMALL_TALK",
         "health_issue": None,
@@ -394,140 +437,214 @@ def classify_intent_with_openai(user_text: str) -> dict:
         "ask_upline": False,
         "raw_reasoning": "",
     }
+    t_raw = apply_synonyms(user_text or "")
+    t = normalize_text(t_raw)
 
-    if not client:
-        # Nếu không có OpenAI thì fallback keyword đơn giản
-        t_raw = apply_synonyms(user_text or "")
-        t = normalize_text(t_raw)
-
-        # Hỏi lịch sử / câu vừa hỏi
-        if any(
-            kw in t
-            for kw in [
-                "vua hoi gi",
-                "vua hoi em gi",
-                "vua hoi em cau gi",
-                "vua hoi em cau hoi gi",
-                "xem lai lich su",
-                "xem lai cuoc tro chuyen",
-                "lich su cuoc tro chuyen",
-            ]
-        ):
-            base_result["intent"] = "META_HISTORY"
-            return base_result
-
-        # Gặp tuyến trên
-        if any(
-            k in t
-            for k in [
-                "ket noi tuyen tren",
-                "ket noi voi tuyen tren",
-                "gap tuyen tren",
-                "muon gap tuyen tren",
-                "muon noi voi tuyen tren",
-                "chuyen cho tuyen tren",
-                "can tuyen tren ho tro",
-            ]
-        ):
-            base_result["intent"] = "BUSINESS_QUESTION"
-            base_result["ask_upline"] = True
-            return base_result
-
-        if any(k in t for k in ["tieu duong", "dai thao duong"]):
-            base_result["intent"] = "HEALTH_COMBO"
-            base_result["health_issue"] = "tiểu đường"
-        elif any(k in t for k in ["da day", "bao tu", "trao nguoc"]):
-            base_result["intent"] = "HEALTH_PRODUCT"
-            base_result["health_issue"] = "đau dạ dày / dạ dày"
-        elif any(k in t for k in ["mua hang", "dat hang", "mua nhu the nao"]):
-            base_result["intent"] = "HOW_TO_BUY"
-        elif any(k in t for k in ["thanh toan", "chuyen khoan"]):
-            base_result["intent"] = "HOW_TO_PAY"
-        elif any(k in t for k in ["fanpage", "kenh", "website", "trang web"]):
-            base_result["intent"] = "NAVIGATION"
-        elif any(k in t for k in ["chinh sach", "hoa hong", "kinh doanh", "thuong", "chiet khau"]):
-            base_result["intent"] = "BUSINESS_QUESTION"
+    flags = keyword_flags(t)
+
+    # Hỏi lịch sử / câu vừa hỏi
+    if "intent_meta_history" in flags:
+        base_result["intent"] = "META_HISTORY"
         return base_result
 
-    system_prompt = """
-Bạn là trợ lý AI nội bộ hỗ trợ đội ngũ tư vấn viên (TVV) của công ty thực phẩm chăm sóc sức khỏe.
-Nhiệm vụ: phân tích câu hỏi và trả về JSON theo cấu trúc.
-
-Các INTENT chính:
-- HEALTH_COMBO: TVV hỏi combo cho một vấn đề sức khỏe (ví dụ: tiểu đường, huyết áp, mỡ máu...)
-- HEALTH_PRODUCT: TVV hỏi sản phẩm lẻ cho một vấn đề sức khỏe.
-- PRODUCT_DETAIL: TVV hỏi thông tin chi tiết về một sản phẩm cụ thể (theo mã hoặc tên).
-- HOW_TO_BUY: Hỏi cách mua hàng, đặt hàng, quy trình.
-- HOW_TO_PAY: Hỏi về cách thanh toán, chuyển khoản, COD.
-- BUSINESS_QUESTION: Hỏi về chính sách kinh doanh, hoa hồng, chiết khấu, thưởng, quy định nội bộ.
-- NAVIGATION: Hỏi xin link fanpage, kênh telegram, website, group chính thức.
-- SMALL_TALK: Chào hỏi, cảm ơn, câu chuyện chung chung.
-- META_HISTORY: TVV hỏi về chính cuộc trò chuyện, ví dụ:
-  "anh vừa hỏi gì nhỉ?", "xem lại lịch sử cuộc trò chuyện này", "lần trước em nói gì với anh?"
-
-- Nếu TVV nói các câu như: "kết nối tuyến trên", "anh muốn gặp tuyến trên", 
-  "nhờ tuyến trên trả lời giúp", "chuyển câu này cho tuyến trên", 
-  thì:
-  + intent = "BUSINESS_QUESTION"
-  + ask_upline = true
-  + health_issue có thể để null
-
-Trường "needs" là danh sách các nhu cầu cụ thể trong cùng 1 câu:
-- "combo": cần tên combo
-- "products": cần danh sách sản phẩm trong combo
-- "usage": cần cách dùng/cách uống
-- "duration": cần thời gian dùng bao lâu để có kết quả
-- "product_links": cần link sản phẩm
-- "benefits": cần lợi ích/công dụng
-- "ingredients": cần thành phần sản phẩm
-- "how_to_buy": cần hướng dẫn mua hàng
-- "how_to_pay": cần hướng dẫn thanh toán
-
-Trường "ask_upline":
-- true: nếu câu hỏi thuộc dạng BUSINESS_QUESTION khó hoặc nhạy cảm, nên chuyển tuyến trên.
-- false: còn lại.
-
-Trả về JSON với các field:
-{
-  "intent": "...",
-  "health_issue": "... hoặc null",
-  "product_query": "... hoặc null",
-  "needs": [...],
-  "ask_upline": false,
-  "raw_reasoning": "giải thích ngắn gọn vì sao phân loại như vậy"
-}
+    # Gặp tuyến trên
+    if "intent_upline" in flags:
+        base_result["intent"] = "BUSINESS_QUESTION"
+        base_result["ask_upline"] = True
+        return base_result
 
-Luôn trả về đúng dạng JSON hợp lệ.
-"""
+    code_match = _PRODUCT_CODE_RE.search(t)
+    if "intent_diabetes" in flags:
+        base_result["intent"] = "HEALTH_COMBO"
+        base_result["health_issue"] = "tiểu đường"
+    elif "intent_stomach" in flags:
+        base_result["intent"] = "HEALTH_PRODUCT"
+        base_result["health_issue"] = "đau dạ dày / dạ dày"
+    elif code_match and code_match.group(0) in get_catalog().products_by_code:
+        base_result["intent"] = "PRODUCT_DETAIL"
+        base_result["product_query"] = code_match.group(0)
+    elif "intent_how_to_buy" in flags:
+        base_result["intent"] = "HOW_TO_BUY"
+    elif "intent_how_to_pay" in flags:
+        base_result["intent"] = "HOW_TO_PAY"
+    elif "intent_navigation" in flags:
+        base_result["intent"] = "NAVIGATION"
+    elif "intent_business" in flags:
+        base_result["intent"] = "BUSINESS_QUESTION"
+    return base_result
+
+
+def split_compound(text: str):
+    return [part.strip() for part in _COMPOUND_SPLIT_RE.split(text or "") if part and part.strip()]
+
+
+def classify_intent_keywords(user_text: str) -> dict:
+    """
+    Fallback không OpenAI. Câu ghép được tách theo dấu câu / "và",
+    mỗi vế ra 1 intent khác nhau thì trả thêm sub_intents.
+    """
+    result = _classify_keywords_single(user_text)
+    if result["intent"] in ("META_HISTORY",) or result["ask_upline"]:
+        return result
+
+    subs = []
+    seen = set()
+    for part in split_compound(user_text):
+        sub = _classify_keywords_single(part)
+        key = (sub["intent"], sub["health_issue"], sub["product_query"])
+        if sub["intent"] == "SMALL_TALK" or key in seen:
+            continue
+        seen.add(key)
+        sub["text"] = part
+        subs.append(sub)
+    if len(subs) > 1:
+        result.update({k: subs[0][k] for k in ("intent", "health_issue", "product_query")})
+        result["sub_intents"] = subs[:MAX_SUB_INTENTS]
+    return result
 
-    # Áp synonyms vào text trước khi gửi lên OpenAI cho dễ hiểu
-    processed_text = apply_synonyms(user_text or "")
 
+def get_sub_intents(intent_info: dict, text: str = None):
+    """
+    Danh sách sub-intent đã chuẩn hoá; câu đơn -> 1 phần tử là chính intent_info.
+    Mỗi sub-intent của câu ghép giữ "text" = đoạn câu của riêng nó (resolve_intent dùng thay
+    cả câu khi thiếu health_issue / product_query). Model không trả text mà câu tách ra đúng
+    bằng số ý thì gán theo thứ tự.
+    """
+    subs = []
+    seen = set()
+    for sub in intent_info.get("sub_intents") or []:
+        if not isinstance(sub, dict) or not sub.get("intent"):
+            continue
+        sub = {
+            "intent": sub.get("intent"),
+            "health_issue": sub.get("health_issue"),
+            "product_query": sub.get("product_query"),
+            "needs": sub.get("needs") or [],
+            "ask_upline": bool(sub.get("ask_upline", False)),
+            "text": sub.get("text") if isinstance(sub.get("text"), str) and sub.get("text").strip() else None,
+        }
+        key = (sub["intent"], sub["health_issue"], sub["product_query"])
+        if key in seen:
+            continue
+        seen.add(key)
+        subs.append(sub)
+    # SMALL_TALK lẫn trong câu ghép ("chào em, ...") thì bỏ
+    if len(subs) > 1:
+        subs = [x for x in subs if x["intent"] != "SMALL_TALK"] or subs[:1]
+    if len(subs) <= 1:
+        return [{
+            "intent": intent_info.get("intent", "SMALL_TALK"),
+            "health_issue": intent_info.get("health_issue"),
+            "product_query": intent_info.get("product_query"),
+            "needs": intent_info.get("needs") or [],
+            "ask_upline": bool(intent_info.get("ask_upline", False)),
+            "text": None,
+        }]
+    subs = subs[:MAX_SUB_INTENTS]
+    if text and any(sub["text"] is None for sub in subs):
+        parts = split_compound(text)
+        if len(parts) == len(subs):
+            for sub, part in zip(subs, parts):
+                sub["text"] = sub["text"] or part
+    return subs
+
+
+# ============== NGỮ CẢNH HỘI THOẠI ==============
+# Lượt gần + sản phẩm/combo vừa trả lời của từng chat (chat_context.py), đưa vào lượt
+# phân loại dưới ngân sách CONTEXT_TOKEN_BUDGET token để hiểu câu hỏi nối tiếp.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "200") or 200)
+CHAT_CONTEXT = ContextStore()
+
+# khớp cụm từ trọn vẹn: "bo do" không được khớp "thai bo doc to" (thải bỏ độc tố)
+_FOLLOWUP = KeywordMatcher({
+    "product": ["cai do", "cai nay", "san pham do", "san pham nay", "sp do", "sp nay", "loai do", "loai nay"],
+    "combo": ["combo do", "combo nay", "bo do", "bo nay", "combo nao", "combo khac"],
+})
+
+
+def apply_followup_context(intent_info: dict, text: str, chat_key: str) -> dict:
+    """
+    Fallback keyword (không có OpenAI) không hiểu "cái đó giá bao nhiêu":
+    câu không rõ intent mà có từ chỉ trỏ thì gắn vào sản phẩm / combo vừa trả lời.
+    """
+    if intent_info.get("intent") not in (None, "SMALL_TALK") or intent_info.get("sub_intents"):
+        return intent_info
+    pointers = _FOLLOWUP.match(normalize_text(text))
+    if not pointers:
+        return intent_info
+    last_combo = CHAT_CONTEXT.last_combo(chat_key)
+    last_product = CHAT_CONTEXT.last_product(chat_key)
+    if last_combo and "combo" in pointers:
+        health_issue = intent_info.get("health_issue") or CHAT_CONTEXT.last_health_issue(chat_key) or last_combo[1]
+        intent_info.update(intent="HEALTH_COMBO", health_issue=health_issue)
+    elif last_product and "product" in pointers:
+        intent_info.update(intent="PRODUCT_DETAIL", product_query=last_product[0])
+    return intent_info
+
+
+def _classify_call(client, user_content: str) -> dict:
+    started = time.perf_counter()
     try:
         resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=OPENAI_MODEL,
             response_format={"type": "json_object"},
             messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": processed_text},
+                {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
+                {"role": "user", "content": user_content},
             ],
         )
-        content = resp.choices[0].message.content
-        data = json.loads(content)
-        
-        for k, v in base_result.items():
-            if k not in data:
-                data[k] = v
-
-        # Chuẩn hóa health_issue bằng synonyms luôn
-        if data.get("health_issue"):
-            data["health_issue"] = apply_synonyms(data["health_issue"])
-
-        return data
+        data = json.loads(resp.choices[0].message.content)
+    except Exception:
+        USAGE.record("classify", "ERROR", None, (time.perf_counter() - started) * 1000, error=True)
+        raise
+    USAGE.record("classify", data.get("intent"), resp.usage, (time.perf_counter() - started) * 1000)
+    return data
+
+
+def classify_intent_with_openai(user_text: str, context: str = "") -> dict:
+    client = get_openai_client()
+    base_result = {
+        "intent": "SMALL_TALK",
+        "health_issue": None,
+        "product_query": None,
+        "needs": [],
+        "ask_upline": False,
+        "raw_reasoning": "",
+    }
+
+    if not client:
+        # Nếu không có OpenAI thì fallback keyword đơn giản
+        return classify_intent_keywords(user_text)
+
+    # Áp synonyms vào text trước khi gửi lên OpenAI cho dễ hiểu
+    processed_text = apply_synonyms(user_text or "")
+    user_content = f"{context}\n[CÂU HỎI]\n{processed_text}" if context else processed_text
+
+    try:
+        # nhiều TVV hỏi cùng 1 câu cùng lúc -> 1 lượt gọi, kết quả dùng chung.
+        # Key giữ dấu: "bán"/"bạn" khác nghĩa, chỉ gộp câu khác nhau chữ hoa/thường, khoảng trắng
+        shared = OPENAI_FLIGHT.do(
+            ("classify", fold_case(user_content)),
+            lambda: _classify_call(client, user_content),
+            group="classify",
+        )
     except Exception as e:
         print("[ERROR] OpenAI classify_intent:", e)
         return base_result
 
+    data = copy.deepcopy(shared)
+    for k, v in base_result.items():
+        if k not in data:
+            data[k] = v
+
+    # Chuẩn hóa health_issue bằng synonyms luôn
+    if data.get("health_issue"):
+        data["health_issue"] = apply_synonyms(data["health_issue"])
+    for sub in data.get("sub_intents") or []:
+        if isinstance(sub, dict) and sub.get("health_issue"):
+            sub["health_issue"] = apply_synonyms(sub["health_issue"])
+    return data
+
 # ============== BUILD CÂU TRẢ LỜI ==============
 def format_combo_reply(combo, needs, health_issue):
     if not combo:
@@ -561,7 +678,7 @@ def format_combo_reply(combo, needs, health_issue):
 
             # Tìm sản phẩm chi tiết
             product_detail = None
-            for prod in products_list:
+            for prod in get_catalog().products:
                 if normalize_text(prod.get("name", "")) == normalize_text(pname_combo):
                     product_detail = prod
                     break
@@ -596,6 +713,14 @@ def format_combo_reply(combo, needs, health_issue):
 
             lines.append("\n".join(block_lines))
 
+        total = get_catalog().index("prices").combo_total(combo.get("id", ""))
+        if total:
+            amount, counted, missing = total
+            line = f"\n💰 <b>Tổng giá tham khảo combo:</b> {format_vnd(amount)} ({counted} sản phẩm, mỗi loại 1 đơn vị"
+            if missing:
+                line += f", chưa tính {missing} sản phẩm chưa có giá"
+            lines.append(line + ")")
+
     if duration_text:
         lines.append(f"\n⏱ <b>Thời gian khuyến nghị:</b> {duration_text}")
     if combo_url:
@@ -673,6 +798,23 @@ def format_product_reply(product, needs, health_issue=None):
     )
     return "\n".join(lines)
 
+def format_product_not_found_reply(query, needs, health_issue=None):
+    """
+    Không tìm thấy chính xác: nếu có tên/mã gần giống thì hỏi lại "ý anh/chị là ...?".
+    """
+    suggestions = find_similar_products(get_catalog(), query or "", k=3)
+    if not suggestions:
+        return format_product_reply(None, needs, health_issue)
+
+    lines = [f"Em chưa thấy sản phẩm nào đúng với <b>{query}</b>. Ý anh/chị là:"]
+    for p, _, _ in suggestions:
+        name = strip_markdown(p.get("name", "Sản phẩm"))
+        code = strip_markdown(p.get("code", ""))
+        lines.append(f"• {name} (Mã: {code})" if code else f"• {name}")
+    lines.append("")
+    lines.append("Anh/chị nhắn lại đúng tên hoặc mã sản phẩm giúp em nhé.")
+    return "\n".join(lines)
+
 def format_faq_reply(faq_list, key_field="title"):
     if not faq_list:
         return "Hiện tại em chưa có dữ liệu hướng dẫn chi tiết trong hệ thống. Anh/chị giúp em liên hệ tuyến trên để được hỗ trợ nhé."
@@ -712,26 +854,23 @@ def match_business_faq(user_text: str):
     Tìm câu trả lời trong faq_business_data nếu có.
     Cấu trúc gợi ý: [{"q_keywords":["hoa hồng","chiết khấu"], "answer":"..."}]
     """
+    faq_business_data = get_catalog().index("search_fields")["faq_business"]
     if not faq_business_data:
         return None
 
     t_raw = apply_synonyms(user_text or "")
     t = normalize_text(t_raw)
 
-    for item in faq_business_data:
-        try:
-            keywords = item.get("q_keywords", [])
-            if not keywords:
-                continue
-            if all(normalize_text(k) in t for k in keywords):
-                return item.get("answer")
-        except Exception:
-            continue
+    # q_keywords đã normalize sẵn
+    for keywords, answer in faq_business_data:
+        if all(k in t for k in keywords):
+            return answer
     return None
 
-def escalate_to_upline(chat_id, username, main_question, extra_note=None):
+def escalate_to_upline(chat_id, username, main_question, extra_note=None, reason=None):
     """
     Gửi câu hỏi lên tuyến trên + log vào Sheet.
+    reason: lý do bot tự chuyển (rule trong rules.json), hiện cho tuyến trên thấy.
     """
     if not UPLINE_CHAT_ID:
         return (
@@ -757,6 +896,9 @@ def escalate_to_upline(chat_id, username, main_question, extra_note=None):
         f"💬 Chat ID: <code>{chat_id}</code>",
         "",
     ]
+    if reason:
+        msg_lines.append(f"⚠️ <b>Tự động chuyển:</b> {reason}")
+        msg_lines.append("")
 
     if main_question:
         msg_lines.append("❓ <b>Câu hỏi chính của TVV:</b>")
@@ -798,116 +940,432 @@ def handle_upline_reply(upline_text: str):
     return int(chat_id_str), content
 
 # ============== XỬ LÝ LOGIC CHÍNH ==============
-def build_ai_style_reply(user_text: str, core_answer: str) -> str:
+# Dòng có link / giá / liều dùng: thay bằng [[Kn]] trước khi gửi, điền lại sau khi nhận
+# -> model không phải đọc + chép lại (combo dài rất tốn token) và không thể sửa sai.
+_PROTECTED_LINE_RE = re.compile(
+    r"https?://|giá tham khảo|cách dùng|liều|\b\d+\s*(?:viên|gói|ml|muỗng|lần)\b",
+    flags=re.IGNORECASE,
+)
+_PLACEHOLDER_RE = re.compile(r"\[\[K(\d+)\]\]")
+
+
+def protect_blocks(core_answer: str):
     """
-    Dùng OpenAI để làm mượt câu trả lời, giữ nguyên nội dung core.
+    Trả về (text đã thay placeholder, list khối gốc). Các dòng cần giữ liền nhau gộp 1 khối.
     """
-    if not client:
-        return core_answer
+    out = []
+    blocks = []
+    for line in core_answer.split("\n"):
+        if line.strip() and _PROTECTED_LINE_RE.search(line):
+            if out and out[-1] == f"[[K{len(blocks)}]]":
+                blocks[-1] += "\n" + line
+            else:
+                blocks.append(line)
+                out.append(f"[[K{len(blocks)}]]")
+        else:
+            out.append(line)
+    return "\n".join(out), blocks
 
-    prompt = f"""
-Bạn là trợ lý AI nội bộ, xưng hô "em" với TVV, TVV là "anh/chị".
 
-YÊU CẦU BẮT BUỘC:
-- Trả lời bằng tiếng Việt, thân thiện, rõ ràng, dễ đọc.
-- CHỈ dùng định dạng HTML dành cho Telegram: <b>...</b>, <i>...</i>.
-- KHÔNG dùng Markdown, KHÔNG dùng **...**, *...* hoặc bất kỳ ký tự * để in đậm.
-- Không được xoá hay bịa thêm thông tin về sản phẩm, liều dùng, giá, thời gian sử dụng.
-- Giữ nguyên các link (http/https) nếu có.
+def restore_blocks(text: str, blocks):
+    """
+    Điền lại khối gốc. None nếu model làm mất / lặp / thêm placeholder.
+    """
+    found = [int(m) for m in _PLACEHOLDER_RE.findall(text)]
+    if sorted(found) != list(range(1, len(blocks) + 1)):
+        return None
+    return _PLACEHOLDER_RE.sub(lambda m: blocks[int(m.group(1)) - 1], text)
 
-Câu hỏi của TVV:
-\"\"\"{user_text}\"\"\"
 
-Dưới đây là nội dung cốt lõi cần truyền đạt, bạn được phép chỉnh câu chữ nhưng không được bịa thông tin mới:
-\"\"\"{core_answer}\"\"\"
-"""
+def _style_call(client, user_text: str, masked: str, intent: str) -> str:
+    started = time.perf_counter()
     try:
         resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=OPENAI_MODEL,
             messages=[
+                {"role": "system", "content": STYLE_SYSTEM_PROMPT},
                 {
-                    "role": "system",
-                    "content": (
-                        "Bạn là trợ lý bán hàng nội bộ cho đội ngũ TVV. "
-                        "Luôn trả lời bằng tiếng Việt, thân thiện, rõ ràng. "
-                        "Không dùng Markdown, chỉ dùng HTML (<b>, <i>) nếu cần nhấn mạnh."
-                    ),
+                    "role": "user",
+                    "content": f"Câu hỏi của TVV:\n{user_text}\n\nNỘI DUNG CỐT LÕI:\n{masked}",
                 },
-                {"role": "user", "content": prompt},
             ],
         )
-        content = resp.choices[0].message.content or core_answer
-        # Xoá toàn bộ dấu **, * mà OpenAI có thể lỡ chèn
-        content = strip_markdown(content)
-        return content
+    except Exception:
+        USAGE.record("style", intent, None, (time.perf_counter() - started) * 1000, error=True)
+        raise
+    USAGE.record("style", intent, resp.usage, (time.perf_counter() - started) * 1000)
+    return resp.choices[0].message.content or masked
+
+
+def build_ai_style_reply(user_text: str, core_answer: str, intent: str = "") -> str:
+    """
+    Dùng OpenAI để làm mượt câu trả lời, giữ nguyên nội dung core.
+    """
+    client = get_openai_client()
+    if not client:
+        return core_answer
+
+    masked, blocks = protect_blocks(core_answer)
+    try:
+        content = OPENAI_FLIGHT.do(
+            ("style", intent, fold_case(user_text), masked),
+            lambda: _style_call(client, user_text, masked, intent),
+            group="style",
+        )
     except Exception as e:
         print("[ERROR] OpenAI build_ai_style_reply:", e)
         return core_answer
+    # Xoá toàn bộ dấu **, * mà OpenAI có thể lỡ chèn
+    content = restore_blocks(strip_markdown(content), blocks)
+    if content is None:
+        USAGE.record_event("style", "PLACEHOLDER_LOST")
+        print("[WARN] build_ai_style_reply: model làm mất khối giữ nguyên, dùng nội dung gốc")
+        return core_answer
+    return guard_styled_reply(user_text, content, core_answer, intent=intent)
+
+
+def guard_styled_reply(user_text: str, styled: str, core_answer: str, intent: str = "") -> str:
+    """
+    Chặn khẳng định y khoa model tự thêm vào (rules.json claim_guard):
+    redact -> thay cụm, flag -> vẫn gửi + báo tuyến trên, fallback -> dùng nội dung gốc.
+    """
+    guard = get_catalog().index("claim_guard")
+    if guard is None:
+        return styled
+    verdict = guard.check(styled, core=core_answer)
+    if verdict["action"] == "pass":
+        return styled
+    record_claim_hits(verdict["hits"])
+    phrases = ", ".join(key for key, _ in verdict["hits"])
+    print(f"[WARN] Câu trả lời model có cụm cấm ({verdict['action']}): {phrases}")
+    if verdict["action"] == "flag" and UPLINE_CHAT_ID:
+        send_telegram_message(
+            UPLINE_CHAT_ID,
+            "\n".join([
+                "⚠️ Câu trả lời bot có cụm cần xem lại (đã gửi cho TVV)",
+                f"Cụm: {phrases}",
+                f"Intent: {intent or '-'}",
+                "",
+                f"Câu hỏi: {user_text}",
+                "",
+                f"Bot trả lời: {verdict['text']}",
+            ]),
+            parse_mode=None,
+        )
+    return verdict["text"]
 
 # ============== HELPER CHO FLOW TUYẾN TRÊN & LỊCH SỬ ==============
 
-def is_cancel_flow(text_norm: str) -> bool:
+# Từ khoá nằm ở keywords.json, mỗi tin chỉ quét 1 lần: flags = keyword_flags(t_norm)
+
+def is_cancel_flow(flags) -> bool:
     """
     Nhận diện ý 'thôi / huỷ / không gửi nữa' để thoát flow tuyến trên.
     """
-    cancel_keywords = [
-        "thoi", "thôi",
-        "huy", "huỷ", "hủy",
-        "khong gui nua", "không gửi nữa",
-        "khong can gui", "không cần gửi",
-        "khong can nua", "không cần nữa",
-        "bo qua", "bỏ qua",
-        "cancel",
-    ]
-    return any(kw in text_norm for kw in cancel_keywords)
+    return "cancel" in flags
 
 
-def is_confirm_send(text_norm: str) -> bool:
+def is_confirm_send(flags) -> bool:
     """
     Nhận diện các câu xác nhận: đồng ý gửi / ok gửi / gửi đi...
     Dùng khi đang ở state 'waiting_confirm'.
     """
-    # Câu trả lời rất ngắn kiểu "ok", "đồng ý"
-    short_confirms = [
-        "ok",
-        "ok em",
-        "oke",
-        "oke em",
-        "dong y",
-        "đồng ý",
-        "chuan", "chuẩn",
-        "duoc", "được",
-    ]
-    if text_norm in short_confirms:
-        return True
-
-    # Câu dài hơn nhưng có cụm xác nhận
-    confirm_phrases = [
-        "dong y gui", "đồng ý gửi",
-        "ok gui", "ok gửi",
-        "gui di", "gửi đi",
-        "gui len tuyen tren", "gửi lên tuyến trên",
-        "gui giup", "gửi giúp",
-    ]
-    return any(kw in text_norm for kw in confirm_phrases)
+    # "ok", "đồng ý" (cả câu) hoặc câu dài hơn có cụm xác nhận
+    return "confirm_short" in flags or "confirm" in flags
 
 
-def is_meta_history_query(text_norm: str) -> bool:
+def is_meta_history_query(flags) -> bool:
     """
     Câu kiểu: 'anh vừa hỏi gì', 'anh vừa yêu cầu em gì',
     'xem lại lịch sử', 'em vừa nói gì'...
     Dùng để trả lời lịch sử, KHÔNG dùng làm nội dung gửi tuyến trên.
     """
-    history_patterns = [
-        "anh vua hoi gi", "anh vừa hỏi gì",
-        "anh vua yeu cau gi", "anh vừa yêu cầu gì",
-        "anh vua yeu cau em gi", "anh vừa yêu cầu em gì",
-        "xem lai lich su", "xem lại lịch sử",
-        "em vua noi gi", "em vừa nói gì",
-        "em vua tra loi gi", "em vừa trả lời gì",
-        "anh vua hoi em cau gi", "anh vừa hỏi em câu gì",
-    ]
-    return any(kw in text_norm for kw in history_patterns)
+    return "meta_history" in flags
+
+
+# ============== TRA CỨU TRƯỚC (song song lượt phân loại OpenAI) ==============
+# Tin tới là chạy sẵn các tra cứu local đoán được từ chính tin nhắn (speculation.py),
+# phân loại xong chỉ việc lấy kết quả. Thống kê trúng / trượt / tiết kiệm ở /usage.
+SPECULATE = os.getenv("SPECULATE_LOOKUPS", "1") not in ("0", "false", "")
+SPECULATE_WORKERS = int(os.getenv("SPECULATE_WORKERS", "4") or 4)
+SPECULATE_POOL = ThreadPoolExecutor(max_workers=SPECULATE_WORKERS, thread_name_prefix="speculate")
+SPECULATE_MAX_KEYS = 8
+SPECULATE_MAX_PHRASES = 2
+SPECULATION_STATS = SpeculationStats()
+LOOKUPS = {
+    "combo": search_combo_by_health_issue,
+    "products": search_product_by_health_issue,
+    "product": search_product_by_name_or_code,
+    "faq": match_business_faq,
+}
+
+
+def lookup(lookups, kind: str, arg: str):
+    fn = LOOKUPS[kind]
+    if lookups is None:
+        return fn(arg)
+    return lookups.get((kind, normalize_text(arg)), lambda: fn(arg))
+
+
+def start_speculative_lookups(text: str, t_norm: str):
+    """
+    Đoán các tra cứu resolve_intent có thể cần và chạy trước trên SPECULATE_POOL:
+    - intent theo từ khoá (classify_intent_keywords: tiểu đường, dạ dày, mã sản phẩm, kinh doanh...)
+    - cụm vấn đề sức khoẻ trong tin (health_tags_map), dài trước
+    - mã sản phẩm có trong catalog, tên sản phẩm (như trong tin + như trong catalog)
+    - FAQ kinh doanh (khi từ khoá cho thấy câu hỏi kinh doanh)
+    """
+    snapshot = get_catalog()
+
+    def pinned(fn):
+        with CATALOG.pinned(snapshot):
+            return fn()
+
+    lookups = SpeculativeLookups(SPECULATE_POOL, SPECULATION_STATS, wrap=pinned)
+
+    def add(kind, arg):
+        if arg and len(lookups) < SPECULATE_MAX_KEYS:
+            lookups.start((kind, normalize_text(arg)), lambda: LOOKUPS[kind](arg))
+
+    for sub in get_sub_intents(classify_intent_keywords(text)):
+        if sub["intent"] == "HEALTH_COMBO":
+            add("combo", sub["health_issue"])
+        elif sub["intent"] == "HEALTH_PRODUCT":
+            add("products", sub["health_issue"])
+        elif sub["intent"] == "PRODUCT_DETAIL":
+            add("product", sub["product_query"])
+        elif sub["intent"] == "BUSINESS_QUESTION":
+            add("faq", sub.get("text") or text)
+    for span, _ in snapshot.index("health_phrases").find(t_norm)[:SPECULATE_MAX_PHRASES]:
+        add("combo", span)
+        add("products", span)
+    for code in _PRODUCT_CODE_RE.findall(t_norm):
+        if code in snapshot.products_by_code:
+            add("product", code)
+    for span, name in snapshot.index("product_phrases").find(t_norm)[:SPECULATE_MAX_PHRASES]:
+        add("product", span)
+        add("product", name)
+    return lookups
+
+
+# ============== TRẢ LỜI TỪNG INTENT ==============
+# Câu ghép: mỗi sub-intent tra cứu + format riêng trên pool thread, gộp lại rồi
+# chỉ gọi build_ai_style_reply 1 lần. Tổng thời gian ~ sub-intent chậm nhất.
+SUBQUERY_WORKERS = int(os.getenv("SUBQUERY_WORKERS", "4") or 4)
+SUBQUERY_POOL = ThreadPoolExecutor(max_workers=SUBQUERY_WORKERS, thread_name_prefix="subquery")
+SUBQUERY_TIMEOUT = 20
+SUB_REPLY_SEPARATOR = "\n\n— — —\n\n"
+
+
+def resolve_intent(sub: dict, text: str, chat_key: str, lookups=None):
+    """
+    Trả về (reply_text_core, ask_upline_flag) cho 1 intent, chỉ dùng dữ liệu local.
+    lookups: tra cứu đã chạy trước trong lúc phân loại (SpeculativeLookups) hoặc None.
+    text: cả tin nhắn; sub-intent của câu ghép dùng đoạn câu của nó (sub["text"]).
+    """
+    text = sub.get("text") or text
+    intent = sub.get("intent", "SMALL_TALK")
+    health_issue = sub.get("health_issue")
+    product_query = sub.get("product_query")
+    needs = sub.get("needs") or []
+    ask_upline_flag = bool(sub.get("ask_upline", False))
+    reply_text_core = ""
+
+    if intent == "HEALTH_COMBO":
+        combo = lookup(lookups, "combo", health_issue or text)
+        if combo:
+            CHAT_CONTEXT.note_combo(chat_key, combo.get("id"), combo.get("name", ""))
+        reply_text_core = format_combo_reply(combo, needs, health_issue or text)
+
+    elif intent == "HEALTH_PRODUCT":
+        if product_query:
+            product = lookup(lookups, "product", product_query)
+            if product:
+                record_product_hit(product.get("code"))
+                CHAT_CONTEXT.note_product(chat_key, product.get("code"), product.get("name", ""))
+                reply_text_core = format_product_reply(product, needs, health_issue=None)
+            else:
+                reply_text_core = format_product_not_found_reply(product_query, needs)
+        else:
+            products = lookup(lookups, "products", health_issue or text)
+            if not products:
+                reply_text_core = format_product_reply(None, needs, health_issue or text)
+            elif len(products) == 1:
+                CHAT_CONTEXT.note_product(chat_key, products[0].get("code"), products[0].get("name", ""))
+                reply_text_core = format_product_reply(products[0], needs, health_issue or text)
+            else:
+                lines = [f"<b>Một số sản phẩm phù hợp với vấn đề {health_issue or text}:</b>"]
+                for p in products:
+                    name = strip_markdown(p.get("name", "Sản phẩm"))
+                    code = strip_markdown(p.get("code", ""))
+                    url = (p.get("product_url", "") or "").strip()
+                    line = f"• {name}"
+                    if code:
+                        line += f" (Mã: {code})"
+                    if url:
+                        line += f"\n   🔗 {url}"
+                    lines.append(line)
+                lines.append("")
+                lines.append("Nếu anh/chị muốn xem chi tiết sản phẩm nào, hãy hỏi theo tên hoặc mã sản phẩm cụ thể nhé.")
+                reply_text_core = "\n".join(lines)
+
+    elif intent == "PRODUCT_DETAIL":
+        product = lookup(lookups, "product", product_query or text)
+        if product:
+            record_product_hit(product.get("code"))
+            CHAT_CONTEXT.note_product(chat_key, product.get("code"), product.get("name", ""))
+            reply_text_core = format_product_reply(product, needs, health_issue=None)
+        else:
+            reply_text_core = format_product_not_found_reply(product_query or text, needs)
+
+    elif intent == "HOW_TO_BUY":
+        reply_text_core = format_faq_reply(get_catalog().faq_buy)
+
+    elif intent == "HOW_TO_PAY":
+        reply_text_core = format_faq_reply(get_catalog().faq_payment)
+
+    elif intent == "NAVIGATION":
+        reply_text_core = format_navigation_reply()
+
+    elif intent == "BUSINESS_QUESTION":
+        faq_answer = lookup(lookups, "faq", text)
+        if faq_answer:
+            reply_text_core = faq_answer
+        else:
+            # Luôn bắt người dùng nhập nội dung cụ thể trước khi gửi tuyến trên
+            ask_upline_flag = True
+            PENDING_UPLINE_STATE[chat_key] = "waiting_content"
+            PENDING_UPLINE_TEXT.pop(chat_key, None)
+            reply_text_core = (
+                "Vấn đề này thuộc nhóm chính sách/kinh doanh hoặc tình huống khó.\n\n"
+                "Anh/chị cho em <b>nội dung câu hỏi cụ thể</b> muốn gửi tuyến trên "
+                "(tình huống, sản phẩm/combo, mức giá, chính sách...), "
+                "em sẽ ghi lại rồi nhắc lại để anh/chị xác nhận trước khi gửi đi ạ."
+            )
+
+    else:
+        reply_text_core = (
+            "Em là trợ lý AI nội bộ hỗ trợ anh/chị TVV trong việc tư vấn sản phẩm, combo và cách chăm sóc sức khoẻ.\n\n"
+            "Anh/chị có thể hỏi em về:\n"
+            "• Combo cho một vấn đề sức khỏe (ví dụ: tiểu đường, dạ dày, xương khớp...)\n"
+            "• Thông tin chi tiết một sản phẩm (thành phần, lợi ích, cách dùng...)\n"
+            "• Cách mua hàng, thanh toán, kênh chính thức của công ty\n"
+            "• Những thắc mắc về kinh doanh, chính sách (em sẽ hỗ trợ chuyển tuyến trên nếu cần) 😊"
+        )
+
+    return reply_text_core, ask_upline_flag
+
+
+def _resolve_pinned(snapshot, sub, text, chat_key, lookups=None):
+    # thread của pool không thấy snapshot đã pin ở thread webhook
+    with CATALOG.pinned(snapshot):
+        return resolve_intent(sub, text, chat_key, lookups)
+
+
+def resolve_sub_intents(subs, text: str, chat_key: str, lookups=None):
+    """
+    Trả về (reply_text_core đã gộp, ask_upline_flag).
+    """
+    if len(subs) == 1:
+        return resolve_intent(subs[0], text, chat_key, lookups)
+
+    snapshot = get_catalog()
+    futures = [SUBQUERY_POOL.submit(_resolve_pinned, snapshot, sub, text, chat_key, lookups) for sub in subs]
+    parts = []
+    ask_upline_flag = False
+    for fut in futures:
+        try:
+            core, ask = fut.result(timeout=SUBQUERY_TIMEOUT)
+        except Exception as e:
+            print("[ERROR] resolve sub-intent:", e)
+            core, ask = "Phần này em chưa tra cứu được, anh/chị hỏi riêng lại giúp em nhé.", False
+        ask_upline_flag = ask_upline_flag or ask
+        parts.append(core)
+    return SUB_REPLY_SEPARATOR.join(parts), ask_upline_flag
+
+
+def route_forced_upline(chat_id, text, rule_hits, username=None, msg_id=None):
+    """
+    Tin khớp force_upline_for (khiếu nại, bồi hoàn, tố cáo...): chuyển nguyên văn lên
+    tuyến trên, bỏ qua phân loại / làm mượt bằng OpenAI và flow xác nhận nội dung.
+    """
+    chat_key = str(chat_id)
+    record_rule_hits(rule_hits)
+    print(f"[INFO] Rule chuyển tuyến trên {rule_hits} (chat {chat_id})")
+    PENDING_UPLINE_STATE.pop(chat_key, None)
+    PENDING_UPLINE_TEXT.pop(chat_key, None)
+
+    rules_text = ", ".join(rule_hits)
+    reply = (
+        "Nội dung này thuộc nhóm cần tuyến trên xử lý trực tiếp "
+        f"({rules_text}), em không tư vấn thay ạ.\n\n"
+        + escalate_to_upline(chat_id, username, text, reason=f"khớp rule {rules_text}")
+    )
+    send_telegram_message(chat_id, reply, reply_to_message_id=msg_id, parse_mode=None)
+
+    log_event(
+        log_type="RULE_UPLINE",
+        chat_id=chat_id,
+        username=username or "",
+        role="bot",
+        user_text=text,
+        bot_reply=reply,
+        intent="FORCE_UPLINE",
+        ask_upline="yes",
+        extra=rules_text,
+    )
+    CHAT_CONTEXT.add_turn(chat_key, text, "FORCE_UPLINE")
+    LAST_USER_TEXT[chat_key] = text
+
+
+# ============== HỎI THEO KHOẢNG GIÁ (không gọi OpenAI) ==============
+# "sản phẩm gan dưới 500k", "combo nào dưới 1 triệu": index "prices" (pricing.py) đã sort sẵn giá
+PRICE_LIST_LIMIT = 10
+
+
+def answer_price_query(t_norm: str, text: str = ""):
+    """
+    Câu trả lời cho câu hỏi khoảng giá, hoặc None nếu tin không hỏi khoảng giá.
+    text: tin gốc, để nhận từ chỉ tiền có dấu ("đắt", "đồng").
+    """
+    rng = parse_price_range(t_norm, text)
+    if rng is None:
+        return None
+    snapshot = get_catalog()
+    index = snapshot.index("prices")
+    if index is None:
+        return None
+    lo, hi = rng
+    combos = wants_combo(t_norm)
+    tags = sorted(index.tags_in(t_norm))
+    hits = index.search(lo, hi, tags=tags, combos=combos)
+
+    kind = "combo" if combos else "sản phẩm"
+    scope = f" nhóm {', '.join(t.replace('_', ' ') for t in tags)}" if tags else ""
+    title = f"{kind.capitalize()}{scope} giá {describe_range(lo, hi)}"
+    if not hits:
+        return (
+            f"Em chưa thấy {kind}{scope} nào có giá {describe_range(lo, hi)} ạ.\n"
+            "Anh/chị thử nới khoảng giá hoặc hỏi theo vấn đề sức khoẻ để em gợi ý nhé."
+        )
+
+    lines = [f"💰 <b>{title}</b> ({len(hits)}):", ""]
+    for amount, key in hits[:PRICE_LIST_LIMIT]:
+        if combos:
+            combo = snapshot.combos_by_id.get(key)
+            _, counted, missing = index.combo_total(key)
+            note = f"{counted} sản phẩm" + (f", thiếu giá {missing}" if missing else "")
+            lines.append(f"• <b>{strip_markdown(combo.get('name', key))}</b> — {format_vnd(amount)} ({note})")
+        else:
+            product = snapshot.products[key]
+            _, qty, unit = index.price(key)
+            per = f"/{qty} {unit}" if qty != 1 else (f"/{unit}" if unit else "")
+            lines.append(f"• <b>{strip_markdown(product.get('name', key))}</b> — {format_vnd(amount)}{per}")
+    if len(hits) > PRICE_LIST_LIMIT:
+        lines.append(f"… và {len(hits) - PRICE_LIST_LIMIT} {kind} khác, anh/chị thu hẹp khoảng giá để xem thêm.")
+    lines.append("")
+    lines.append("<i>Giá tham khảo theo dữ liệu hệ thống, TVV kiểm tra lại trước khi báo khách.</i>")
+    return "\n".join(lines)
 
 
 # ============== XỬ LÝ TIN NHẮN CHÍNH ==============
@@ -929,12 +1387,14 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
 
         # ===== CÂU HỎI LỊCH SỬ / META_HISTORY =====
     t_norm = normalize_text(text)
-    is_meta_history = False
+    flags = keyword_flags(t_norm)
 
-    if ("lich su" in t_norm or "lịch sử" in t_norm or "vua hoi" in t_norm or 
-        "vừa hỏi" in t_norm or "hoi gi nhi" in t_norm or "hỏi gì nhỉ" in t_norm):
-
-        is_meta_history = True
+    # ===== 0. RULE BẮT BUỘC CHUYỂN TUYẾN TRÊN (rules.json), không qua OpenAI =====
+    rule_hits = match_force_upline(get_catalog(), text)
+    if rule_hits:
+        route_forced_upline(chat_id, text, rule_hits, username=username, msg_id=msg_id)
+        return
+    is_meta_history = "history_summary" in flags
 
     if is_meta_history and state not in ["waiting_content", "waiting_confirm"]:
         # 1) Lấy lịch sử gần nhất
@@ -944,7 +1404,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
 
         # 2) Loại bỏ chính câu vừa hỏi
         filtered = []
-        for item in history:
+        for item in history_items:
             q = (item.get("user_text") or "").strip()
             if normalize_text(q) == t_norm:
                 continue  # bỏ câu hiện tại
@@ -974,7 +1434,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
                 lines.append("")
 
         reply_text_core = "\n".join(lines).strip()
-        final_reply = build_ai_style_reply(text, reply_text_core)
+        final_reply = build_ai_style_reply(text, reply_text_core, intent="META_HISTORY")
         send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
         log_event(
@@ -989,7 +1449,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
         return
 
     # ===== 0.1. META_HISTORY CHUNG: 'anh vừa hỏi gì / vừa yêu cầu gì / xem lại lịch sử...' =====
-    if is_meta_history_query(t_norm):
+    if is_meta_history_query(flags):
         last_user = LAST_USER_TEXT.get(chat_key, "")
         history_items = fetch_history(chat_key, limit=5)  # có thể rỗng nếu Apps Script chưa làm
 
@@ -1017,7 +1477,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
                 "Anh/chị có thể nhắn lại nội dung cần hỏi, em sẽ hỗ trợ ngay ạ."
             )
 
-        final_reply = build_ai_style_reply(text, reply_text_core)
+        final_reply = build_ai_style_reply(text, reply_text_core, intent="META_HISTORY")
         send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
         log_event(
@@ -1033,7 +1493,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
         return
 
     # ===== 0.2. NẾU ĐANG Ở FLOW TUYẾN TRÊN MÀ NGƯỜI DÙNG NÓI 'THÔI / HUỶ' → THOÁT FLOW =====
-    if state in ("waiting_content", "waiting_confirm") and is_cancel_flow(t_norm):
+    if state in ("waiting_content", "waiting_confirm") and is_cancel_flow(flags):
         PENDING_UPLINE_STATE.pop(chat_key, None)
         PENDING_UPLINE_TEXT.pop(chat_key, None)
 
@@ -1042,7 +1502,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
             "Anh/chị cứ tiếp tục hỏi các nội dung khác, em sẽ hỗ trợ như bình thường ạ."
         )
 
-        final_reply = build_ai_style_reply(text, reply_text_core)
+        final_reply = build_ai_style_reply(text, reply_text_core, intent="CANCEL_UPLINE_FLOW")
         send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
         log_event(
@@ -1068,7 +1528,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
                 "Em chưa thấy anh/chị nhập nội dung câu hỏi. "
                 "Anh/chị gõ rõ giúp em nội dung muốn gửi tuyến trên nhé."
             )
-            final_reply = build_ai_style_reply(text, reply_text_core)
+            final_reply = build_ai_style_reply(text, reply_text_core, intent="BUSINESS_QUESTION")
             send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
             log_event(
@@ -1095,7 +1555,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
             "• Nếu CẦN SỬA, anh/chị nhắn lại nội dung mới, em sẽ cập nhật trước khi gửi."
         )
 
-        final_reply = build_ai_style_reply(text, reply_text_core)
+        final_reply = build_ai_style_reply(text, reply_text_core, intent="BUSINESS_QUESTION")
         send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
         log_event(
@@ -1112,10 +1572,9 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
 
     # ===== 2. ĐANG Ở TRẠNG THÁI CHỜ XÁC NHẬN GỬI TUYẾN TRÊN =====
     if state == "waiting_confirm":
-        confirm_norm = t_norm
         main_question = (PENDING_UPLINE_TEXT.get(chat_key) or {}).get("main_question", "")
 
-        if is_confirm_send(confirm_norm) and main_question:
+        if is_confirm_send(flags) and main_question:
             # Gửi tuyến trên thật sự
             reply_text_core = escalate_to_upline(
                 chat_id=chat_id,
@@ -1128,7 +1587,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
             PENDING_UPLINE_STATE.pop(chat_key, None)
             PENDING_UPLINE_TEXT.pop(chat_key, None)
 
-            final_reply = build_ai_style_reply(text, reply_text_core)
+            final_reply = build_ai_style_reply(text, reply_text_core, intent="BUSINESS_QUESTION")
             send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
             log_event(
@@ -1156,7 +1615,7 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
                 "Nếu vẫn chưa đúng, anh/chị gõ lại nội dung mới nhé."
             )
 
-            final_reply = build_ai_style_reply(text, reply_text_core)
+            final_reply = build_ai_style_reply(text, reply_text_core, intent="BUSINESS_QUESTION")
             send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
             log_event(
@@ -1171,84 +1630,41 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
             LAST_USER_TEXT[chat_key] = text
             return
 
-    # ===== 3. TRƯỜNG HỢP BÌNH THƯỜNG: PHÂN TÍCH INTENT & TRẢ LỜI =====
-    intent_info = classify_intent_with_openai(text)
-    intent = intent_info.get("intent", "SMALL_TALK")
-    health_issue = intent_info.get("health_issue")
-    product_query = intent_info.get("product_query")
-    needs = intent_info.get("needs") or []
-    ask_upline_flag = bool(intent_info.get("ask_upline", False))
-
-    if intent == "HEALTH_COMBO":
-        combo = search_combo_by_health_issue(health_issue or text)
-        reply_text_core = format_combo_reply(combo, needs, health_issue or text)
-
-    elif intent == "HEALTH_PRODUCT":
-        if product_query:
-            product = search_product_by_name_or_code(product_query)
-            reply_text_core = format_product_reply(product, needs, health_issue=None)
-        else:
-            products = search_product_by_health_issue(health_issue or text)
-            if not products:
-                reply_text_core = format_product_reply(None, needs, health_issue or text)
-            elif len(products) == 1:
-                reply_text_core = format_product_reply(products[0], needs, health_issue or text)
-            else:
-                lines = [f"<b>Một số sản phẩm phù hợp với vấn đề {health_issue or text}:</b>"]
-                for p in products:
-                    name = strip_markdown(p.get("name", "Sản phẩm"))
-                    code = strip_markdown(p.get("code", ""))
-                    url = (p.get("product_url", "") or "").strip()
-                    line = f"• {name}"
-                    if code:
-                        line += f" (Mã: {code})"
-                    if url:
-                        line += f"\n   🔗 {url}"
-                    lines.append(line)
-                lines.append("")
-                lines.append("Nếu anh/chị muốn xem chi tiết sản phẩm nào, hãy hỏi theo tên hoặc mã sản phẩm cụ thể nhé.")
-                reply_text_core = "\n".join(lines)
-
-    elif intent == "PRODUCT_DETAIL":
-        product = search_product_by_name_or_code(product_query or text)
-        reply_text_core = format_product_reply(product, needs, health_issue=None)
-
-    elif intent == "HOW_TO_BUY":
-        reply_text_core = format_faq_reply(faq_buy_data)
-
-    elif intent == "HOW_TO_PAY":
-        reply_text_core = format_faq_reply(faq_payment_data)
-
-    elif intent == "NAVIGATION":
-        reply_text_core = format_navigation_reply()
-
-    elif intent == "BUSINESS_QUESTION":
-        faq_answer = match_business_faq(text)
-        if faq_answer:
-            reply_text_core = faq_answer
-        else:
-            # Luôn bắt người dùng nhập nội dung cụ thể trước khi gửi tuyến trên
-            ask_upline_flag = True
-            PENDING_UPLINE_STATE[chat_key] = "waiting_content"
-            PENDING_UPLINE_TEXT.pop(chat_key, None)
-            reply_text_core = (
-                "Vấn đề này thuộc nhóm chính sách/kinh doanh hoặc tình huống khó.\n\n"
-                "Anh/chị cho em <b>nội dung câu hỏi cụ thể</b> muốn gửi tuyến trên "
-                "(tình huống, sản phẩm/combo, mức giá, chính sách...), "
-                "em sẽ ghi lại rồi nhắc lại để anh/chị xác nhận trước khi gửi đi ạ."
-            )
-
-    else:
-        reply_text_core = (
-            "Em là trợ lý AI nội bộ hỗ trợ anh/chị TVV trong việc tư vấn sản phẩm, combo và cách chăm sóc sức khoẻ.\n\n"
-            "Anh/chị có thể hỏi em về:\n"
-            "• Combo cho một vấn đề sức khỏe (ví dụ: tiểu đường, dạ dày, xương khớp...)\n"
-            "• Thông tin chi tiết một sản phẩm (thành phần, lợi ích, cách dùng...)\n"
-            "• Cách mua hàng, thanh toán, kênh chính thức của công ty\n"
-            "• Những thắc mắc về kinh doanh, chính sách (em sẽ hỗ trợ chuyển tuyến trên nếu cần) 😊"
+    # ===== 2.5. HỎI THEO KHOẢNG GIÁ: tra index giá, không phân loại / làm mượt bằng OpenAI =====
+    price_reply = answer_price_query(t_norm, text)
+    if price_reply:
+        send_telegram_message(chat_id, price_reply, reply_to_message_id=msg_id)
+        log_event(
+            log_type="BOT_REPLY",
+            chat_id=chat_id,
+            username=username or "",
+            role="bot",
+            bot_reply=price_reply,
+            intent="PRICE_RANGE",
         )
+        CHAT_CONTEXT.add_turn(chat_key, text, "PRICE_RANGE")
+        LAST_USER_TEXT[chat_key] = text
+        return
 
-    final_reply = build_ai_style_reply(text, reply_text_core)
+    # ===== 3. TRƯỜNG HỢP BÌNH THƯỜNG: PHÂN TÍCH INTENT & TRẢ LỜI =====
+    context = CHAT_CONTEXT.render(chat_key, CONTEXT_TOKEN_BUDGET)
+    # không có OpenAI thì phân loại từ khoá xong ngay, không có gì để chạy song song
+    lookups = start_speculative_lookups(text, t_norm) if SPECULATE and get_openai_client() else None
+    try:
+        intent_info = classify_intent_with_openai(text, context=context)
+        if context:
+            intent_info = apply_followup_context(intent_info, text, chat_key)
+        subs = get_sub_intents(intent_info, text)
+        intent = "+".join(sub["intent"] for sub in subs)
+        health_issue = "; ".join(sub["health_issue"] for sub in subs if sub.get("health_issue"))
+        product_query = "; ".join(sub["product_query"] for sub in subs if sub.get("product_query"))
+
+        reply_text_core, ask_upline_flag = resolve_sub_intents(subs, text, chat_key, lookups)
+    finally:
+        if lookups is not None:
+            lookups.finish()
+
+    final_reply = build_ai_style_reply(text, reply_text_core, intent=intent)
     send_telegram_message(chat_id, final_reply, reply_to_message_id=msg_id)
 
     log_event(
@@ -1263,17 +1679,430 @@ def handle_user_message(chat_id, text, username=None, msg_id=None):
         ask_upline="yes" if ask_upline_flag else "no",
     )
 
+    CHAT_CONTEXT.add_turn(chat_key, text, intent, health_issue)
     LAST_USER_TEXT[chat_key] = text
 
+# ============== BROADCAST (TUYẾN TRÊN -> MỌI TVV) ==============
+# Chat riêng nào từng nhắn bot được ghi vào known_chats (SQLite, BOT_DB_PATH).
+STORE = BotStore()
+
+
+def notify_upline(text):
+    if UPLINE_CHAT_ID:
+        send_telegram_message(UPLINE_CHAT_ID, text, parse_mode=None)
+
+
+BROADCASTS = BroadcastRunner(STORE, SENDER, notify=notify_upline)
+
+
+def handle_broadcast_command(text, username=None):
+    """
+    /broadcast <nội dung> | /broadcast_status [id] | /broadcast_stop <id>
+    Trả về câu trả lời cho tuyến trên.
+    """
+    cmd, _, arg = text.strip().partition(" ")
+    arg = arg.strip()
+    cmd = cmd.split("@", 1)[0]
+    if cmd == "/broadcast_status":
+        info = STORE.get_broadcast(int(arg) if arg.isdigit() else None)
+        return BROADCASTS.format_progress(info["id"]) if info else "Chưa có broadcast nào."
+    if cmd == "/broadcast_stop":
+        if not arg.isdigit():
+            return "Cú pháp: /broadcast_stop <id>"
+        return f"Đã dừng broadcast #{arg}." if BROADCASTS.stop(int(arg)) else f"Broadcast #{arg} không còn chạy."
+    if not arg:
+        return (
+            "Cú pháp: /broadcast <nội dung thông báo>\n"
+            f"Sẽ gửi tới {STORE.count_chats()} TVV đã từng nhắn bot.\n"
+            "Xem tiến độ: /broadcast_status, dừng: /broadcast_stop <id>"
+        )
+    bid, total = BROADCASTS.start(
+        f"📣 Thông báo từ tuyến trên:\n\n{arg}", created_by=username or "", exclude=[UPLINE_CHAT_ID]
+    )
+    return f"Đã tạo broadcast #{bid} tới {total} TVV, tiến độ sẽ báo tại đây."
+
+
+# ============== NHẮC LỊCH (TVV) ==============
+# /nhac <khi> [xN] [nội dung]: tới giờ bot nhắn lại TVV (hẹn hỏi thăm khách, nhắc khách uống đều).
+# Lịch lưu SQLite, heap trong RAM (scheduler.py), restart không mất / không gửi trùng.
+REMINDERS = ReminderScheduler(STORE, SENDER)
+MAX_REMINDERS_PER_CHAT = 50
+
+REMINDER_HELP = (
+    "Cú pháp: /nhac <khi> [xN] [nội dung]\n"
+    "• khi: 30p, 2h, 3d (sau 30 phút / 2 giờ / 3 ngày), 1w (1 tuần), 20:30, 25/12, 25/12 20:30\n"
+    "• xN: lặp thêm N lần cùng khoảng, ví dụ /nhac 1d x29 nhắc chị Lan uống combo\n"
+    "• bỏ trống nội dung: dùng mẫu nhắc khách uống đều\n"
+    "Xem lịch: /nhac_list, huỷ: /nhac_huy <id>"
+)
+
+
+def build_reminder_text(content):
+    content = content.strip() or "Nhắc khách dùng sản phẩm đều đặn"
+    template = get_catalog().canned_responses.get("nhac_lich_uong", "")
+    text = f"⏰ Nhắc lịch: {content}"
+    if template:
+        text += f"\n\nMẫu tin gửi khách:\n{template}"
+    return text
+
+
+def handle_reminder_command(chat_id, text):
+    """
+    /nhac ... | /nhac_list | /nhac_huy <id>. Trả về câu trả lời cho TVV (text thường).
+    """
+    cmd, _, arg = text.strip().partition(" ")
+    cmd = cmd.split("@", 1)[0]
+    arg = arg.strip()
+    if cmd == "/nhac_list":
+        rows = STORE.list_reminders(chat_id)
+        if not rows:
+            return "Anh/chị chưa có lịch nhắc nào đang chờ."
+        lines = ["Lịch nhắc đang chờ:"]
+        for rid, due_at, body, repeat_left in rows:
+            first = body.split("\n", 1)[0].replace("⏰ Nhắc lịch: ", "")
+            more = f" (còn lặp {repeat_left} lần)" if repeat_left else ""
+            lines.append(f"#{rid} – {format_due(due_at)}{more}: {first[:80]}")
+        return "\n".join(lines)
+    if cmd == "/nhac_huy":
+        if not arg.isdigit():
+            return "Cú pháp: /nhac_huy <id> (xem id bằng /nhac_list)"
+        return f"Đã huỷ lịch #{arg}." if REMINDERS.cancel(int(arg), chat_id) else f"Không có lịch #{arg} đang chờ."
+
+    words = arg.split()
+    parsed = parse_when([w.lower() for w in words[:3]])
+    if not parsed:
+        return REMINDER_HELP
+    due_at, interval_s, repeat, used = parsed
+    if len(STORE.list_reminders(chat_id, limit=MAX_REMINDERS_PER_CHAT)) >= MAX_REMINDERS_PER_CHAT:
+        return f"Anh/chị đang có {MAX_REMINDERS_PER_CHAT} lịch chờ, huỷ bớt bằng /nhac_huy <id> nhé."
+    rid = REMINDERS.add(chat_id, build_reminder_text(" ".join(words[used:])), due_at, interval_s, repeat)
+    more = f", lặp thêm {repeat} lần" if repeat else ""
+    return f"✅ Đã hẹn lịch #{rid} lúc {format_due(due_at)}{more}."
+
+
+# ============== MẪU TIN SOẠN SẴN (/mau) ==============
+# canned_responses.json nạp cùng catalog, index tiền tố ở canned.py.
+# Trả thẳng từ RAM, không phân loại / không làm mượt bằng OpenAI.
+BOT_COMMANDS = (
+    {"command": "start", "description": "Giới thiệu trợ lý"},
+    {"command": "nhac", "description": "Hẹn lịch nhắc chăm sóc khách"},
+    {"command": "nhac_list", "description": "Xem lịch nhắc đang chờ"},
+)
+
+
+def handle_canned_command(text):
+    """
+    /mau <tên mẫu hoặc tiền tố> | /mau_<tên mẫu>. Trả về câu trả lời (text thường).
+    1 mẫu khớp -> gửi đúng nội dung mẫu để TVV chuyển tiếp cho khách.
+    """
+    cmd, _, arg = text.strip().partition(" ")
+    cmd = cmd.split("@", 1)[0]
+    query = cmd[len("/mau_"):] if cmd.startswith("/mau_") else arg.strip()
+    index = get_catalog().index("canned")
+    names = index.search(query) if index else []
+    if len(names) == 1:
+        record_canned_hit(names[0])
+        return index.get(names[0])
+    if not names:
+        head = f"Không có mẫu nào khớp “{query}”." if query else "Chưa có mẫu tin nào."
+        names = sorted(index.responses) if index else []
+        if not names:
+            return head
+    else:
+        head = f"Có {len(names)} mẫu khớp “{query}”:" if query else "Các mẫu tin soạn sẵn:"
+    lines = [head]
+    lines.extend(f"/mau_{name}" for name in names)
+    lines.append("Gõ /mau <tên mẫu> (hoặc vài chữ đầu) để lấy nội dung.")
+    return "\n".join(lines)
+
+
+def set_bot_commands():
+    """
+    Đồng bộ menu lệnh Telegram (setMyCommands) theo danh sách mẫu hiện tại.
+    """
+    index = get_catalog().index("canned")
+    if not TELEGRAM_TOKEN or index is None:
+        return False
+    try:
+        resp = requests.post(
+            f"{TELEGRAM_API_BASE}/bot{TELEGRAM_TOKEN}/setMyCommands",
+            json={"commands": menu_commands(index, base=BOT_COMMANDS)},
+            timeout=10,
+        )
+        if resp.status_code != 200:
+            print("[WARN] setMyCommands:", resp.status_code, resp.text[:200])
+            return False
+        return True
+    except Exception as e:
+        print("[WARN] Không cập nhật được menu lệnh Telegram:", e)
+        return False
+
+
+# ============== INLINE MODE ==============
+# `@bot antig` trong chat với khách: gợi ý thẻ sản phẩm từ index tiền tố (inline_search.py),
+# không gọi OpenAI. Telegram cache kết quả theo query cache_time giây, bot cache thêm
+# danh sách result đã dựng cho (version catalog, query).
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300") or 300)
+INLINE_MAX_RESULTS = 10
+INLINE_CACHE_SIZE = 512
+INLINE_RESULT_CACHE = {}  # (version, query) -> (hết hạn, results)
+_inline_cache_lock = threading.Lock()
+
+
+def build_inline_result(result_id, product):
+    price_text = strip_markdown(product.get("price_text", ""))
+    benefits = strip_markdown(product.get("benefits_text", "")).replace("\n", " ").lstrip("-• ")
+    description = " · ".join(x for x in (price_text, benefits[:90]) if x)
+    card = format_product_reply(product, [])
+    if len(card) > 4000:
+        card = card[:4000].rsplit("\n", 1)[0]
+    result = {
+        "type": "article",
+        "id": result_id,
+        "title": strip_markdown(product.get("name", "Sản phẩm")),
+        "description": description,
+        "input_message_content": {
+            "message_text": card,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        },
+    }
+    url = (product.get("product_url", "") or "").strip()
+    if url:
+        result["url"] = url
+        result["hide_url"] = True
+    return result
+
+
+def inline_results(query: str):
+    key = (get_catalog().version, normalize_text(query))
+    now = time.time()
+    cached = INLINE_RESULT_CACHE.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    results = [
+        build_inline_result(result_id, p)
+        for result_id, p in search_inline(get_catalog(), query, k=INLINE_MAX_RESULTS, with_ids=True)
+    ]
+    with _inline_cache_lock:
+        if len(INLINE_RESULT_CACHE) >= INLINE_CACHE_SIZE:
+            INLINE_RESULT_CACHE.clear()
+        INLINE_RESULT_CACHE[key] = (now + INLINE_CACHE_TIME, results)
+    return results
+
+
+def handle_inline_query(inline_query):
+    """
+    Trả về payload answerInlineQuery để gửi luôn trong response của webhook
+    (Telegram cho phép gọi 1 method bằng response), không mất thêm 1 lượt HTTP.
+    """
+    return {
+        "method": "answerInlineQuery",
+        "inline_query_id": inline_query.get("id"),
+        "results": inline_results(inline_query.get("query", "") or ""),
+        "cache_time": INLINE_CACHE_TIME,
+        "is_personal": False,
+    }
+
+
+# ============== WARM-UP NỀN ==============
+# Flask mở port ngay, catalog + index + OpenAI client được nạp ở thread nền.
+# Request đến sớm vẫn chạy đúng: get_catalog() sẽ chờ lần nạp đang diễn ra.
+STARTED_AT = time.time()
+WARMUP_STATE = {"catalog": False, "openai": False, "ready_at": None, "error": ""}
+
+
+def start_background_jobs():
+    """
+    Thread nền của process đang phục vụ request (gunicorn: gọi ở post_fork của từng worker).
+    """
+    CATALOG.start_watcher(CATALOG_WATCH_INTERVAL)
+    try:
+        resumed = BROADCASTS.resume()
+        if resumed:
+            print(f"[INFO] Chạy tiếp broadcast: {resumed}")
+    except Exception as e:
+        print("[WARN] Không chạy tiếp được broadcast:", e)
+    BROADCASTS.start_reclaimer()
+    try:
+        REMINDERS.start()
+        print(f"[INFO] Scheduler nhắc lịch: {REMINDERS.pending()} lịch đang chờ")
+    except Exception as e:
+        print("[WARN] Không bật được scheduler nhắc lịch:", e)
+
+
+def stop_background_jobs():
+    """
+    Process sắp thoát (gunicorn worker_exit / atexit): trả lease broadcast, dừng scheduler.
+    """
+    try:
+        BROADCASTS.shutdown()
+    except Exception as e:
+        print("[WARN] Dừng broadcast lỗi:", e)
+    REMINDERS.stop()
+
+
+atexit.register(stop_background_jobs)
+
+
+def warm_up(watch=True):
+    try:
+        snapshot = get_catalog()  # gọi sau khi các index đã @register_index xong
+        guard = snapshot.index("claim_guard")
+        if guard is not None:
+            guard.compile()
+        WARMUP_STATE["catalog"] = True
+        set_bot_commands()
+        if watch:
+            start_background_jobs()
+        WARMUP_STATE["openai"] = get_openai_client() is not None
+        WARMUP_STATE["ready_at"] = time.time()
+        print(f"[INFO] Warm-up xong sau {WARMUP_STATE['ready_at'] - STARTED_AT:.2f}s")
+    except Exception as e:
+        WARMUP_STATE["error"] = str(e)
+        print("[ERROR] Warm-up lỗi:", e)
+
+
+def start_warm_up():
+    t = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    t.start()
+    return t
+
+
+WARMUP_MODE = os.getenv("EAGER_WARMUP", "")
+if WARMUP_MODE == "preload":
+    # gunicorn preload_app (gunicorn.conf.py): nạp hết trong master trước khi fork,
+    # thread không sống qua fork nên watcher do từng worker tự bật ở post_fork.
+    warm_up(watch=False)
+elif WARMUP_MODE == "1":
+    warm_up()
+else:
+    start_warm_up()
+
+# ============== PROFILE THEO YÊU CẦU (profiling.py) ==============
+# Tuyến trên: /profile cpu 50 | /profile sample 30s | /profile mem 2m | /profile stop | /profile
+# hoặc POST /debug/profile với header X-Admin-Token = PROFILE_ADMIN_TOKEN (để trống = tắt route).
+PROFILE_DIR = os.getenv("PROFILE_DIR", "") or os.path.join(BASE_DIR, "profiles")
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_HELP = (
+    "Profile worker này khi bot chậm:\n"
+    "/profile cpu 50 — cProfile 50 request tới (hoặc cpu 30s)\n"
+    "/profile sample 30s — lấy mẫu stack 30 giây (collapsed stacks cho flamegraph)\n"
+    "/profile mem 2m — tracemalloc + kích thước state global trong 2 phút\n"
+    "/profile stop — dừng sớm, /profile — xem phiên đang chạy"
+)
+PROFILER = Profiler(
+    PROFILE_DIR,
+    gauges={
+        "LAST_USER_TEXT": lambda: len(LAST_USER_TEXT),
+        "PENDING_UPLINE_STATE": lambda: len(PENDING_UPLINE_STATE),
+        "PENDING_UPLINE_TEXT": lambda: len(PENDING_UPLINE_TEXT),
+        "CHAT_CONTEXT": lambda: len(CHAT_CONTEXT),
+        "INLINE_RESULT_CACHE": lambda: len(INLINE_RESULT_CACHE),
+        "PRODUCT_HITS": lambda: len(PRODUCT_HITS),
+        "OPENAI_IN_FLIGHT": lambda: OPENAI_FLIGHT.in_flight(),
+    },
+    on_report=notify_upline,
+)
+
+
+def handle_profile_command(text):
+    mode, requests_n, seconds = parse_profile_command(text)
+    if mode == "status":
+        return PROFILER.status() + "\n\n" + PROFILE_HELP
+    if mode == "stop":
+        return PROFILER.stop()
+    if mode == "invalid":
+        return PROFILE_HELP
+    return PROFILER.start(mode, requests=requests_n, seconds=seconds)
+
+
 # ============== ROUTES FLASK ==============
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({"status": "ok", "message": "Welllab AI Assistant is running."})
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    200 khi catalog đã nạp xong (sẵn sàng trả lời), 503 khi còn đang warm-up.
+    """
+    ready = WARMUP_STATE["ready_at"] is not None
+    snap = CATALOG.latest()
+    body = {
+        "ready": ready,
+        "catalog_version": snap.version if snap else None,
+        "products": len(snap.products) if snap else 0,
+        "openai": WARMUP_STATE["openai"],
+        "uptime_s": round(time.time() - STARTED_AT, 2),
+        "warmup_s": round(WARMUP_STATE["ready_at"] - STARTED_AT, 3) if ready else None,
+    }
+    if WARMUP_STATE["error"]:
+        body["error"] = WARMUP_STATE["error"]
+    return jsonify(body), (200 if ready else 503)
+
+def _profile_limit(value, cast):
+    """
+    requests / seconds trong body /debug/profile: None hoặc số dương -> cast(value), sai -> ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    number = cast(value)
+    if not math.isfinite(number) or number <= 0:
+        raise ValueError(value)
+    return number
+
+
+@app.route("/debug/profile", methods=["POST"])
+def debug_profile():
+    token = request.headers.get("X-Admin-Token", "")
+    if not PROFILE_ADMIN_TOKEN or not hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode()):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    payload = request.get_json(force=True, silent=True) or {}
+    if payload.get("stop"):
+        message = PROFILER.stop()
+    elif payload.get("mode"):
+        mode = payload["mode"]
+        try:
+            if mode not in PROFILE_MODES:
+                raise ValueError(mode)
+            requests_limit = _profile_limit(payload.get("requests"), int)
+            seconds = _profile_limit(payload.get("seconds"), float)
+        except (TypeError, ValueError):
+            return jsonify({
+                "ok": False,
+                "error": f"mode phải là {'/'.join(PROFILE_MODES)}, requests / seconds phải là số dương",
+            }), 400
+        message = PROFILER.start(mode, requests=requests_limit, seconds=seconds)
+    else:
+        message = PROFILER.status()
+    return jsonify({"ok": True, "pid": os.getpid(), "message": message})
+
+
 @app.route("/webhook", methods=["POST"])
 def telegram_webhook():
+    # chỉ 1 phép đọc thuộc tính khi không profile
+    if PROFILER.active:
+        return PROFILER.run(handle_webhook_update)
+    return handle_webhook_update()
+
+
+def handle_webhook_update():
     update = request.get_json(force=True, silent=True) or {}
 
+    inline_query = update.get("inline_query")
+    if inline_query:
+        with CATALOG.pinned():
+            return jsonify(handle_inline_query(inline_query))
+
+    chosen = update.get("chosen_inline_result")
+    if chosen:
+        # cần bật /setinlinefeedback với BotFather mới nhận được
+        record_product_hit(code_from_result_id(chosen.get("result_id")))
+        return jsonify({"ok": True})
+
     message = update.get("message") or update.get("edited_message")
     if not message:
         return jsonify({"ok": True})
@@ -1287,6 +2116,13 @@ def telegram_webhook():
     if not chat_id:
         return jsonify({"ok": True})
 
+    # Cả request dùng chung 1 snapshot catalog, reload giữa chừng không ảnh hưởng
+    with CATALOG.pinned():
+        handle_telegram_message(message, chat_id, username, text)
+    return jsonify({"ok": True})
+
+
+def handle_telegram_message(message, chat_id, username, text):
     # Tin nhắn từ tuyến trên
     if UPLINE_CHAT_ID and str(chat_id) == str(UPLINE_CHAT_ID):
         if text.startswith("/reply"):
@@ -1306,12 +2142,68 @@ def telegram_webhook():
                     role="upline",
                     bot_reply=content,
                 )
+        elif text.startswith("/reload"):
+            # Reload catalog ở thread nền, báo kết quả lại cho tuyến trên
+            send_telegram_message(chat_id, "Đang reload dữ liệu sản phẩm/combo...")
+            def on_reloaded(ok, msg):
+                send_telegram_message(chat_id, ("✅ " if ok else "❌ ") + msg, parse_mode=None)
+                if ok:
+                    set_bot_commands()
+
+            CATALOG.reload_async(reason="/reload", callback=on_reloaded)
+        elif text.startswith("/broadcast"):
+            send_telegram_message(chat_id, handle_broadcast_command(text, username), parse_mode=None)
+        elif text.startswith("/profile"):
+            send_telegram_message(chat_id, handle_profile_command(text), parse_mode=None)
+        elif text.startswith("/usage"):
+            # Token / độ trễ OpenAI theo intent kể từ lúc process khởi động
+            send_telegram_message(
+                chat_id,
+                "\n\n".join((
+                    USAGE.format_table(),
+                    OPENAI_FLIGHT.format_stats(),
+                    format_canned_stats(USAGE),
+                    format_rule_stats(),
+                    format_claim_stats(),
+                    SPECULATION_STATS.format_stats(),
+                )),
+                parse_mode=None,
+            )
         else:
             send_telegram_message(
                 chat_id,
-                "Đây là kênh tuyến trên. Để trả lời TVV, dùng lệnh:\n/reply <chat_id> <nội dung>",
+                "Đây là kênh tuyến trên. Để trả lời TVV, dùng lệnh:\n/reply <chat_id> <nội dung>\n"
+                "Nạp lại dữ liệu sản phẩm/combo: /reload\n"
+                "Gửi thông báo tới mọi TVV: /broadcast <nội dung>\n"
+                "Thống kê token OpenAI và lượt dùng /mau: /usage\n"
+                "Profile khi bot chậm: /profile",
             )
-        return jsonify({"ok": True})
+        return
+
+    # Ghi nhận TVV (chat riêng) làm người nhận broadcast
+    if message.get("chat", {}).get("type", "private") == "private":
+        try:
+            STORE.touch_chat(chat_id, username)
+        except Exception as e:
+            print("[WARN] Không ghi được known_chats:", e)
+
+    # Mẫu tin soạn sẵn: trả từ RAM, không qua OpenAI
+    if text.startswith("/mau"):
+        send_telegram_message(chat_id, handle_canned_command(text), parse_mode=None)
+        log_event(
+            log_type="BOT_REPLY",
+            chat_id=chat_id,
+            username=username or "",
+            role="bot",
+            user_text=text,
+            intent="CANNED",
+        )
+        return
+
+    # Lệnh nhắc lịch của TVV
+    if text.startswith("/nhac"):
+        send_telegram_message(chat_id, handle_reminder_command(chat_id, text), parse_mode=None)
+        return
 
     # Lệnh /start
     if text.startswith("/start"):
@@ -1321,7 +2213,9 @@ def telegram_webhook():
             "• Combo cho các vấn đề sức khỏe (tiểu đường, dạ dày, mỡ máu, xương khớp...)\n"
             "• Thông tin chi tiết sản phẩm (thành phần, lợi ích, cách dùng...)\n"
             "• Cách mua hàng, thanh toán, kênh chính thức của công ty\n"
-            "• Câu hỏi kinh doanh, chính sách (em sẽ hỗ trợ chuyển tuyến trên nếu cần)\n\n"
+            "• Câu hỏi kinh doanh, chính sách (em sẽ hỗ trợ chuyển tuyến trên nếu cần)\n"
+            "• Hẹn lịch nhắc chăm sóc khách: /nhac 3d hỏi thăm chị Lan\n"
+            "• Mẫu tin soạn sẵn gửi khách: /mau\n\n"
             "Anh/chị cứ nhắn tự nhiên như đang hỏi một leader nhé 🥰"
         )
         send_telegram_message(chat_id, welcome, reply_to_message_id=message.get("message_id"))
@@ -1334,13 +2228,11 @@ def telegram_webhook():
             bot_reply=welcome,
             intent="START",
         )
-        return jsonify({"ok": True})
+        return
 
     # Các tin nhắn còn lại
     handle_user_message(chat_id, text, username=username, msg_id=message.get("message_id"))
 
-    return jsonify({"ok": True})
-
 # ============== MAIN ==============
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
@@ -0,0 +1,80 @@
+"""
+Thời gian nạp catalog: đọc JSON + build index (như trước) vs nạp artifact compile sẵn.
+
+Mỗi phép đo chạy trong 1 process riêng (đã import numpy trước để không tính vào):
+    python bench/bench_artifact.py [--sizes 92,10000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from synthetic import ROOT, synthetic_catalog
+from catalog import CATALOG_FILES
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def child(mode, src, artifact):
+    import numpy  # noqa: F401
+    import indexes  # noqa: F401
+    from catalog import CatalogManager
+
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    manager = CatalogManager(src, artifact_path=artifact if mode == "artifact" else None)
+    snap = manager.current()
+    print(json.dumps({"ms": (time.perf_counter() - t0) * 1000, "rss": rss_mb() - rss0, "source": snap.source}))
+
+
+def write_sources(data, dirname):
+    for name, (filename, _, key) in CATALOG_FILES.items():
+        value = {key: data[name]} if key else data[name]
+        with open(os.path.join(dirname, filename), "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="92,10000")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "SRC", "ARTIFACT"))
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'SKU':>7} {'artifact KB':>12} {'compile s':>10} {'json ms':>9} {'json RSS MB':>12} {'artifact ms':>12} {'artifact RSS MB':>16}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as src:
+            write_sources(synthetic_catalog(n), src)
+            artifact = os.path.join(src, "catalog.bin")
+            t0 = time.perf_counter()
+            subprocess.run(
+                [sys.executable, os.path.join(ROOT, "compile_catalog.py"), "--src", src, "--out", artifact],
+                check=True, capture_output=True,
+            )
+            t_compile = time.perf_counter() - t0
+            res = {}
+            for mode in ("json", "artifact"):
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", mode, src, artifact],
+                    capture_output=True, text=True, check=True,
+                )
+                res[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{n:>7} {os.path.getsize(artifact) / 1024:>12.0f} {t_compile:>10.2f} "
+                f"{res['json']['ms']:>9.1f} {res['json']['rss']:>12.1f} "
+                f"{res['artifact']['ms']:>12.1f} {res['artifact']['rss']:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Broadcast tới N chat giả lập qua Telegram stub:
+  - tốc độ thực tế so với BROADCAST_RATE, tốc độ đỉnh trong 1 giây
+  - 1% chat trả 403 (đã chặn bot) -> đánh dấu blocked; stub trả 429 ngẫu nhiên -> tự chờ retry_after
+  - kill -9 process giữa chừng: process thứ 2 (đã chạy sẵn) nhận lại job qua vòng reclaim khi
+    lease hết hạn; rồi SIGTERM process thứ 2 (dừng êm, trả lease): process thứ 3 nhận ngay lúc khởi động
+  - đếm số chat nhận trùng / bị sót, thời gian chuyển giao sau từng lần dừng
+Sót tin, job không xong hoặc chuyển giao quá chậm -> exit code 1.
+
+    python bench/bench_broadcast.py [--chats 2000] [--rate 20] [--lease 2]
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+from bot_store import BotStore
+from broadcast import BroadcastRunner
+from telegram_sender import TelegramSender
+
+
+class _Stub(BaseHTTPRequestHandler):
+    received = Counter()
+    per_second = Counter()
+    last_send = 0.0
+    lock = threading.Lock()
+    rnd = random.Random(1)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        chat_id = body["chat_id"]
+        with _Stub.lock:
+            throttle = _Stub.rnd.random() < 0.002
+            if not throttle and chat_id % 100 != 7:
+                _Stub.received[chat_id] += 1
+                _Stub.per_second[int(time.time())] += 1
+                _Stub.last_send = time.time()
+        if throttle:
+            self._reply(429, {"ok": False, "description": "Too Many Requests", "parameters": {"retry_after": 1}})
+        elif chat_id % 100 == 7:
+            self._reply(403, {"ok": False, "description": "Forbidden: bot was blocked by the user"})
+        else:
+            self._reply(200, {"ok": True})
+
+    def _reply(self, code, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def child(db, api_base, rate, lease, mode):
+    """
+    Chạy runner trong process riêng (để có thể kill giữa chừng). SIGTERM -> dừng êm như gunicorn.
+    """
+    store = BotStore(db)
+    runner = BroadcastRunner(store, TelegramSender(api_base, "bench", rate=30), notify=print, rate=rate, lease=lease)
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    if mode == "start":
+        runner.start("bench broadcast")
+    else:
+        runner.resume()
+        runner.start_reclaimer(interval=lease / 4)
+    while not done.wait(0.1):
+        info = store.get_broadcast()
+        if info and info["status"] != "running":
+            break
+    runner.shutdown()
+
+
+def owner_of(store):
+    return store.conn().execute("SELECT owner FROM broadcasts ORDER BY id DESC LIMIT 1").fetchone()[0]
+
+
+def wait_for_takeover(store, old_owner, after, timeout):
+    """
+    Giây từ after tới lúc process khác nhận job (owner đổi) và gửi tin đầu tiên, None nếu quá timeout.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        owner = owner_of(store)
+        if owner and owner != old_owner:
+            claimed = time.time()
+            while time.time() < deadline:
+                if _Stub.last_send > claimed:
+                    return _Stub.last_send - after
+                time.sleep(0.01)
+            return None
+        time.sleep(0.01)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=20)
+    parser.add_argument("--lease", type=float, default=2.0, help="BROADCAST lease (giây) cho bench")
+    parser.add_argument("--child", nargs=5, metavar=("DB", "API", "RATE", "LEASE", "MODE"))
+    args = parser.parse_args()
+    if args.child:
+        db, api, rate, lease, mode = args.child
+        child(db, api, float(rate), float(lease), mode)
+        return
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    api = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bot.db")
+        store = BotStore(db)
+        for chat_id in range(1, args.chats + 1):
+            store.touch_chat(chat_id, f"tvv{chat_id}")
+
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", db, api, str(args.rate), str(args.lease)]
+        t0 = time.time()
+        first = subprocess.Popen(cmd + ["start"], stdout=subprocess.DEVNULL)
+        time.sleep(args.chats * 0.3 / args.rate)
+        # process thứ 2 chạy sẵn trong lúc process đầu còn giữ lease
+        second = subprocess.Popen(cmd + ["resume"], stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+        old_owner = owner_of(store)
+        first.send_signal(signal.SIGKILL)
+        first.wait()
+        killed_at = time.time()
+        sent_at_kill = sum(_Stub.received.values())
+        takeover_kill = wait_for_takeover(store, old_owner, killed_at, args.lease * 3 + 5)
+
+        time.sleep(args.chats * 0.3 / args.rate)
+        old_owner = owner_of(store)
+        second.send_signal(signal.SIGTERM)
+        second.wait(timeout=60)
+        termed_at = time.time()
+        sent_at_term = sum(_Stub.received.values())
+        dup_before_term = sum(1 for n in _Stub.received.values() if n > 1)
+        third = subprocess.Popen(cmd + ["resume"], stdout=subprocess.DEVNULL)
+        takeover_term = wait_for_takeover(store, old_owner, termed_at, 10)
+        third.wait(timeout=args.chats / args.rate * 3 + 30)
+        t_end = time.time()
+
+        info = store.get_broadcast()
+        blocked = store.conn().execute("SELECT COUNT(*) FROM known_chats WHERE blocked = 1").fetchone()[0]
+        expected = {c for c in range(1, args.chats + 1) if c % 100 != 7}
+        dup = sum(1 for n in _Stub.received.values() if n > 1)
+        missing = len(expected - set(_Stub.received))
+        sends = sum(_Stub.received.values())
+        peak = max(_Stub.per_second.values())
+        print(f"chats {args.chats}, rate {args.rate}/s, lease {args.lease}s")
+        print(f"kill -9 sau {sent_at_kill} tin -> process khác gửi tiếp sau {takeover_kill or -1:.2f}s (chờ lease hết hạn)")
+        print(f"SIGTERM sau {sent_at_term} tin -> process mới gửi tiếp sau {takeover_term or -1:.2f}s (lease đã trả)")
+        print(f"status {info['status']}: sent {info['sent']}, failed {info['failed']}, blocked marked {blocked}")
+        print(f"delivered {len(_Stub.received)}/{len(expected)}, missing {missing}, duplicated {dup} "
+              f"({dup - dup_before_term} sau SIGTERM)")
+        print(f"throughput {sends / (t_end - t0):.1f} msg/s (gồm thời gian chuyển giao), peak {peak} msg in 1s")
+
+        failed = []
+        if missing or info["status"] != "done":
+            failed.append(f"job chưa xong: status {info['status']}, sót {missing}")
+        if takeover_kill is None or takeover_kill > args.lease * 2 + 2:
+            failed.append(f"kill -9: không nhận lại job trong thời hạn ({takeover_kill})")
+        if takeover_term is None or takeover_term > 3:
+            failed.append(f"SIGTERM: process mới không nhận job ngay ({takeover_term})")
+        if peak > args.rate * 1.5:
+            failed.append(f"vượt tốc độ: {peak} tin trong 1 giây")
+        for line in failed:
+            print("[FAIL]", line)
+    stub.shutdown()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Chặn khẳng định y khoa trong câu trả lời model (rules.json claim_guard, compliance.ClaimGuard):
+  - câu mẫu: action mong đợi, lời nhắc của bot ("không thay thế thuốc") không bị bắt, khớp đúng
+    dấu ("thầy thuốc", "chưa khỏi" không phải cụm cấm); sai -> exit 1
+  - stream: cắt câu thành chunk ngẫu nhiên, kết quả phải giống kiểm tra cả câu
+  - chi phí: µs / câu trả lời dài cỡ thật, µs / chunk khi stream
+  - end-to-end: OpenAI giả chèn "chữa khỏi" -> build_ai_style_reply trả nội dung gốc
+
+    python bench/bench_claims.py [--repeat 2000]
+"""
+import sys
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import app
+from compliance import format_claim_stats
+from text_norm import normalize_text
+
+CASES = [
+    ("Sản phẩm giúp chữa khỏi tiểu đường ạ.", "fallback"),
+    ("Anh có thể thay   thế thuốc bằng combo này.", "fallback"),
+    ("Dùng đều thì khách có thể NGƯNG THUỐC huyết áp.", "fallback"),
+    ("Dựa vào triệu chứng thì chị bị bệnh gan rồi.", "flag"),
+    ("Đây là thần dược cho dạ dày, đặc trị trào ngược.", "redact"),
+    ("Đây là thực phẩm bảo vệ sức khỏe, không phải thuốc, không thay thế thuốc chữa bệnh.", "pass"),
+    ("Anh nhắc khách không tự ý bỏ thuốc đang dùng nhé.", "pass"),
+    ("Sản phẩm hỗ trợ, không cam kết chữa khỏi bệnh ạ.", "pass"),
+    ("Khách nên đi khám để có chẩn đoán của bác sĩ.", "pass"),
+    ("Combo gồm trà và viên uống, dùng 2 lần mỗi ngày.", "pass"),
+    ("Anh/chị nên hỏi ý kiến thầy thuốc trước khi dùng ạ.", "pass"),
+    ("Nếu dùng 1 tháng mà chưa khỏi thì anh/chị đi khám lại nhé.", "pass"),
+    ("Khách đã khỏi hẳn bệnh sau khi dùng.", "fallback"),
+]
+
+
+def stream_check(guard, text, rng):
+    stream = guard.stream()
+    out = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 12)
+        out.append(stream.feed(text[i:i + n]))
+        i += n
+    out.append(stream.close())
+    return stream.action, stream.hits, "".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    snapshot = app.get_catalog()
+    guard = snapshot.index("claim_guard")
+    failed = 0
+    for text, expected in CASES:
+        got = guard.check(text)
+        if got["action"] != expected:
+            failed += 1
+            print(f"[FAIL] {text!r}: mong đợi {expected}, ra {got['action']} {got['hits']}")
+    print(f"câu mẫu: {len(CASES) - failed}/{len(CASES)} đúng")
+
+    rng = random.Random(1)
+    mismatched = 0
+    for text, _ in CASES:
+        full = guard.check(text)
+        for _ in range(100):
+            action, hits, out = stream_check(guard, text, rng)
+            if action != full["action"] or hits != full["hits"] or (action != "fallback" and out != full["text"]):
+                mismatched += 1
+    print(f"stream chunk ngẫu nhiên: {mismatched} lần khác kiểm tra cả câu")
+
+    # câu trả lời cỡ thật: nội dung combo trong catalog
+    replies = [app.format_combo_reply(c, ["combo", "usage"], "") for c in snapshot.combos[:20]]
+    avg_len = sum(map(len, replies)) / len(replies)
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for r in replies:
+            guard.check(r)
+    per_reply = (time.perf_counter() - t0) / (args.repeat * len(replies)) * 1e6
+    chunks = 0
+    t0 = time.perf_counter()
+    for _ in range(args.repeat // 10 or 1):
+        for r in replies:
+            stream = guard.stream()
+            for i in range(0, len(r), 16):
+                stream.feed(r[i:i + 16])
+                chunks += 1
+            stream.close()
+    per_chunk = (time.perf_counter() - t0) / chunks * 1e6
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for r in replies:
+            normalize_text(r)
+    per_fold = (time.perf_counter() - t0) / (args.repeat * len(replies)) * 1e6
+    print(f"câu trả lời ~{avg_len:.0f} ký tự: {per_reply:.1f} µs / câu, stream chunk 16 ký tự: {per_chunk:.2f} µs / chunk")
+    print(f"  (so sánh: riêng bỏ dấu cả câu để khớp trên bản normalize đã mất {per_fold:.1f} µs)")
+
+    def create(model, messages, **kw):
+        content = messages[-1]["content"].split("NỘI DUNG CỐT LÕI:\n", 1)[-1]
+        content = "Dạ, dùng đều là chữa khỏi hẳn ạ. " + content
+        usage = SimpleNamespace(prompt_tokens=300, completion_tokens=60, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    core = "Combo hỗ trợ dạ dày gồm 2 sản phẩm. Sản phẩm không thay thế thuốc chữa bệnh."
+    reply = app.build_ai_style_reply("combo dạ dày", core, intent="HEALTH_COMBO")
+    ok = reply == core
+    print(f"end-to-end: model chèn 'chữa khỏi' -> {'dùng nội dung gốc' if ok else 'SAI: ' + reply!r}")
+    print(format_claim_stats())
+    if failed or mismatched or not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Cờ từ khoá điều khiển luồng (keyword_flags.py + keywords.json):
+  - kiểm tra bộ câu mẫu bench/keyword_cases.json: mỗi câu phải ra đúng tập cờ ghi trong file
+    (thêm từ khoá mới -> thêm câu mẫu vào file, không cần sửa code); sai thì exit code 1
+  - so với cách cũ (các list `kw in text` rải trong app.py): số câu ra khác và ví dụ
+  - thời gian: cách cũ gọi đủ 5 chỗ kiểm tra / 1 lượt quét cho mọi cờ
+
+    python bench/bench_keywords.py [--repeat 2000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from synthetic import ROOT
+from keyword_flags import keyword_flags
+from text_norm import normalize_text
+
+CASES_PATH = os.path.join(ROOT, "bench", "keyword_cases.json")
+
+# Danh sách cũ trong app.py (trước khi chuyển sang keywords.json), chỉ giữ để so sánh
+_OLD = {
+    "cancel": ["thoi", "thôi", "huy", "huỷ", "hủy", "khong gui nua", "không gửi nữa", "khong can gui",
+               "không cần gửi", "khong can nua", "không cần nữa", "bo qua", "bỏ qua", "cancel"],
+    "confirm": ["dong y gui", "đồng ý gửi", "ok gui", "ok gửi", "gui di", "gửi đi", "gui len tuyen tren",
+                "gửi lên tuyến trên", "gui giup", "gửi giúp"],
+    "meta_history": ["anh vua hoi gi", "anh vừa hỏi gì", "anh vua yeu cau gi", "anh vừa yêu cầu gì",
+                     "anh vua yeu cau em gi", "anh vừa yêu cầu em gì", "xem lai lich su", "xem lại lịch sử",
+                     "em vua noi gi", "em vừa nói gì", "em vua tra loi gi", "em vừa trả lời gì",
+                     "anh vua hoi em cau gi", "anh vừa hỏi em câu gì"],
+    "history_summary": ["lich su", "lịch sử", "vua hoi", "vừa hỏi", "hoi gi nhi", "hỏi gì nhỉ"],
+    "intent_meta_history": ["vua hoi gi", "vua hoi em gi", "vua hoi em cau gi", "vua hoi em cau hoi gi",
+                            "xem lai lich su", "xem lai cuoc tro chuyen", "lich su cuoc tro chuyen"],
+    "intent_upline": ["ket noi tuyen tren", "ket noi voi tuyen tren", "gap tuyen tren", "muon gap tuyen tren",
+                      "muon noi voi tuyen tren", "chuyen cho tuyen tren", "can tuyen tren ho tro"],
+    "intent_diabetes": ["tieu duong", "dai thao duong"],
+    "intent_stomach": ["da day", "bao tu", "trao nguoc"],
+    "intent_how_to_buy": ["mua hang", "dat hang", "mua nhu the nao"],
+    "intent_how_to_pay": ["thanh toan", "chuyen khoan"],
+    "intent_navigation": ["fanpage", "kenh", "website", "trang web"],
+    "intent_business": ["chinh sach", "hoa hong", "kinh doanh", "thuong", "chiet khau"],
+}
+_OLD_SHORT_CONFIRMS = ["ok", "ok em", "oke", "oke em", "dong y", "đồng ý", "chuan", "chuẩn", "duoc", "được"]
+
+
+def old_flags(t):
+    flags = {name for name, kws in _OLD.items() if any(kw in t for kw in kws)}
+    if t in _OLD_SHORT_CONFIRMS:
+        flags.add("confirm_short")
+    return frozenset(flags)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(CASES_PATH, encoding="utf-8") as f:
+        cases = json.load(f)
+    failed = 0
+    changed = []
+    for case in cases:
+        t = normalize_text(case["text"])
+        got = keyword_flags(t)
+        if got != frozenset(case["flags"]):
+            failed += 1
+            print(f"[FAIL] {case['text']!r}: mong đợi {sorted(case['flags'])}, ra {sorted(got)}")
+        old = old_flags(t)
+        if old != got:
+            changed.append((case["text"], sorted(old - got), sorted(got - old)))
+    print(f"bộ câu mẫu: {len(cases) - failed}/{len(cases)} đúng")
+    print(f"khác cách cũ ở {len(changed)} câu (cờ cũ bật sai do khớp giữa từ / mới thêm):")
+    for text, removed, added in changed:
+        print(f"  {text!r}: bỏ {removed} thêm {added}")
+
+    texts = [normalize_text(c["text"]) for c in cases]
+    n = args.repeat * len(texts)
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in texts:
+            old_flags(t)
+    t_old = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in texts:
+            keyword_flags(t)
+    t_new = time.perf_counter() - t0
+    print(f"mọi cờ / 1 tin: cũ {t_old / n * 1e6:.2f} µs, automaton {t_new / n * 1e6:.2f} µs (x{t_old / t_new:.1f})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
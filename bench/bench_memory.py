@@ -0,0 +1,92 @@
+"""
+Bộ nhớ của catalog: dict lồng nhau (json.load như trước) vs bản ghi __slots__ + TextStore.
+
+Mỗi phép đo chạy trong 1 process riêng để RSS không bị lẫn:
+    python bench/bench_memory.py [--sizes 92,10000]
+
+Cột "py MB" là bộ nhớ Python cấp phát còn giữ (tracemalloc), "RSS MB" là RSS tăng thêm
+sau khi nạp. Bản __slots__ vẫn phải json.load toàn bộ trước khi chuyển đổi nên RSS còn
+giữ phần heap đã giải phóng nhưng chưa trả lại OS; artifact compile sẵn không có bước này.
+"""
+import os
+import sys
+import gc
+import json
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+from synthetic import synthetic_catalog, raw_json_size
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def child(mode, path, trace):
+    from records import build_combo_records, build_product_records
+
+    gc.collect()
+    rss0 = rss_mb()
+    if trace:
+        tracemalloc.start()
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    if mode == "dict":
+        keep = raw
+    else:
+        products, store = build_product_records(raw["products"])
+        combos = build_combo_records(raw["combos"])
+        keep = (products, combos, store)
+        del raw
+    gc.collect()
+    if trace:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(json.dumps({"py": current / 1e6}))
+    else:
+        print(json.dumps({"rss": rss_mb() - rss0}))
+    return keep
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="92,10000")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "PATH", "TRACE"))
+    args = parser.parse_args()
+
+    if args.child:
+        mode, path, trace = args.child
+        child(mode, path, trace == "1")
+        return
+
+    print(f"{'SKU':>7} {'JSON MB':>8} {'dict py MB':>11} {'dict RSS MB':>12} {'slots py MB':>12} {'slots RSS MB':>13}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        data = synthetic_catalog(n)
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+            json.dump({"products": data["products"], "combos": data["combos"]}, f, ensure_ascii=False)
+            path = f.name
+        try:
+            res = {}
+            for mode in ("dict", "records"):
+                res[mode] = {}
+                # tracemalloc tự tốn RAM nên đo RSS ở 1 process riêng không bật trace
+                for trace in ("1", "0"):
+                    out = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--child", mode, path, trace],
+                        capture_output=True, text=True, check=True,
+                    )
+                    res[mode].update(json.loads(out.stdout.strip().splitlines()[-1]))
+        finally:
+            os.unlink(path)
+        print(
+            f"{n:>7} {raw_json_size(data) / 1e6:>8.2f} {res['dict']['py']:>11.2f} {res['dict']['rss']:>12.2f} "
+            f"{res['records']['py']:>12.2f} {res['records']['rss']:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
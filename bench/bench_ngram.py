@@ -0,0 +1,80 @@
+"""
+So sánh chi phí 1 query: vòng lặp text_contains hiện tại vs TF-IDF trigram (NumPy),
+và bộ nhớ của ma trận trigram ở quy mô catalog thật / 10k SKU.
+
+    python bench/bench_ngram.py [--sizes 92,1000,10000]
+"""
+import argparse
+import time
+
+from synthetic import synthetic_catalog
+
+import app
+from catalog import CatalogSnapshot
+from ngram_search import search_ngram
+
+QUERIES = [
+    "bao tu",
+    "tieu duong type 2",
+    "antigem 01",
+    "xuong khop",
+    "070700",
+    "giam can",
+    "viem xoang",
+    "mat ngu kem",
+]
+
+
+def loop_search(products, query):
+    """
+    Đúng vòng lặp chấm điểm của search_product_by_name_or_code (chưa có fallback).
+    """
+    q_norm = app.normalize_text(query)
+    best_score, best = 0, None
+    for p in products:
+        fields = [p.get("code", ""), p.get("name", ""), *p.get("aliases", [])]
+        score = 0
+        for field in fields:
+            if field and (app.text_contains(field, q_norm) or app.text_contains(q_norm, field)):
+                score += 1
+        if score > best_score:
+            best_score, best = score, p
+    return best
+
+
+def timeit(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for q in QUERIES:
+            fn(q)
+    return (time.perf_counter() - t0) / (repeat * len(QUERIES)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="92,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'SKU':>7} {'snap ms':>9} {'matrix MB':>10} {'nnz':>9} {'loop ms/q':>10} {'ngram ms/q':>11} {'speedup':>8}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        data = synthetic_catalog(n)
+        t0 = time.perf_counter()
+        snap = CatalogSnapshot(data)
+        build_ms = (time.perf_counter() - t0) * 1000
+        index = snap.index("product_ngram")
+        if index is None:
+            print("NumPy chưa cài, bỏ qua.")
+            return
+
+        repeat = max(1, args.repeat * 100 // max(n // 100, 1))
+        loop_ms = timeit(lambda q: loop_search(snap.products, q), repeat)
+        ngram_ms = timeit(lambda q: search_ngram(snap, "product", q, k=5), repeat * 10)
+        print(
+            f"{n:>7} {build_ms:>9.0f} {index.nbytes() / 1e6:>10.2f} {len(index.values):>9} "
+            f"{loop_ms:>10.3f} {ngram_ms:>11.3f} {loop_ms / ngram_ms:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+normalize_text cũ (NFD + vòng lặp unicodedata.category) so với text_norm (bảng translate + LRU):
+  - khớp kết quả trên toàn bộ chuỗi catalog (khác biệt duy nhất được phép: đ/Đ -> d)
+  - 1 tin nhắn đi qua các vòng so khớp từ khoá (chuỗi ngắn lặp lại: có cache / không cache)
+  - chuẩn hoá cả cột catalog: từng chuỗi so với normalize_many
+
+    python bench/bench_normalize.py [--products 10000]
+"""
+import time
+import argparse
+import unicodedata
+
+from synthetic import synthetic_catalog
+import text_norm
+from text_norm import normalize_many, normalize_text
+
+
+def normalize_text_nfd(text: str) -> str:
+    # bản cũ, giữ nguyên để so sánh
+    if not text:
+        return ""
+    text = text.lower().strip()
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return text
+
+
+MESSAGES = [
+    "Combo tiểu đường giá bao nhiêu vậy em?",
+    "Đau dạ dày, trào ngược thì dùng sản phẩm nào",
+    "Cách thanh toán chuyển khoản thế nào",
+    "Đồng ý gửi",
+    "Sản phẩm 070700 dùng sao, uống trước hay sau ăn?",
+    "Kết nối tuyến trên giúp chị",
+]
+KEYWORDS = [
+    "tiểu đường", "đái tháo đường", "dạ dày", "bao tử", "trào ngược", "mua hàng", "đặt hàng",
+    "thanh toán", "chuyển khoản", "fanpage", "kênh", "website", "chính sách", "hoa hồng",
+    "đồng ý", "gửi đi", "hủy", "không cần gửi", "xem lại lịch sử", "vừa hỏi gì",
+]
+
+
+def bench(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    args = parser.parse_args()
+
+    data = synthetic_catalog(args.products)
+    column = []
+    for p in data["products"]:
+        column.extend(str(p.get(f) or "") for f in ("code", "name", "benefits_text", "usage_text"))
+        column.extend(str(a) for a in p.get("aliases") or [])
+    print(f"{len(column)} chuỗi catalog, {sum(map(len, column)) / 1e6:.1f}M ký tự")
+
+    # 1) khớp kết quả
+    diff = 0
+    for s in column + MESSAGES + KEYWORDS:
+        old = normalize_text_nfd(s).replace("đ", "d")
+        if old != normalize_text(s):
+            diff += 1
+    print(f"khác bản cũ (sau khi gập đ -> d): {diff}")
+    print(f"'Đường huyết' -> cũ {normalize_text_nfd('Đường huyết')!r}, mới {normalize_text('Đường huyết')!r}")
+
+    # 2) 1 tin nhắn: chuẩn hoá tin + mọi từ khoá (như text_contains trong các vòng so khớp)
+    def per_message(fn):
+        def run():
+            for _ in range(200):
+                for m in MESSAGES:
+                    fn(m)
+                    for k in KEYWORDS:
+                        fn(k)
+        return run
+
+    n = 200 * len(MESSAGES) * (1 + len(KEYWORDS))
+    t_old = bench(per_message(normalize_text_nfd), 3)
+    t_nomemo = bench(per_message(text_norm._normalize), 3)
+    t_memo = bench(per_message(normalize_text), 3)
+    print(
+        f"chuỗi ngắn ({n} lượt): cũ {t_old / n * 1e6:.2f} µs, translate {t_nomemo / n * 1e6:.2f} µs, "
+        f"translate+LRU {t_memo / n * 1e6:.2f} µs  (x{t_old / t_memo:.0f})"
+    )
+
+    # 3) cả cột catalog
+    t_old = bench(lambda: [normalize_text_nfd(s) for s in column], 3)
+    t_each = bench(lambda: [text_norm._normalize(s) for s in column], 3)
+    t_batch = bench(lambda: normalize_many(column), 3)
+    print(
+        f"cột catalog: cũ {t_old * 1000:.0f} ms, translate từng chuỗi {t_each * 1000:.0f} ms, "
+        f"normalize_many {t_batch * 1000:.0f} ms  (x{t_old / t_batch:.0f})"
+    )
+    print(f"LRU: {text_norm.normalize_cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
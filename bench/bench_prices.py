@@ -0,0 +1,145 @@
+"""
+Giá có cấu trúc (pricing.py, index "prices"):
+  - bao nhiêu dòng price_text đọc được, liệt kê dòng không đọc được
+  - câu hỏi khoảng giá mẫu -> (lo, hi) mong đợi; sai thì exit code 1
+  - kết quả bisect phải trùng quét tuyến tính toàn catalog (mọi khoảng, có / không lọc nhóm)
+  - thời gian: bisect vs quét tuyến tính parse price_text mỗi lần
+  - end-to-end: "combo nào dưới 1 triệu" qua app.handle_user_message -> 0 lượt gọi OpenAI
+
+    python bench/bench_prices.py [--repeat 2000]
+"""
+import sys
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import app
+from pricing import parse_price, parse_price_range
+from text_norm import normalize_text
+
+QUERIES = [
+    ("sản phẩm gan dưới 500k", (None, 500000)),
+    ("combo nào dưới 1 triệu", (None, 1000000)),
+    ("combo từ 300k đến 1tr2", (300000, 1200000)),
+    ("có sp nào 300-500k không", (300000, 500000)),
+    ("giá khoảng 400k", (320000, 480000)),
+    ("giá khoảng 400", None),
+    ("sản phẩm giá trên 600.000", (600000, None)),
+    ("sp nao re hon 450000", (None, 450000)),
+    ("có combo nào đắt hơn 1500000 không", (1500000, None)),
+    ("tu 300k den 450000", (300000, 450000)),
+    ("1,5 triệu trở xuống có combo nào", (None, 1500000)),
+    ("combo tim mạch tầm 1tr5", (1200000, 1800000)),
+    ("trẻ dưới 2 tuổi dùng được không", None),
+    ("mua 2 hộp được giảm không", None),
+    ("combo tiểu đường giá bao nhiêu", None),
+    ("mua 2-3 hộp thì giá bao nhiêu ạ", None),
+    ("khách trên 60 tuổi hỏi giá sản phẩm gan", None),
+    ("tiền 1 liệu trình khoảng 3 tháng", None),
+    ("uống từ 2 đến 3 viên mỗi ngày, giá bao nhiêu", None),
+    ("combo trên 10.000 gói đã bán", None),
+    ("sản phẩm gan dưới 500k, 2 hộp", (None, 500000)),
+    # số trần trong tin sức khoẻ, không có từ chỉ tiền: để phân loại trả lời
+    ("tiểu cầu dưới 150000 dùng được không", None),
+    ("vitamin D3 uống trên 10000 IU có sao không", None),
+    ("đường huyết trên 11000", None),
+    ("đi bộ hơn 10000 bước mỗi ngày", None),
+    ("sản phẩm trên 600.000", None),
+    ("gia đình có người tiểu cầu dưới 150000", None),
+    ("chỉ số đạt trên 11000 thì uống gì", None),
+]
+
+
+def linear(snapshot, lo, hi, combos):
+    out = []
+    if combos:
+        for c in snapshot.combos:
+            prices = [parse_price(i.get("price_text")) for i in c.get("products") or ()]
+            total = sum(p[0] for p in prices if p)
+            if total and (lo is None or total >= lo) and (hi is None or total <= hi):
+                out.append((total, str(c.id)))
+    else:
+        for pos, p in enumerate(snapshot.products):
+            price = parse_price(p.get("price_text"))
+            if price and (lo is None or price[0] >= lo) and (hi is None or price[0] <= hi):
+                out.append((price[0], pos))
+    return sorted(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    snapshot = app.get_catalog()
+    index = snapshot.index("prices")
+    rows = len(snapshot.products) + sum(len(c.get("products") or ()) for c in snapshot.combos)
+    print(f"price_text: {rows - len(index.unparsed)}/{rows} dòng đọc được, {len(index.combo_totals)} combo có tổng giá")
+    for kind, key, name, text in index.unparsed:
+        print(f"  không đọc được: {kind} {key} {name!r}: {text!r}")
+
+    failed = 0
+    for text, expected in QUERIES:
+        got = parse_price_range(normalize_text(text), text)
+        if got != expected:
+            failed += 1
+            print(f"[FAIL] {text!r}: mong đợi {expected}, ra {got}")
+    print(f"câu hỏi khoảng giá: {len(QUERIES) - failed}/{len(QUERIES)} đúng")
+
+    rng = random.Random(1)
+    ranges = []
+    for _ in range(300):
+        lo = rng.choice([None, rng.randrange(0, 1500000, 1000)])
+        hi = rng.choice([None, rng.randrange(0, 3000000, 1000)])
+        ranges.append((lo, hi, rng.random() < 0.5))
+    mismatched = sum(1 for lo, hi, c in ranges if index.search(lo, hi, combos=c) != linear(snapshot, lo, hi, c))
+    group = "tim_mach"
+    members = {pos for pos, p in enumerate(snapshot.products) if p.get("group") == group}
+    mismatched += sum(
+        1 for lo, hi, _ in ranges
+        if index.search(lo, hi, tags=[group]) != [r for r in linear(snapshot, lo, hi, False) if r[1] in members]
+    )
+    print(f"bisect so với quét tuyến tính: {mismatched} khoảng khác kết quả")
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat // 100 or 1):
+        for lo, hi, c in ranges:
+            linear(snapshot, lo, hi, c)
+    t_linear = (time.perf_counter() - t0) / ((args.repeat // 100 or 1) * len(ranges))
+    t0 = time.perf_counter()
+    for _ in range(args.repeat // 100 or 1):
+        for lo, hi, c in ranges:
+            index.search(lo, hi, combos=c)
+    t_index = (time.perf_counter() - t0) / ((args.repeat // 100 or 1) * len(ranges))
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        app.answer_price_query("san pham gan duoi 500k")
+    t_answer = (time.perf_counter() - t0) / args.repeat
+    print(
+        f"1 truy vấn khoảng giá: quét + parse {t_linear * 1e6:.1f} µs, bisect {t_index * 1e6:.1f} µs; "
+        f"cả câu trả lời (parse câu hỏi + nhóm + format) {t_answer * 1e6:.1f} µs"
+    )
+
+    calls = []
+
+    def create(model, messages, **kw):
+        calls.append(model)
+        raise RuntimeError("không được gọi OpenAI cho câu hỏi khoảng giá")
+
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    sent = []
+    app.send_telegram_message = lambda chat_id, text, **kw: sent.append(text)
+    app.log_event = lambda **kw: None
+    app.handle_user_message(321, "combo nào dưới 1 triệu", username="tvv", msg_id=1)
+    ok = not calls and sent and "Combo giá dưới 1.000.000đ" in sent[-1]
+    print(f"end-to-end: {len(calls)} lượt gọi OpenAI -> {'OK' if ok else 'SAI'}")
+    if sent:
+        print(sent[-1])
+    if failed or mismatched or not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Profile theo yêu cầu (profiling.py, /profile, POST /debug/profile) qua Flask test client,
+Telegram giả lập (HTTP trong process), OpenAI giả (độ trễ cố định):
+  - thời gian / request của webhook khi tắt profile so với gọi thẳng handle_webhook_update
+    (phần chi phí khi tắt) và khi bật từng chế độ cpu / sample / mem
+  - báo cáo ghi ra đĩa đúng định dạng: cpu-*.txt + .prof, sample-*.collapsed ("a;b;c n"),
+    mem-*.txt có bảng state global; mem phải bắt được LAST_USER_TEXT tăng khi nhiều chat mới nhắn
+  - route /debug/profile từ chối khi sai token
+Thiếu báo cáo / sai định dạng -> exit code 1.
+
+    python bench/bench_profiling.py [--requests 200] [--latency 0.002]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+
+
+class _Telegram(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        data = b'{"ok": true, "result": {"message_id": 1}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002, help="độ trễ OpenAI giả (giây)")
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _Telegram)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    out_dir = tempfile.mkdtemp(prefix="bench-profile-")
+    os.environ.update(
+        TELEGRAM_API_BASE=f"http://127.0.0.1:{stub.server_address[1]}",
+        PROFILE_DIR=out_dir,
+        PROFILE_ADMIN_TOKEN="bench",
+        PROFILE_MEM_INTERVAL="0.2",
+        LOG_SHEET_WEBHOOK_URL="",
+        UPLINE_CHAT_ID="",
+        EAGER_WARMUP="1",
+        BOT_DB_PATH=os.path.join(out_dir, "bot.db"),
+    )
+    import app
+    from bench_singleflight import FakeCompletions
+    from types import SimpleNamespace
+
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(args.latency)))
+    client = app.app.test_client()
+    texts = ["combo tiểu đường giá bao nhiêu", "antigelm 01 dùng thế nào", "sản phẩm cho dạ dày", "mua hàng ở đâu"]
+    chat_seq = iter(range(10 ** 6, 10 ** 7))
+
+    def update(i, new_chat=False):
+        chat_id = next(chat_seq) if new_chat else 500 + i % 20
+        return {"message": {"message_id": i, "chat": {"id": chat_id, "type": "group"}, "from": {"username": "b"},
+                            "text": texts[i % len(texts)]}}
+
+    def batch(n, new_chats=False):
+        t0 = time.perf_counter()
+        for i in range(n):
+            resp = client.post("/webhook", json=update(i, new_chats))
+            assert resp.status_code == 200
+        return (time.perf_counter() - t0) / n * 1000
+
+    def direct(n):
+        t0 = time.perf_counter()
+        for i in range(n):
+            with app.app.test_request_context("/webhook", method="POST", json=update(i)):
+                app.handle_webhook_update()
+        return (time.perf_counter() - t0) / n * 1000
+
+    def admin(payload, token="bench"):
+        return client.post("/debug/profile", json=payload, headers={"X-Admin-Token": token})
+
+    failed = []
+    batch(20)  # làm nóng
+    n = args.requests
+    rows = [("gọi thẳng handle_webhook_update", direct(n)), ("webhook, profile tắt", batch(n))]
+
+    print(admin({"mode": "cpu", "requests": n}).get_json()["message"])
+    rows.append(("webhook, cpu (cProfile)", batch(n)))
+    print(admin({"mode": "sample", "seconds": 60}).get_json()["message"])
+    rows.append(("webhook, sample (5ms)", batch(n)))
+    print(admin({"stop": True}).get_json()["message"].splitlines()[0])
+    print(app.handle_profile_command("/profile mem 60s"))
+    rows.append(("webhook, mem (tracemalloc)", batch(n, new_chats=True)))
+    report = app.handle_profile_command("/profile stop")
+    print(report.splitlines()[0])
+
+    print(f"\n{'':<34} {'ms / request':>12}")
+    for name, ms in rows:
+        print(f"{name:<34} {ms:>12.3f}")
+    off = rows[1][1] - rows[0][1]
+    print(f"chi phí khi tắt: {off * 1000:+.1f} µs / request (1 lần đọc PROFILER.active, nằm trong nhiễu đo)")
+
+    if admin({"mode": "cpu"}, token="sai").status_code != 403:
+        failed.append("/debug/profile nhận token sai")
+    if app.PROFILER.active:
+        failed.append("PROFILER.active vẫn bật sau khi dừng")
+
+    files = sorted(os.path.basename(p) for p in glob.glob(os.path.join(out_dir, "*-*.*")) if not p.endswith(".db"))
+    print(f"\nbáo cáo trong {out_dir}: {files}")
+    for prefix, suffix in (("cpu", ".txt"), ("cpu", ".prof"), ("sample", ".collapsed"), ("mem", ".txt")):
+        if not any(f.startswith(prefix) and f.endswith(suffix) for f in files):
+            failed.append(f"thiếu báo cáo {prefix}-*{suffix}")
+    for path in glob.glob(os.path.join(out_dir, "sample-*.collapsed")):
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        bad = [line for line in lines if not line.rsplit(" ", 1)[-1].isdigit() or ";" not in line]
+        print(f"sample: {len(lines)} stack, dòng đầu: {lines[0][-120:] if lines else ''}")
+        if not lines or bad:
+            failed.append(f"collapsed stacks sai định dạng: {bad[:2]}")
+    if "LAST_USER_TEXT" not in report:
+        failed.append("mem không báo LAST_USER_TEXT tăng")
+    print("\n" + report)
+
+    for line in failed:
+        print("[FAIL]", line)
+    stub.shutdown()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Rule chuyển thẳng tuyến trên (rules.json force_upline_for, compliance.py):
+  - câu mẫu khớp / không khớp (không khớp giữa từ, khớp đúng dấu, gõ không dấu vẫn khớp trừ cụm
+    force_upline_accent_required như "tố cáo" / "to cao"); sai thì exit code 1
+  - chi phí kiểm tra mỗi tin (chạy trên mọi tin trước phân loại)
+  - end-to-end qua app.handle_user_message với OpenAI giả: tin khớp rule -> 0 lượt gọi OpenAI
+
+    python bench/bench_rules.py [--repeat 20000]
+"""
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import app
+from compliance import RULE_HITS, format_rule_stats, match_force_upline
+
+CASES = [
+    ("Khách muốn khiếu nại về đơn hàng tuần trước", ["khiếu nại"]),
+    ("khach doi boi thuong vi giao tre", ["đòi bồi thường"]),
+    ("Chị ấy hỏi thủ tục BỒI HOÀN thế nào", ["bồi hoàn"]),
+    ("khách dọa tố cáo lên báo, kèm khiếu nại", ["khiếu nại", "tố cáo"]),
+    ("bác bị tai biến nghi do sản phẩm uống hôm qua", ["tai biến nghi do sản phẩm"]),
+    ("combo tiểu đường giá bao nhiêu", []),
+    ("khách bị tai biến 2 năm trước dùng gì", []),
+    ("tranh thủ hỏi cách dùng trà", []),
+    ("tố chất của sản phẩm", []),
+    ("bé nhà em gầy, uống gì cho to cao ạ", []),
+    ("sản phẩm tăng chiều cao giúp trẻ to cao", []),
+    ("khách dọa TỐ CÁO lên sở y tế", ["tố cáo"]),
+    ("khach muon khieu nai", ["khiếu nại"]),
+    ("khách hỏi về tranh chấp đất đai", ["tranh chấp"]),
+    ("", []),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    snapshot = app.get_catalog()
+    failed = 0
+    for text, expected in CASES:
+        got = match_force_upline(snapshot, text)
+        if got != expected:
+            failed += 1
+            print(f"[FAIL] {text!r}: mong đợi {expected}, ra {got}")
+    print(f"câu mẫu: {len(CASES) - failed}/{len(CASES)} đúng")
+
+    texts = [t for t, _ in CASES]
+    n = args.repeat * len(texts)
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in texts:
+            match_force_upline(snapshot, t)
+    print(f"kiểm tra rule / 1 tin: {(time.perf_counter() - t0) / n * 1e6:.2f} µs")
+
+    calls = []
+
+    def create(model, messages, **kw):
+        calls.append(model)
+        raise RuntimeError("không được gọi OpenAI khi khớp rule")
+
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    sent = []
+    app.send_telegram_message = lambda chat_id, text, **kw: sent.append(text)
+    app.log_event = lambda **kw: None
+    RULE_HITS.clear()
+    app.handle_user_message(123, "Khách muốn khiếu nại về đơn hàng", username="tvv", msg_id=1)
+    ok = not calls and sent and "khiếu nại" in sent[-1]
+    print(f"end-to-end: {len(calls)} lượt gọi OpenAI, {len(sent)} tin trả lời -> {'OK' if ok else 'SAI'}")
+    print(format_rule_stats())
+    if failed or not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Scheduler nhắc lịch (scheduler.py) với N lịch chờ:
+  - thời gian thêm N lịch (INSERT SQLite + heappush) và nạp lại heap lúc khởi động
+  - bắn M lịch đến hạn qua sender giả, đo độ trễ so với due_at
+  - "restart": process chết lúc đang gửi 1 lịch -> lịch đó thành unknown, không gửi lại;
+    2 scheduler cùng DB (2 worker gunicorn) không gửi trùng
+
+    python bench/bench_scheduler.py [--jobs 50000] [--due 500]
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+from collections import Counter
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import scheduler
+from bot_store import REMINDER_UNKNOWN, BotStore
+from scheduler import ReminderScheduler
+from telegram_sender import SendResult
+
+
+class FakeSender:
+    def __init__(self):
+        self.received = Counter()
+        self.delays = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, parse_mode="HTML", limiter=None, **kw):
+        if limiter is not None:
+            limiter.acquire()
+        with self.lock:
+            self.received[text] += 1
+            self.delays.append(time.time() - float(text.rsplit("@", 1)[1]))
+        return SendResult(True, 200)
+
+
+def wait_until(cond, timeout):
+    end = time.time() + timeout
+    while not cond() and time.time() < end:
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=50000)
+    parser.add_argument("--due", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bot.db")
+        store = BotStore(db)
+        sender = FakeSender()
+        sched = ReminderScheduler(store, sender, rate=1000)
+
+        now = time.time()
+        t0 = time.perf_counter()
+        for i in range(args.jobs):
+            due = now + 3600 + i  # lịch xa, không bắn trong bench
+            sched.add(i % 5000, f"far {i} @{due}", due)
+        t_add = time.perf_counter() - t0
+        print(f"add {args.jobs} jobs: {t_add:.2f}s ({t_add / args.jobs * 1e6:.0f} µs/job)")
+
+        t0 = time.perf_counter()
+        fresh = ReminderScheduler(store, sender)
+        fresh._load(store.pending_reminders())
+        print(f"startup load {fresh.pending()} pending: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        # lịch đến hạn trong ~1s, 2 scheduler cùng DB chạy song song
+        other = ReminderScheduler(BotStore(db), sender, rate=1000)
+        base = time.time() + 1.0
+        for i in range(args.due):
+            due = base + i * 0.002
+            sched.add(i, f"due {i} @{due}", due)
+        other._load(store.pending_reminders(before=base + 10))
+        sched.start()
+        other.start()
+        wait_until(lambda: sum(sender.received.values()) >= args.due, 30)
+        time.sleep(0.5)
+        sched.stop()
+        other.stop()
+        dup = sum(1 for n in sender.received.values() if n > 1)
+        d = sorted(sender.delays)
+        print(
+            f"fired {len(sender.received)}/{args.due} by 2 schedulers, duplicated {dup}, "
+            f"delay p50 {d[len(d) // 2] * 1000:.1f} ms, p99 {d[int(len(d) * 0.99)] * 1000:.1f} ms"
+        )
+
+        # process chết ngay sau khi nhận lịch (status sending), rồi khởi động lại
+        rid = store.add_reminder(1, f"crash @{time.time()}", time.time() - 1)
+        store.claim_reminder(rid)
+        store.conn().execute("UPDATE reminders SET fired_at = fired_at - ? WHERE id = ?", (scheduler.STUCK_AFTER + 1, rid))
+        before = sum(sender.received.values())
+        restarted = ReminderScheduler(BotStore(db), sender, rate=1000)
+        restarted.start()
+        time.sleep(0.5)
+        restarted.stop()
+        status = store.conn().execute("SELECT status FROM reminders WHERE id = ?", (rid,)).fetchone()[0]
+        print(
+            f"after restart: stuck job status {'unknown' if status == REMINDER_UNKNOWN else status}, "
+            f"resent {sum(sender.received.values()) - before}, heap {restarted.pending()}"
+        )
+
+
+if __name__ == "__main__":
+    main()
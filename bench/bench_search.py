@@ -0,0 +1,179 @@
+"""
+Độ chính xác + tốc độ tìm kiếm trên bộ câu hỏi có nhãn (bench/search_cases.json):
+  - mỗi câu: query như TVV gõ, loại (combo / product_health / product_name / product_typo / product_prefix)
+    và các mã sản phẩm / id combo đúng (nhiều mã = trúng 1 trong số đó là đúng)
+  - mỗi backend chạy trên các loại câu của nó: P@k, recall@k, MRR, độ trễ từng câu (p50 / p95 / max)
+  - so với ngưỡng trong bench/search_thresholds.json: chất lượng tụt dưới ngưỡng hoặc p95 vượt ngưỡng
+    -> in lý do, exit code 1. Sửa synonyms / health_tags_map / hàm tìm kiếm / thay index -> chạy lại.
+  - --verbose: in các câu backend không trả được kết quả đúng nào
+  - --write-thresholds: ghi ngưỡng mới = kết quả hiện tại (chất lượng làm tròn xuống, p95 x3)
+
+    python bench/bench_search.py [--k 3] [--repeat 20] [--verbose] [--write-thresholds]
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import statistics
+
+from synthetic import ROOT
+import app
+from fulltext import search_products_fulltext
+from ngram_search import search_ngram
+from fuzzy_lookup import find_similar_products
+from inline_search import search_inline
+
+CASES_PATH = os.path.join(ROOT, "bench", "search_cases.json")
+THRESHOLDS_PATH = os.path.join(ROOT, "bench", "search_thresholds.json")
+NAME_TYPES = ("product_name", "product_typo")
+
+
+def _ids(items):
+    out = []
+    for item in items or ():
+        if isinstance(item, tuple):
+            item = item[0]
+        key = item.get("id") if item.get("id") is not None else item.get("code")
+        out.append(str(key))
+    return out
+
+
+def _one(item):
+    return [item] if item else []
+
+
+# tên backend -> (loại câu áp dụng, hàm(snapshot, query, k) -> list mã / id theo thứ tự xếp hạng)
+BACKENDS = {
+    "combo_health": (("combo",), lambda s, q, k: _ids(_one(app.search_combo_by_health_issue(q)))),
+    "combo_ngram": (("combo",), lambda s, q, k: _ids(search_ngram(s, "combo", q, k=k))),
+    "product_health": (("product_health",), lambda s, q, k: _ids(app.search_product_by_health_issue(q))),
+    "product_fulltext": (("product_health",), lambda s, q, k: _ids(search_products_fulltext(s, q, k=k))),
+    "product_name": (NAME_TYPES, lambda s, q, k: _ids(_one(app.search_product_by_name_or_code(q)))),
+    "product_fuzzy": (NAME_TYPES, lambda s, q, k: _ids(find_similar_products(s, q, k=k))),
+    "product_ngram": (NAME_TYPES, lambda s, q, k: _ids(search_ngram(s, "product", q, k=k))),
+    "product_inline": (("product_prefix",), lambda s, q, k: _ids(search_inline(s, q, k=k))),
+}
+
+
+def score(ranked, expect, k):
+    """
+    (P@k, recall@k, reciprocal rank) của 1 câu. P@k tính trên số kết quả thực trả (tối đa k),
+    backend chỉ trả 1 kết quả đúng vẫn được P@k = 1.
+    """
+    top = ranked[:k]
+    expect = set(expect)
+    relevant = len(set(top) & expect)
+    precision = relevant / len(top) if top else 0.0
+    recall = relevant / len(expect)
+    rr = next((1.0 / (i + 1) for i, key in enumerate(ranked) if key in expect), 0.0)
+    return precision, recall, rr
+
+
+def evaluate(snapshot, cases, k, repeat):
+    results = {}
+    for name, (types, fn) in BACKENDS.items():
+        rows = []
+        for case in cases:
+            if case["type"] not in types:
+                continue
+            ranked = fn(snapshot, case["query"], k)
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn(snapshot, case["query"], k)
+                times.append((time.perf_counter() - t0) * 1000)
+            rows.append((case, ranked, score(ranked, case["expect"], k), statistics.median(times)))
+        if not rows:
+            continue
+        latencies = sorted(r[3] for r in rows)
+        results[name] = {
+            "queries": len(rows),
+            "p_at_k": statistics.mean(r[2][0] for r in rows),
+            "recall": statistics.mean(r[2][1] for r in rows),
+            "mrr": statistics.mean(r[2][2] for r in rows),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max_ms": latencies[-1],
+            "misses": [(r[0]["query"], r[0]["expect"], r[1][:k]) for r in rows if r[2][2] == 0.0],
+            "slowest": max(rows, key=lambda r: r[3])[0]["query"],
+        }
+    return results
+
+
+def check(results, thresholds):
+    failures = []
+    for name, limits in (thresholds.get("backends") or {}).items():
+        r = results.get(name)
+        if r is None:
+            failures.append(f"{name}: không có kết quả (backend bị bỏ?)")
+            continue
+        for metric in ("p_at_k", "recall", "mrr"):
+            if metric in limits and r[metric] < limits[metric]:
+                failures.append(f"{name}: {metric} {r[metric]:.3f} < ngưỡng {limits[metric]:.3f}")
+        if "p95_ms" in limits and r["p95_ms"] > limits["p95_ms"]:
+            failures.append(f"{name}: p95 {r['p95_ms']:.3f} ms > ngưỡng {limits['p95_ms']:.3f} ms")
+    return failures
+
+
+def write_thresholds(results, k):
+    backends = {}
+    for name, r in results.items():
+        backends[name] = {
+            "p_at_k": math.floor(r["p_at_k"] * 100) / 100,
+            "recall": math.floor(r["recall"] * 100) / 100,
+            "mrr": math.floor(r["mrr"] * 100) / 100,
+            "p95_ms": math.ceil(max(r["p95_ms"] * 3, 0.5) * 10) / 10,
+        }
+    with open(THRESHOLDS_PATH, "w", encoding="utf-8") as f:
+        json.dump({"k": k, "backends": backends}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"đã ghi {THRESHOLDS_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=None, help="mặc định theo search_thresholds.json")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--write-thresholds", action="store_true")
+    args = parser.parse_args()
+
+    with open(CASES_PATH, encoding="utf-8") as f:
+        cases = json.load(f)
+    thresholds = {}
+    if os.path.exists(THRESHOLDS_PATH):
+        with open(THRESHOLDS_PATH, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    k = args.k or thresholds.get("k") or 3
+
+    with app.CATALOG.pinned() as snapshot:
+        evaluate(snapshot, cases[:5], k, 1)  # làm nóng index lazy
+        results = evaluate(snapshot, cases, k, args.repeat)
+
+    print(f"{len(cases)} câu có nhãn, k = {k}")
+    print(f"{'backend':<17} {'câu':>4} {'P@k':>6} {'R@k':>6} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  chậm nhất")
+    for name, r in results.items():
+        print(
+            f"{name:<17} {r['queries']:>4} {r['p_at_k']:>6.3f} {r['recall']:>6.3f} {r['mrr']:>6.3f} "
+            f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['max_ms']:>8.3f}  {r['slowest']!r}"
+        )
+    if args.verbose:
+        for name, r in results.items():
+            for query, expect, got in r["misses"]:
+                print(f"  [{name}] {query!r}: cần {expect}, ra {got}")
+
+    if args.write_thresholds:
+        write_thresholds(results, k)
+        return
+    failures = check(results, thresholds)
+    for line in failures:
+        print("[FAIL]", line)
+    if failures:
+        sys.exit(1)
+    print("đạt mọi ngưỡng" if thresholds else "chưa có search_thresholds.json (chạy --write-thresholds)")
+
+
+if __name__ == "__main__":
+    main()
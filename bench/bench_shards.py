@@ -0,0 +1,280 @@
+"""
+Chia tải theo chat_id (ingress.py):
+  1. Vòng băm: độ lệch số chat giữa các node, thêm / bớt 1 node chuyển bao nhiêu % chat
+  2. Chạy thật nhiều process trên máy: Telegram + OpenAI giả lập (OpenAI trả lời sau --latency giây),
+     N node `BOT_ROLE=node gunicorn app:app` (1 worker, --threads thread) sau 1 ingress
+     `BOT_ROLE=ingress gunicorn ingress:app`.
+     Bắn --messages tin từ --clients luồng -> throughput khi N = 1, 2, 4 node.
+     Kiểm tra: mỗi chat nhận trả lời đúng thứ tự tin gửi (burst 4 tin / chat gửi gần như cùng lúc),
+     mọi update trả 200.
+  3. Drain: đang chạy tải thì gỡ 1 node -> lệnh gỡ chờ chat đang ghim xong, sau đó node không
+     nhận thêm tin nào, không tin nào lỗi.
+
+Bot chờ OpenAI là chính (I/O), nên mỗi node xử lý được ~threads / độ trễ tin mỗi giây;
+thêm node là thêm luồng chờ song song -> throughput tăng gần tuyến tính đến khi CPU máy bão hoà.
+
+    python bench/bench_shards.py [--nodes 1,2,4] [--messages 300] [--latency 0.2]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import ROOT
+from bench_startup import free_port, wait_port
+from ingress import HashRing
+
+QUERIES = [
+    "antigelm 01 dùng thế nào",
+    "sản phẩm cho dạ dày",
+    "combo mất ngủ",
+    "gan nhiễm mỡ dùng gì",
+]
+
+
+class _Stubs(BaseHTTPRequestHandler):
+    """
+    /bot<token>/sendMessage: ghi (chat_id, reply_to_message_id) theo thứ tự nhận.
+    /v1/chat/completions: chờ latency rồi trả 1 completion (JSON intent nếu có response_format).
+    """
+    latency = 0.2
+    replies = defaultdict(list)
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            time.sleep(_Stubs.latency)
+            if "response_format" in body:
+                content = json.dumps({"intent": "PRODUCT_INFO", "product_query": "antigelm", "needs": ["usage"]})
+            else:
+                content = body["messages"][-1]["content"][-400:]
+            out = {
+                "id": "bench", "object": "chat.completion", "created": 0, "model": body.get("model", "m"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+            }
+        else:
+            if self.path.endswith("/sendMessage"):
+                with _Stubs.lock:
+                    _Stubs.replies[str(body.get("chat_id"))].append(body.get("reply_to_message_id"))
+            out = {"ok": True, "result": {"message_id": 1}}
+        data = json.dumps(out).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def ring_stats(n_nodes=4, keys=20000):
+    ids = [str(random.Random(i).randrange(10 ** 9)) for i in range(keys)]
+    nodes = [f"http://node-{i}:8000" for i in range(n_nodes)]
+    ring = HashRing(nodes)
+    before = {k: ring.node_for(k) for k in ids}
+    counts = Counter(before.values())
+    spread = (max(counts.values()) - min(counts.values())) / (keys / n_nodes)
+    ring.add(f"http://node-{n_nodes}:8000")
+    moved_add = sum(1 for k in ids if ring.node_for(k) != before[k]) / keys
+    ring.remove(f"http://node-{n_nodes}:8000")
+    ring.remove(nodes[0])
+    moved_remove = sum(1 for k in ids if ring.node_for(k) != before[k]) / keys
+    wrong = sum(1 for k in ids if before[k] != nodes[0] and ring.node_for(k) != before[k])
+    print(
+        f"vòng băm {n_nodes} node: lệch max-min {spread * 100:.1f}% so với trung bình; "
+        f"thêm node thứ {n_nodes + 1}: chuyển {moved_add * 100:.1f}% chat (lý tưởng {100 / (n_nodes + 1):.1f}%); "
+        f"bỏ 1 node: chuyển {moved_remove * 100:.1f}% (chỉ chat của node bị bỏ, sai {wrong})"
+    )
+
+
+def post(port, update, path="/webhook", headers=None):
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json", **(headers or {})},
+    )
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        return resp.status, json.loads(resp.read() or b"{}")
+
+
+def get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def start(cmd, env, port):
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_port(port, time.perf_counter() + 60)
+    return proc
+
+
+def start_cluster(n_nodes, threads, stub_port, tmp):
+    base = dict(
+        os.environ,
+        TELEGRAM_TOKEN="bench",
+        TELEGRAM_API_BASE=f"http://127.0.0.1:{stub_port}",
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+        LOG_SHEET_WEBHOOK_URL="",
+        UPLINE_CHAT_ID="",
+    )
+    base.pop("EAGER_WARMUP", None)
+    procs, nodes = [], []
+    for i in range(n_nodes):
+        port = free_port()
+        env = dict(base, PORT=str(port), BOT_ROLE="node", GUNICORN_THREADS=str(threads),
+                   BOT_DB_PATH=os.path.join(tmp, f"node{n_nodes}-{i}.db"))
+        procs.append(start([sys.executable, "-m", "gunicorn", "app:app"], env, port))
+        nodes.append(f"http://127.0.0.1:{port}")
+    for node in nodes:
+        port = int(node.rsplit(":", 1)[1])
+        deadline = time.perf_counter() + 60
+        while time.perf_counter() < deadline:
+            try:
+                if get(port, "/healthz").get("ready"):
+                    break
+            except Exception:
+                time.sleep(0.1)
+    ingress_port = free_port()
+    env = dict(base, PORT=str(ingress_port), BOT_ROLE="ingress", SHARD_NODES=",".join(nodes),
+               INGRESS_ADMIN_TOKEN="bench")
+    procs.append(start([sys.executable, "-m", "gunicorn", "ingress:app"], env, ingress_port))
+    return procs, nodes, ingress_port
+
+
+def load(ingress_port, n_messages, clients, chats, bursts=0, during=None):
+    """
+    Bắn n_messages tin (chat ngẫu nhiên trong `chats` chat) từ `clients` luồng.
+    bursts: số chat được gửi 4 tin liền nhau cách 20ms (kiểm tra thứ tự).
+    during: hàm chạy ở thread riêng giữa lúc có tải.
+    """
+    counter = iter(range(1, 10 ** 9))
+    lock = threading.Lock()
+    statuses = Counter()
+    rng = random.Random(7)
+    sent_order = defaultdict(list)
+    with _Stubs.lock:
+        _Stubs.replies.clear()
+
+    def send(chat_id, text):
+        with lock:
+            msg_id = next(counter)
+            sent_order[str(chat_id)].append(msg_id)
+        update = {"message": {"message_id": msg_id, "chat": {"id": chat_id}, "from": {"username": "bench"},
+                              "text": text}}
+        try:
+            status, _ = post(ingress_port, update)
+        except Exception as e:
+            status = getattr(e, "code", "error")
+        with lock:
+            statuses[status] += 1
+
+    def client(n):
+        for i in range(n):
+            send(10 ** 6 + rng.randrange(chats), QUERIES[i % len(QUERIES)] + f" #{i}")
+
+    threads = [threading.Thread(target=client, args=(n_messages // clients,)) for _ in range(clients)]
+    for b in range(bursts):
+        chat_id = 2 * 10 ** 6 + b
+        for j in range(4):
+            threads.append(threading.Thread(target=send, args=(chat_id, QUERIES[j] + f" burst {j}")))
+    extra = threading.Thread(target=during) if during else None
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+        if t._args and isinstance(t._args[0], int) and t._args[0] >= 2 * 10 ** 6:
+            time.sleep(0.02)
+    if extra:
+        extra.start()
+    for t in threads:
+        t.join()
+    if extra:
+        extra.join()
+    elapsed = time.perf_counter() - t0
+    return elapsed, statuses, sent_order
+
+
+def order_violations(sent_order, prefix="2"):
+    time.sleep(0.5)
+    bad = 0
+    with _Stubs.lock:
+        for chat, sent in sent_order.items():
+            if not chat.startswith(prefix):
+                continue
+            got = [m for m in _Stubs.replies.get(chat, []) if m in sent]
+            if got != sent:
+                bad += 1
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", default="1,2,4")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=48)
+    parser.add_argument("--threads", type=int, default=4, help="thread mỗi node")
+    parser.add_argument("--latency", type=float, default=0.2, help="độ trễ mỗi lượt gọi OpenAI giả")
+    args = parser.parse_args()
+
+    ring_stats()
+    _Stubs.latency = args.latency
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _Stubs)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_port = stub.server_address[1]
+    tmp = tempfile.mkdtemp(prefix="bench-shards-")
+
+    print(f"\n{'node':>4} {'tin/s':>8} {'x so với 1 node':>16} {'lỗi':>5} {'chat sai thứ tự':>16}")
+    base_rate = None
+    for n in [int(x) for x in args.nodes.split(",")]:
+        procs, nodes, ingress_port = start_cluster(n, args.threads, stub_port, tmp)
+        try:
+            load(ingress_port, 2 * n, 2 * n, 10)  # làm nóng kết nối + OpenAI client
+            elapsed, statuses, sent = load(ingress_port, args.messages, args.clients, 200, bursts=10)
+            rate = args.messages / elapsed
+            base_rate = base_rate or rate
+            errors = sum(v for k, v in statuses.items() if k != 200)
+            print(f"{n:>4} {rate:>8.1f} {rate / base_rate:>16.2f} {errors:>5} {order_violations(sent):>16}")
+            if errors:
+                print(f"     mã lỗi: {dict((k, v) for k, v in statuses.items() if k != 200)}")
+
+            if n >= 2 and n == max(int(x) for x in args.nodes.split(",")):
+                victim = nodes[0]
+                result = {}
+
+                def remove():
+                    time.sleep(0.5)
+                    _, result["remove"] = post(
+                        ingress_port, {"remove": victim}, path="/shard/nodes", headers={"X-Admin-Token": "bench"}
+                    )
+                    result["after"] = result["remove"]["stats"].get(victim, {}).get("forwarded", 0)
+
+                elapsed, statuses, _ = load(ingress_port, args.messages, args.clients, 200, during=remove)
+                final = get(ingress_port, "/shard/status")["stats"].get(victim, {}).get("forwarded", 0)
+                errors = sum(v for k, v in statuses.items() if k != 200)
+                r = result["remove"]
+                print(
+                    f"\ndrain: gỡ {victim} giữa lúc có tải -> chờ {r['drain_s']}s, còn ghim {r['still_pinned']}; "
+                    f"node nhận thêm sau khi gỡ: {final - result['after']} tin; lỗi {errors}/{args.messages}"
+                )
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.wait()
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
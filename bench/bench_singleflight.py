@@ -0,0 +1,94 @@
+"""
+Single-flight cho OpenAI (app.OPENAI_FLIGHT) với client giả (độ trễ cố định, không gọi mạng):
+  - N TVV gửi cùng 1 câu (khác hoa/thường, dấu) trong cùng lúc -> số lượt gọi thật
+  - leader lỗi -> mọi lượt chờ cùng nhận lỗi (trả fallback), không ai treo
+  - leader chậm hơn OPENAI_FLIGHT_WAIT -> lượt chờ tự gọi riêng
+
+    python bench/bench_singleflight.py [--users 50] [--latency 0.4]
+"""
+import json
+import time
+import argparse
+import threading
+from types import SimpleNamespace
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import app
+
+
+class FakeCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, **kw):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("503 upstream")
+        if "response_format" in kw:
+            content = json.dumps({"intent": "HEALTH_COMBO", "health_issue": "tiểu đường", "needs": ["combo"]})
+        else:
+            content = "Dạ " + messages[-1]["content"].split("NỘI DUNG CỐT LÕI:\n", 1)[-1]
+        usage = SimpleNamespace(prompt_tokens=500, completion_tokens=80, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def burst(users, fn):
+    threads = [threading.Thread(target=fn, args=(i,)) for i in range(users)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    fake = FakeCompletions(args.latency)
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=fake))
+    app.get_catalog()
+    variants = ["Combo tiểu đường giá bao nhiêu?", "combo tieu duong gia bao nhieu?", "COMBO TIỂU ĐƯỜNG GIÁ BAO NHIÊU?"]
+    results = []
+
+    def ask(i):
+        text = variants[i % len(variants)]
+        info = app.classify_intent_with_openai(text)
+        reply = app.build_ai_style_reply(text, "COMBO TIỂU ĐƯỜNG ...", intent=info["intent"])
+        results.append((info["intent"], reply))
+
+    elapsed = burst(args.users, ask)
+    print(
+        f"{args.users} câu giống nhau cùng lúc: {fake.calls} lượt gọi OpenAI (không gộp: {args.users * 2}), "
+        f"{elapsed:.2f}s, {len(set(results))} kết quả khác nhau"
+    )
+
+    fake.calls = 0
+    fake.fail = True
+    results.clear()
+    elapsed = burst(args.users, ask)
+    print(
+        f"leader lỗi: {fake.calls} lượt gọi, {sum(1 for r in results if r[0] == 'SMALL_TALK')}/{args.users} "
+        f"nhận fallback, {elapsed:.2f}s"
+    )
+
+    fake.fail = False
+    fake.calls = 0
+    fake.latency = 1.0
+    app.OPENAI_FLIGHT.wait_timeout = 0.3
+    results.clear()
+    elapsed = burst(5, ask)
+    print(f"leader chậm (1s > chờ 0.3s): {fake.calls} lượt gọi cho 5 câu, {elapsed:.2f}s")
+    print(app.OPENAI_FLIGHT.format_stats())
+
+
+if __name__ == "__main__":
+    main()
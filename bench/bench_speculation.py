@@ -0,0 +1,128 @@
+"""
+Tra cứu trước song song lượt phân loại OpenAI (app.start_speculative_lookups, speculation.py),
+OpenAI giả: độ trễ cố định, kết quả phân loại viết sẵn cho từng câu (giống model trả về):
+  - tỉ lệ trúng theo loại tra cứu, số tin trúng hết, số tra cứu chạy thừa
+  - thời gian từ lúc có kết quả phân loại tới lúc có câu trả lời cốt lõi: tuần tự vs có tra cứu trước
+  - câu trả lời cốt lõi phải giống hệt khi không tra cứu trước (khác -> exit code 1)
+
+    python bench/bench_speculation.py [--latency 0.3] [--repeat 3]
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+from types import SimpleNamespace
+
+from synthetic import ROOT  # noqa: F401  (sys.path)
+import app
+from text_norm import normalize_text
+
+# (câu hỏi, kết quả phân loại model trả về)
+CASES = [
+    ("combo tiểu đường giá bao nhiêu", {"intent": "HEALTH_COMBO", "health_issue": "tiểu đường", "needs": ["combo"]}),
+    ("khách bị mỡ máu cao nên dùng combo nào", {"intent": "HEALTH_COMBO", "health_issue": "mỡ máu", "needs": ["combo"]}),
+    ("có combo nào cho người mất ngủ không em",
+     {"intent": "HEALTH_COMBO", "health_issue": "mất ngủ", "needs": ["combo"]}),
+    ("khách hay đau dạ dày thì dùng sản phẩm gì",
+     {"intent": "HEALTH_PRODUCT", "health_issue": "đau dạ dày", "needs": ["products"]}),
+    ("sản phẩm nào hỗ trợ gan nhiễm mỡ", {"intent": "HEALTH_PRODUCT", "health_issue": "gan nhiễm mỡ", "needs": ["products"]}),
+    ("người bị thừa cân muốn giảm cân dùng gì", {"intent": "HEALTH_PRODUCT", "health_issue": "thừa cân", "needs": ["products"]}),
+    ("antigelm 01 dùng thế nào", {"intent": "PRODUCT_DETAIL", "product_query": "antigelm 01", "needs": ["usage"]}),
+    ("cho em xin thành phần của ANTIGELM-01",
+     {"intent": "PRODUCT_DETAIL", "product_query": "ANTIGELM-01", "needs": ["ingredients"]}),
+    ("sản phẩm 070703 uống bao lâu", {"intent": "PRODUCT_DETAIL", "product_query": "070703", "needs": ["duration"]}),
+    ("cardio 03 có tác dụng gì", {"intent": "PRODUCT_DETAIL", "product_query": "Cardio 03", "needs": ["benefits"]}),
+    ("nấm chaga 03 giá bao nhiêu", {"intent": "PRODUCT_DETAIL", "product_query": "nấm chaga 03", "needs": ["benefits"]}),
+    ("chính sách hoa hồng thế nào em", {"intent": "BUSINESS_QUESTION", "needs": []}),
+    ("mua hàng ở đâu em", {"intent": "HOW_TO_BUY", "needs": ["how_to_buy"]}),
+    ("chuyển khoản vào tài khoản nào", {"intent": "HOW_TO_PAY", "needs": ["how_to_pay"]}),
+    ("cho chị cái link fanpage", {"intent": "NAVIGATION", "needs": ["product_links"]}),
+    ("chào em", {"intent": "SMALL_TALK", "needs": []}),
+    ("khách bị huyết áp cao với tiểu đường thì tư vấn sao",
+     {"intent": "HEALTH_COMBO", "health_issue": "huyết áp cao", "needs": ["combo"],
+      "sub_intents": [{"intent": "HEALTH_COMBO", "health_issue": "huyết áp cao", "needs": ["combo"]},
+                      {"intent": "HEALTH_COMBO", "health_issue": "tiểu đường", "needs": ["combo"]}]}),
+    ("combo tiểu đường giá bao nhiêu, cách thanh toán thế nào",
+     {"intent": "HEALTH_COMBO", "health_issue": "tiểu đường", "needs": ["combo"],
+      "sub_intents": [{"intent": "HEALTH_COMBO", "health_issue": "tiểu đường", "needs": ["combo"]},
+                      {"intent": "HOW_TO_PAY", "needs": ["how_to_pay"]}]}),
+    # model diễn đạt lại vấn đề -> key khác câu hỏi, tính là trượt
+    ("khách hay bị ợ chua, nóng rát thượng vị",
+     {"intent": "HEALTH_PRODUCT", "health_issue": "trào ngược dạ dày", "needs": ["products"]}),
+    ("người già hay quên, đầu óc lơ mơ thì dùng gì",
+     {"intent": "HEALTH_PRODUCT", "health_issue": "suy giảm trí nhớ", "needs": ["products"]}),
+]
+
+
+class ScriptedCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+        self.answers = {normalize_text(app.apply_synonyms(q)): a for q, a in CASES}
+
+    def create(self, model, messages, **kw):
+        time.sleep(self.latency)
+        question = messages[-1]["content"].split("[CÂU HỎI]\n")[-1]
+        content = json.dumps(self.answers[normalize_text(question)])
+        usage = SimpleNamespace(prompt_tokens=500, completion_tokens=60, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def run(text, speculate):
+    """
+    (thời gian sau phân loại -> có câu trả lời cốt lõi, tổng thời gian, câu trả lời cốt lõi)
+    """
+    app.OPENAI_FLIGHT = app.SingleFlight()  # không gộp giữa các lượt đo
+    t0 = time.perf_counter()
+    lookups = app.start_speculative_lookups(text, normalize_text(text)) if speculate else None
+    try:
+        info = app.classify_intent_with_openai(text)
+        t1 = time.perf_counter()
+        core, _ = app.resolve_sub_intents(app.get_sub_intents(info, text), text, "bench", lookups)
+        t2 = time.perf_counter()
+    finally:
+        if lookups is not None:
+            lookups.finish()
+    app.PENDING_UPLINE_STATE.clear()
+    return (t2 - t1) * 1000, (t2 - t0) * 1000, core
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app._openai_client = SimpleNamespace(chat=SimpleNamespace(completions=ScriptedCompletions(args.latency)))
+    mismatched = 0
+    after = {False: [], True: []}
+    total = {False: [], True: []}
+    with app.CATALOG.pinned():
+        for text, _ in CASES:
+            run(text, False)  # làm nóng index lazy
+        for _ in range(args.repeat):
+            for text, _ in CASES:
+                base = run(text, False)
+                spec = run(text, True)
+                for flag, r in ((False, base), (True, spec)):
+                    after[flag].append(r[0])
+                    total[flag].append(r[1])
+                if base[2] != spec[2]:
+                    mismatched += 1
+                    print(f"[FAIL] {text!r}: câu trả lời khác khi tra cứu trước")
+
+    print(app.SPECULATION_STATS.format_stats())
+    print(f"\n{len(CASES)} câu x {args.repeat} lượt, OpenAI giả {args.latency * 1000:.0f} ms")
+    for flag, name in ((False, "tuần tự"), (True, "tra cứu trước")):
+        print(
+            f"{name:>14}: sau phân loại -> câu trả lời cốt lõi trung bình {statistics.mean(after[flag]):.3f} ms "
+            f"(p95 {sorted(after[flag])[int(len(after[flag]) * 0.95)]:.3f}), "
+            f"tổng {statistics.mean(total[flag]):.1f} ms"
+        )
+    print(f"câu trả lời khác nhau: {mismatched}")
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
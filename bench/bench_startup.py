@@ -0,0 +1,141 @@
+"""
+Đo cold start:
+  1. `python -X importtime -c "import app"`: tổng thời gian import + các module nặng nhất.
+  2. Chạy `python app.py` thật với Telegram giả lập (TELEGRAM_API_BASE), đo:
+     - port mở (Flask nhận kết nối)
+     - /healthz trả 200 (catalog + index đã nạp)
+     - tin nhắn đầu tiên gửi vào /webhook -> bot gọi sendMessage
+  So sánh warm-up nền (mặc định) với EAGER_WARMUP=1 (nạp hết trước khi mở port như trước).
+
+    python bench/bench_startup.py [--runs 3]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def importtime_summary(top=10, api_key=""):
+    env = dict(os.environ, TELEGRAM_TOKEN="bench", OPENAI_API_KEY=api_key, EAGER_WARMUP="0")
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        # mỗi cấp import con thụt thêm 2 khoảng trắng
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cum_us), depth, name.strip()))
+    total = sum(cum for cum, depth, _ in rows if depth == 0)
+    print(f"import app: {total / 1000:.1f} ms")
+    for cum, _, name in sorted(r for r in rows if r[1] == 1)[::-1][:top]:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+
+class _StubTelegram(BaseHTTPRequestHandler):
+    first_message_at = None
+    event = threading.Event()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path.endswith("/sendMessage") and _StubTelegram.first_message_at is None:
+            _StubTelegram.first_message_at = time.perf_counter()
+            _StubTelegram.event.set()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"ok":true}')
+
+    def log_message(self, *args):
+        pass
+
+
+def wait_port(port, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                return time.perf_counter()
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError("port không mở")
+
+
+def run_once(stub_port, eager):
+    _StubTelegram.first_message_at = None
+    _StubTelegram.event.clear()
+    port = free_port()
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN="bench",
+        OPENAI_API_KEY="",
+        LOG_SHEET_WEBHOOK_URL="",
+        PORT=str(port),
+        TELEGRAM_API_BASE=f"http://127.0.0.1:{stub_port}",
+        EAGER_WARMUP="1" if eager else "0",
+    )
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        t_port = wait_port(port, t0 + 30)
+        update = {"message": {"message_id": 1, "chat": {"id": 1}, "from": {"username": "bench"},
+                              "text": "antigelm 01 dùng thế nào"}}
+        req = urllib.request.Request(
+            f"http://127.0.0.1:{port}/webhook", data=json.dumps(update).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        urllib.request.urlopen(req, timeout=30).read()
+        _StubTelegram.event.wait(30)
+        t_reply = _StubTelegram.first_message_at
+        t_ready = None
+        while t_ready is None and time.perf_counter() < t0 + 30:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1).read()
+                t_ready = time.perf_counter()
+            except Exception:
+                time.sleep(0.01)
+        return t_port - t0, t_ready - t0, t_reply - t0
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    importtime_summary()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubTelegram)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    print()
+    print(f"{'mode':<14} {'port open s':>11} {'healthz s':>10} {'first reply s':>14}")
+    for eager in (False, True):
+        res = [run_once(stub.server_address[1], eager) for _ in range(args.runs)]
+        best = [min(r[i] for r in res) for i in range(3)]
+        name = "eager" if eager else "background"
+        print(f"{name:<14} {best[0]:>11.3f} {best[1]:>10.3f} {best[2]:>14.3f}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Bộ nhớ từng worker gunicorn (USS / PSS) khi chạy 1, 4, 8 worker:
+  - no-preload:     mỗi worker tự import app + nạp catalog (như chạy gunicorn mặc định)
+  - preload:        preload_app, catalog + index nạp trong master trước fork
+  - preload+freeze: như trên + gc.freeze() trước fork (cấu hình mặc định của gunicorn.conf.py)
+
+Catalog giả lập N SKU được compile thành artifact, app chạy APP_ENV=production.
+Sau khi mọi worker sẵn sàng, gửi một loạt tin nhắn tra sản phẩm rồi đọc
+/proc/<pid>/smaps_rollup. USS = Private_Clean + Private_Dirty.
+
+    python bench/bench_workers.py [--sku 10000] [--workers 1,4,8] [--requests 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from synthetic import ROOT, synthetic_catalog
+from bench_artifact import write_sources
+from bench_startup import _StubTelegram, free_port, wait_port
+
+MODES = (
+    ("no-preload", {"GUNICORN_PRELOAD": "0"}),
+    ("preload", {"GUNICORN_PRELOAD": "1", "GC_FREEZE": "0"}),
+    ("preload+freeze", {"GUNICORN_PRELOAD": "1", "GC_FREEZE": "1"}),
+)
+
+QUERIES = [
+    "antigelm 01 dùng thế nào",
+    "sản phẩm cho dạ dày",
+    "combo mất ngủ",
+    "lecithin plus giá bao nhiêu",
+    "gan nhiễm mỡ dùng gì",
+]
+
+
+def smaps(pid):
+    res = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                res[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    res["USS"] = res.get("Private_Clean", 0) + res.get("Private_Dirty", 0)
+    return res
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(x) for x in f.read().split()]
+
+
+def post_update(port, i, text):
+    update = {"message": {"message_id": i, "chat": {"id": 1000 + i % 50}, "from": {"username": "bench"},
+                          "text": text}}
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}/webhook", data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    urllib.request.urlopen(req, timeout=60).read()
+
+
+def wait_stable(pids, deadline):
+    """
+    Chờ RSS các worker ngừng tăng (worker no-preload còn đang nạp catalog).
+    """
+    last, same = None, 0
+    while time.perf_counter() < deadline and same < 3:
+        now = [smaps(p)["Rss"] for p in pids]
+        same = same + 1 if now == last else 0
+        last = now
+        time.sleep(0.5)
+
+
+def run(mode_env, n_workers, artifact, stub_port, n_requests):
+    port = free_port()
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN="bench",
+        OPENAI_API_KEY="",
+        LOG_SHEET_WEBHOOK_URL="",
+        APP_ENV="production",
+        CATALOG_ARTIFACT=artifact,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(n_workers),
+        TELEGRAM_API_BASE=f"http://127.0.0.1:{stub_port}",
+        **mode_env,
+    )
+    env.pop("EAGER_WARMUP", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.perf_counter() + 300
+        wait_port(port, deadline)
+        while len(children(proc.pid)) < n_workers:
+            time.sleep(0.1)
+        for i in range(n_requests):
+            post_update(port, i, QUERIES[i % len(QUERIES)])
+        pids = children(proc.pid)
+        wait_stable(pids, deadline)
+        workers = [smaps(p) for p in pids]
+        master = smaps(proc.pid)
+        return {
+            "uss": sum(w["USS"] for w in workers) / len(workers),
+            "pss": sum(w["Pss"] for w in workers) / len(workers),
+            "total_pss": master["Pss"] + sum(w["Pss"] for w in workers),
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sku", type=int, default=10000)
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubTelegram)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as src:
+        write_sources(synthetic_catalog(args.sku), src)
+        artifact = os.path.join(src, "catalog.bin")
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "compile_catalog.py"), "--src", src, "--out", artifact],
+            check=True, capture_output=True,
+        )
+        print(f"{args.sku} SKU, artifact {os.path.getsize(artifact) / 1e6:.1f} MB")
+        print(f"{'mode':<16} {'workers':>7} {'USS/worker MB':>14} {'PSS/worker MB':>14} {'total PSS MB':>13}")
+        for n in [int(x) for x in args.workers.split(",")]:
+            for name, mode_env in MODES:
+                r = run(mode_env, n, artifact, stub.server_address[1], args.requests)
+                print(f"{name:<16} {n:>7} {r['uss']:>14.1f} {r['pss']:>14.1f} {r['total_pss']:>13.1f}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Sinh catalog giả lập (nhân bản products/combos thật, đổi mã + tên) để đo ở quy mô 10k SKU.
+"""
+import os
+import sys
+import json
+import copy
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app.py bắt buộc có TELEGRAM_TOKEN, bench không gửi gì ra ngoài
+os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+
+_SUFFIXES = ["plus", "gold", "kids", "forte", "max", "care", "pro", "lite", "extra", "new"]
+
+
+def load_real():
+    from catalog import BASE_DIR, load_catalog_data
+    return load_catalog_data(BASE_DIR)
+
+
+def synthetic_catalog(n_products, n_combos=None, seed=42):
+    """
+    Trả về dict giống load_catalog_data() với n_products sản phẩm.
+    """
+    rnd = random.Random(seed)
+    data = load_real()
+    base_products = data["products"]
+    base_combos = data["combos"]
+
+    products = []
+    for i in range(n_products):
+        p = copy.deepcopy(base_products[i % len(base_products)])
+        if i >= len(base_products):
+            suffix = f"{rnd.choice(_SUFFIXES)} {i}"
+            p["code"] = f"{p['code']}{i:05d}"
+            p["name"] = f"{p['name']} {suffix}"
+            p["short_name"] = f"{p.get('short_name', '')} {suffix}"
+            p["aliases"] = [p["code"], p["name"]] + [f"{a} {suffix}" for a in p.get("aliases", [])[:3]]
+        products.append(p)
+
+    if n_combos is None:
+        n_combos = max(len(base_combos), n_products // 4)
+    combos = []
+    for i in range(n_combos):
+        c = copy.deepcopy(base_combos[i % len(base_combos)])
+        if i >= len(base_combos):
+            c["id"] = f"{c['id']}_{i}"
+            c["name"] = f"{c['name']} {rnd.choice(_SUFFIXES)} {i}"
+            c["products"] = [
+                dict(cp, product_code=rnd.choice(products)["code"]) for cp in c.get("products", [])
+            ]
+        combos.append(c)
+
+    data["products"] = products
+    data["combos"] = combos
+    return data
+
+
+def raw_json_size(data):
+    return len(json.dumps({"products": data["products"]}, ensure_ascii=False).encode("utf-8")) + len(
+        json.dumps({"combos": data["combos"]}, ensure_ascii=False).encode("utf-8")
+    )
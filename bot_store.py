@@ -0,0 +1,307 @@
+"""
+Trạng thái bền của bot trong 1 file SQLite (BOT_DB_PATH):
+- known_chats: mọi chat riêng đã từng nhắn bot (nguồn người nhận /broadcast)
+- broadcasts + broadcast_recipients: job broadcast, trạng thái từng người nhận để chạy tiếp sau restart
+- reminders: nhắc lịch hẹn của TVV (scheduler.py)
+
+Mỗi thread 1 connection, WAL để đọc/ghi song song giữa các worker gunicorn.
+Job chạy nền được "thuê" (owner + lease_until): chỉ 1 process chạy 1 job tại 1 thời điểm,
+process chết thì hết lease, process khác nhận lại. Broadcast còn gom về 1 process: đang có
+process giữ lease còn hạn thì process khác không nhận job mới (tổng tốc độ gửi không nhân
+theo số worker).
+"""
+import os
+import time
+import sqlite3
+import threading
+
+from catalog import BASE_DIR
+
+BOT_DB_PATH = os.getenv("BOT_DB_PATH", "") or os.path.join(BASE_DIR, "bot_state.db")
+
+# Ghi lại last_seen của 1 chat tối đa 1 lần / khoảng này, tránh ghi DB mỗi tin nhắn
+TOUCH_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS known_chats (
+    chat_id     INTEGER PRIMARY KEY,
+    username    TEXT,
+    first_seen  REAL NOT NULL,
+    last_seen   REAL NOT NULL,
+    blocked     INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    text        TEXT NOT NULL,
+    created_by  TEXT,
+    created_at  REAL NOT NULL,
+    status      TEXT NOT NULL,          -- running / done / stopped
+    total       INTEGER NOT NULL DEFAULT 0,
+    owner       TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    broadcast_id INTEGER NOT NULL,
+    chat_id      INTEGER NOT NULL,
+    status       INTEGER NOT NULL DEFAULT 0,   -- 0 chờ, 1 đã gửi, 2 lỗi
+    error        TEXT,
+    PRIMARY KEY (broadcast_id, chat_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_recipients_pending ON broadcast_recipients (broadcast_id, status);
+CREATE TABLE IF NOT EXISTS reminders (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id     INTEGER NOT NULL,
+    text        TEXT NOT NULL,
+    due_at      REAL NOT NULL,
+    status      INTEGER NOT NULL DEFAULT 0,   -- xem REMINDER_*
+    interval_s  REAL NOT NULL DEFAULT 0,      -- > 0: lặp lại sau mỗi interval_s giây
+    repeat_left INTEGER NOT NULL DEFAULT 0,   -- số lần lặp còn lại sau lần này
+    created_at  REAL NOT NULL,
+    fired_at    REAL,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders (status, due_at);
+CREATE INDEX IF NOT EXISTS idx_reminders_chat ON reminders (chat_id, status);
+"""
+
+RECIPIENT_PENDING = 0
+RECIPIENT_SENT = 1
+RECIPIENT_FAILED = 2
+
+REMINDER_PENDING = 0
+REMINDER_SENDING = 1    # đã nhận để gửi; chết ở bước này thì KHÔNG gửi lại
+REMINDER_SENT = 2
+REMINDER_FAILED = 3
+REMINDER_CANCELLED = 4
+REMINDER_UNKNOWN = 5    # process chết lúc đang gửi, không rõ đã tới chưa
+
+
+class BotStore:
+    def __init__(self, path=BOT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._touched = {}
+        self._touch_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._ready:
+                    conn.executescript(_SCHEMA)
+                    self._ready = True
+        return conn
+
+    # ===== KNOWN CHATS =====
+    def touch_chat(self, chat_id, username=""):
+        now = time.time()
+        key = int(chat_id)
+        with self._touch_lock:
+            if now - self._touched.get(key, 0) < TOUCH_INTERVAL:
+                return
+            self._touched[key] = now
+        self.conn().execute(
+            "INSERT INTO known_chats (chat_id, username, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET username = excluded.username, "
+            "last_seen = excluded.last_seen, blocked = 0",
+            (key, username or "", now, now),
+        )
+
+    def mark_blocked(self, chat_ids):
+        self.conn().executemany("UPDATE known_chats SET blocked = 1 WHERE chat_id = ?", [(int(c),) for c in chat_ids])
+
+    def count_chats(self):
+        return self.conn().execute("SELECT COUNT(*) FROM known_chats WHERE blocked = 0").fetchone()[0]
+
+    # ===== BROADCAST =====
+    def create_broadcast(self, text, created_by="", exclude=()):
+        """
+        Chụp danh sách người nhận ngay lúc tạo (chat mới nhắn sau đó không nhận).
+        """
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "INSERT INTO broadcasts (text, created_by, created_at, status) VALUES (?, ?, ?, 'running')",
+                (text, created_by, time.time()),
+            )
+            bid = cur.lastrowid
+            excluded = [int(c) for c in exclude if str(c).lstrip("-").isdigit()]
+            sql = "INSERT INTO broadcast_recipients (broadcast_id, chat_id) SELECT ?, chat_id FROM known_chats WHERE blocked = 0"
+            if excluded:
+                sql += f" AND chat_id NOT IN ({','.join('?' * len(excluded))})"
+            conn.execute(sql, (bid, *excluded))
+            total = conn.execute(
+                "SELECT COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ?", (bid,)
+            ).fetchone()[0]
+            conn.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, bid))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return bid, total
+
+    def claim_broadcast(self, owner, lease, bid=None):
+        """
+        Nhận 1 job đang running mà chưa ai giữ lease (hoặc lease đã hết), khi không có
+        process nào khác đang giữ lease còn hạn của job broadcast khác. Trả về id hoặc None.
+        """
+        now = time.time()
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            busy = conn.execute(
+                "SELECT 1 FROM broadcasts WHERE status = 'running' AND lease_until >= ? AND owner != ? LIMIT 1",
+                (now, owner),
+            ).fetchone()
+            row = None if busy else conn.execute(
+                "SELECT id FROM broadcasts WHERE status = 'running' AND lease_until < ? "
+                + ("AND id = ? " if bid is not None else "")
+                + "ORDER BY id LIMIT 1",
+                (now, bid) if bid is not None else (now,),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE broadcasts SET owner = ?, lease_until = ? WHERE id = ?", (owner, now + lease, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def renew_lease(self, bid, owner, lease):
+        """
+        False nếu job đã bị dừng hoặc process khác đã nhận.
+        """
+        cur = self.conn().execute(
+            "UPDATE broadcasts SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (time.time() + lease, bid, owner),
+        )
+        return cur.rowcount == 1
+
+    def release_broadcasts(self, owner):
+        """
+        Trả lease mọi job running của owner (process dừng êm) để process khác nhận ngay.
+        """
+        cur = self.conn().execute(
+            "UPDATE broadcasts SET lease_until = 0 WHERE owner = ? AND status = 'running'", (owner,)
+        )
+        return cur.rowcount
+
+    def get_broadcast(self, bid=None):
+        conn = self.conn()
+        if bid is None:
+            row = conn.execute("SELECT id FROM broadcasts ORDER BY id DESC LIMIT 1").fetchone()
+            if not row:
+                return None
+            bid = row[0]
+        row = conn.execute(
+            "SELECT id, text, status, total, created_at, finished_at FROM broadcasts WHERE id = ?", (bid,)
+        ).fetchone()
+        if not row:
+            return None
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status", (bid,)
+        ).fetchall())
+        return {
+            "id": row[0], "text": row[1], "status": row[2], "total": row[3],
+            "created_at": row[4], "finished_at": row[5],
+            "sent": counts.get(RECIPIENT_SENT, 0), "failed": counts.get(RECIPIENT_FAILED, 0),
+            "pending": counts.get(RECIPIENT_PENDING, 0),
+        }
+
+    def pending_recipients(self, bid, limit):
+        return [r[0] for r in self.conn().execute(
+            "SELECT chat_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 0 LIMIT ?", (bid, limit)
+        )]
+
+    def mark_recipients(self, bid, results):
+        """
+        results: list (chat_id, status, error). Ghi 1 transaction cho cả lô.
+        """
+        conn = self.conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "UPDATE broadcast_recipients SET status = ?, error = ? WHERE broadcast_id = ? AND chat_id = ?",
+            [(status, error, bid, chat_id) for chat_id, status, error in results],
+        )
+        conn.execute("COMMIT")
+
+    def set_broadcast_status(self, bid, status, only_running=True):
+        cur = self.conn().execute(
+            "UPDATE broadcasts SET status = ?, finished_at = ?, lease_until = 0 WHERE id = ?"
+            + (" AND status = 'running'" if only_running else ""),
+            (status, time.time(), bid),
+        )
+        return cur.rowcount == 1
+
+    # ===== NHẮC LỊCH =====
+    def add_reminder(self, chat_id, text, due_at, interval_s=0, repeat_left=0):
+        cur = self.conn().execute(
+            "INSERT INTO reminders (chat_id, text, due_at, interval_s, repeat_left, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (int(chat_id), text, due_at, interval_s, repeat_left, time.time()),
+        )
+        return cur.lastrowid
+
+    def pending_reminders(self, before=None):
+        """
+        (due_at, id) của các nhắc lịch chờ gửi, due_at < before nếu có.
+        """
+        if before is None:
+            return self.conn().execute("SELECT due_at, id FROM reminders WHERE status = 0").fetchall()
+        return self.conn().execute(
+            "SELECT due_at, id FROM reminders WHERE status = 0 AND due_at < ?", (before,)
+        ).fetchall()
+
+    def claim_reminder(self, rid):
+        """
+        Chuyển pending -> sending. Chỉ 1 process / thread nhận được (rowcount == 1).
+        Trả về row (id, chat_id, text, due_at, interval_s, repeat_left) hoặc None.
+        """
+        conn = self.conn()
+        cur = conn.execute(
+            "UPDATE reminders SET status = ?, fired_at = ? WHERE id = ? AND status = ?",
+            (REMINDER_SENDING, time.time(), rid, REMINDER_PENDING),
+        )
+        if cur.rowcount != 1:
+            return None
+        return conn.execute(
+            "SELECT id, chat_id, text, due_at, interval_s, repeat_left FROM reminders WHERE id = ?", (rid,)
+        ).fetchone()
+
+    def finish_reminder(self, rid, ok, error=None):
+        self.conn().execute(
+            "UPDATE reminders SET status = ?, error = ? WHERE id = ?",
+            (REMINDER_SENT if ok else REMINDER_FAILED, error, rid),
+        )
+
+    def expire_stuck_reminders(self, older_than):
+        """
+        Nhắc lịch kẹt ở "sending" (process chết giữa lúc gửi) -> unknown, không gửi lại.
+        """
+        return self.conn().execute(
+            "UPDATE reminders SET status = ? WHERE status = ? AND fired_at < ?",
+            (REMINDER_UNKNOWN, REMINDER_SENDING, older_than),
+        ).rowcount
+
+    def cancel_reminder(self, rid, chat_id):
+        return self.conn().execute(
+            "UPDATE reminders SET status = ? WHERE id = ? AND chat_id = ? AND status = ?",
+            (REMINDER_CANCELLED, rid, int(chat_id), REMINDER_PENDING),
+        ).rowcount == 1
+
+    def list_reminders(self, chat_id, limit=20):
+        return self.conn().execute(
+            "SELECT id, due_at, text, repeat_left FROM reminders WHERE chat_id = ? AND status = 0 "
+            "ORDER BY due_at LIMIT ?",
+            (int(chat_id), limit),
+        ).fetchall()
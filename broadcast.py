@@ -0,0 +1,196 @@
+"""
+/broadcast của tuyến trên: gửi 1 thông báo tới mọi TVV đã từng nhắn bot.
+
+- Người nhận chụp từ known_chats lúc tạo job, trạng thái từng người lưu SQLite (bot_store)
+  -> restart giữa chừng thì chạy tiếp phần còn chờ, không gửi lại người đã nhận.
+- Gửi song song BROADCAST_WORKERS thread qua TelegramSender, tốc độ chặn bởi limiter riêng
+  (BROADCAST_RATE tin/giây) nằm dưới limiter chung của bot.
+- Báo tiến độ về chat tuyến trên mỗi PROGRESS_INTERVAL giây và khi xong.
+Đảm bảo "ít nhất 1 lần": kết quả ghi ngay sau từng tin, process chết giữa chừng thì
+chỉ các tin đang gửi dở (tối đa BROADCAST_WORKERS) có thể được gửi lại.
+
+Lease: job đang chạy gia hạn lease mỗi batch. Dừng êm (shutdown: deploy, worker respawn) thì
+gửi nốt batch đang dở rồi trả lease, process mới nhận ngay lúc khởi động. Process bị kill thì
+lease hết hạn sau LEASE_SECONDS, vòng nhận lại (start_reclaimer) của process còn sống nhận tiếp.
+Mọi job chạy trong 1 process (bot_store.claim_broadcast) và dùng chung 1 limiter.
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bot_store import RECIPIENT_FAILED, RECIPIENT_SENT
+from telegram_sender import RateLimiter
+
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20") or 20)
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8") or 8)
+BATCH_SIZE = 100
+LEASE_SECONDS = float(os.getenv("BROADCAST_LEASE_SECONDS", "60") or 60)
+PROGRESS_INTERVAL = 30
+
+
+class BroadcastRunner:
+    def __init__(self, store, sender, notify, rate=BROADCAST_RATE, workers=BROADCAST_WORKERS, lease=LEASE_SECONDS):
+        """
+        notify(text): gửi tin báo tiến độ về tuyến trên.
+        """
+        self.store = store
+        self.sender = sender
+        self.notify = notify
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+        self.lease = lease
+        # lease gia hạn mỗi batch: 1 batch phải gửi xong trong 1/3 lease, không thì lease hết
+        # giữa batch và process khác nhận job song song
+        self.batch_size = max(1, min(BATCH_SIZE, int(rate * lease / 3)))
+        self._owner = None
+        self._owner_pid = None
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._reclaimer = None
+
+    @property
+    def owner(self):
+        # mỗi process 1 owner id, lease trong DB chặn 2 process chạy cùng 1 job.
+        # Gunicorn preload tạo runner ở master trước khi fork: sinh lại theo pid của worker.
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            self._owner_pid = pid
+            self._owner = f"{pid}-{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def start(self, text, created_by="", exclude=()):
+        bid, total = self.store.create_broadcast(text, created_by=created_by, exclude=exclude)
+        if total:
+            self._spawn(bid)
+        else:
+            self.store.set_broadcast_status(bid, "done")
+        return bid, total
+
+    def resume(self):
+        """
+        Nhận lại các job còn running không ai giữ lease (process trước đã dừng / chết).
+        """
+        resumed = []
+        while not self._stopping.is_set():
+            bid = self.store.claim_broadcast(self.owner, self.lease)
+            if bid is None:
+                break
+            self._spawn(bid, claimed=True)
+            resumed.append(bid)
+        return resumed
+
+    def start_reclaimer(self, interval=None):
+        """
+        Thread nền gọi resume() định kỳ: nhận job của process đã chết khi lease hết hạn.
+        """
+        if self._reclaimer is not None and self._reclaimer.is_alive():
+            return
+        interval = interval or self.lease / 2
+
+        def loop():
+            while not self._stopping.wait(interval):
+                try:
+                    resumed = self.resume()
+                    if resumed:
+                        print(f"[INFO] Nhận lại broadcast (lease hết hạn): {resumed}")
+                except Exception as e:
+                    print("[WARN] Vòng nhận lại broadcast lỗi:", e)
+
+        self._reclaimer = threading.Thread(target=loop, name="broadcast-reclaim", daemon=True)
+        self._reclaimer.start()
+
+    def shutdown(self, timeout=20.0):
+        """
+        Dừng êm: các job gửi nốt batch đang dở rồi dừng, sau đó trả lease.
+        Gọi nhiều lần được.
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads.values())
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        released = self.store.release_broadcasts(self.owner)
+        if released:
+            print(f"[INFO] Đã trả lease {released} broadcast cho process khác")
+
+    def stop(self, bid):
+        return self.store.set_broadcast_status(bid, "stopped")
+
+    def _spawn(self, bid, claimed=False):
+        with self._lock:
+            t = self._threads.get(bid)
+            if t and t.is_alive():
+                return
+            t = threading.Thread(target=self._run, args=(bid, claimed), name=f"broadcast-{bid}", daemon=True)
+            self._threads[bid] = t
+        t.start()
+
+    def _send_one(self, bid, chat_id, text):
+        # nội dung do tuyến trên gõ tự do, gửi dạng text thường để không lỗi parse HTML
+        res = self.sender.send_message(chat_id, text, parse_mode=None, limiter=self.limiter)
+        if res.ok:
+            result = (chat_id, RECIPIENT_SENT, None)
+        else:
+            result = (chat_id, RECIPIENT_FAILED, f"{res.status} {res.error}"[:200])
+        # ghi ngay từng người nhận: chết giữa chừng thì chỉ các tin đang bay có thể gửi lại
+        self.store.mark_recipients(bid, [result])
+        if res.blocked:
+            self.store.mark_blocked([chat_id])
+        return result
+
+    def _run(self, bid, claimed):
+        if not claimed and self.store.claim_broadcast(self.owner, self.lease, bid=bid) is None:
+            self.notify(f"📣 Broadcast #{bid}: process khác đang gửi broadcast, job sẽ chạy khi tới lượt.")
+            return
+        info = self.store.get_broadcast(bid)
+        text = info["text"]
+        started = time.time()
+        done_here = 0
+        last_report = started
+        resumed_note = " (chạy tiếp sau khởi động lại)" if info["sent"] or info["failed"] else ""
+        self.notify(f"📣 Broadcast #{bid}: bắt đầu gửi {info['pending']}/{info['total']} TVV{resumed_note}.")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"bc{bid}") as pool:
+                while True:
+                    if self._stopping.is_set():
+                        # process đang dừng: shutdown() trả lease, process khác chạy tiếp
+                        return
+                    if not self.store.renew_lease(bid, self.owner, self.lease):
+                        # bị /broadcast_stop hoặc process khác đã nhận job
+                        break
+                    batch = self.store.pending_recipients(bid, self.batch_size)
+                    if not batch:
+                        self.store.set_broadcast_status(bid, "done")
+                        break
+                    results = list(pool.map(lambda c: self._send_one(bid, c, text), batch))
+                    done_here += len(results)
+                    if time.time() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.time()
+                        self.notify(self.format_progress(bid, done_here, last_report - started))
+        except Exception as e:
+            print(f"[ERROR] Broadcast #{bid} lỗi:", e)
+            self.notify(f"❌ Broadcast #{bid} dừng vì lỗi: {e}. Job sẽ tự chạy tiếp khi lease hết hạn.")
+            return
+        self.notify(self.format_progress(bid, done_here, time.time() - started, final=True))
+
+    def format_progress(self, bid, done_here=0, elapsed=0.0, final=False):
+        info = self.store.get_broadcast(bid)
+        if not info:
+            return f"Không có broadcast #{bid}."
+        handled = info["sent"] + info["failed"]
+        pct = handled * 100 / info["total"] if info["total"] else 100
+        rate = done_here / elapsed if elapsed > 0 else 0
+        head = {"done": "✅", "stopped": "⏹"}.get(info["status"], "📣") if final else "📣"
+        line = (
+            f"{head} Broadcast #{bid} [{info['status']}]: {handled}/{info['total']} ({pct:.0f}%), "
+            f"gửi được {info['sent']}, lỗi {info['failed']}"
+        )
+        if rate:
+            line += f", {rate:.1f} tin/giây"
+        return line
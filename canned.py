@@ -0,0 +1,108 @@
+"""
+Mẫu tin soạn sẵn (canned_responses.json) cho TVV: /mau <key>.
+
+- Nạp cùng catalog (reload / artifact như các file JSON khác), index "canned":
+  khoá không dấu đã sort + bisect, giống inline_search -> gõ tiền tố ("/mau chot") là ra.
+  Khoá gồm tên mẫu ("chot don cod") và từng hậu tố từ ("don cod", "cod").
+- Trả thẳng từ RAM: không phân loại intent, không gọi OpenAI làm mượt câu.
+- Đếm lượt dùng từng mẫu (CANNED_HITS, trong process) để ước lượng số lượt OpenAI tiết kiệm.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+from catalog import register_index
+from fulltext import fold_text
+
+# Mỗi câu hỏi tự do tốn 1 lượt phân loại + 1 lượt làm mượt câu trả lời
+CALLS_PER_QUESTION = ("classify", "style")
+# Telegram: tên lệnh [a-z0-9_], tối đa 32 ký tự; mô tả 3–256 ký tự
+MAX_COMMAND_LEN = 32
+MENU_DESCRIPTION_LEN = 60
+
+CANNED_HITS = Counter()
+_hits_lock = threading.Lock()
+
+
+def record_canned_hit(key):
+    with _hits_lock:
+        CANNED_HITS[key] += 1
+
+
+def _key_words(key: str):
+    return fold_text(key.replace("_", " "))
+
+
+class CannedIndex:
+    __slots__ = ("responses", "keys", "names")
+
+    def __init__(self, responses):
+        self.responses = dict(responses)
+        pairs = set()
+        for name in self.responses:
+            words = _key_words(name).split()
+            for i in range(len(words)):
+                pairs.add((" ".join(words[i:]), name))
+        pairs = sorted(pairs)
+        self.keys = tuple(k for k, _ in pairs)
+        self.names = tuple(n for _, n in pairs)
+
+    def get(self, name):
+        return self.responses.get(name)
+
+    def search(self, query: str):
+        """
+        Tên mẫu khớp query: trùng khớp tên -> chỉ 1 mẫu đó; không thì mọi mẫu có
+        tiền tố query ở đầu 1 từ, theo thứ tự tên. Query rỗng -> tất cả.
+        """
+        if query in self.responses:
+            return [query]
+        q = _key_words(query)
+        if not q:
+            return sorted(self.responses)
+        if q.replace(" ", "_") in self.responses:
+            return [q.replace(" ", "_")]
+        start = bisect_left(self.keys, q)
+        end = bisect_left(self.keys, q + "\uffff", lo=start)
+        return sorted(set(self.names[start:end]))
+
+
+@register_index("canned")
+def build_canned_index(snapshot):
+    # artifact compile trước khi có canned_responses thì snapshot không có thuộc tính này
+    return CannedIndex(getattr(snapshot, "canned_responses", {}))
+
+
+def menu_commands(index, base=()):
+    """
+    Danh sách lệnh cho setMyCommands: base + /mau + /mau_<key> cho từng mẫu (tên hợp lệ).
+    """
+    commands = list(base)
+    commands.append({"command": "mau", "description": "Mẫu tin soạn sẵn: /mau <tên mẫu>"})
+    for name in sorted(index.responses):
+        command = "mau_" + name.lower()
+        if len(command) > MAX_COMMAND_LEN or not command.replace("_", "").isalnum() or not command.isascii():
+            continue
+        text = " ".join(index.responses[name].split())
+        if len(text) > MENU_DESCRIPTION_LEN:
+            text = text[: MENU_DESCRIPTION_LEN - 1].rstrip() + "…"
+        commands.append({"command": command, "description": text})
+    return commands[:100]
+
+
+def format_canned_stats(usage):
+    """
+    Lượt dùng từng mẫu + ước lượng lượt / token OpenAI đã tiết kiệm
+    (theo số token trung bình mỗi lượt classify + style đang đo được trong /usage).
+    """
+    with _hits_lock:
+        hits = CANNED_HITS.most_common()
+    if not hits:
+        return "Chưa có lượt dùng mẫu /mau nào."
+    total = sum(n for _, n in hits)
+    tokens = sum(usage.average_tokens(call) for call in CALLS_PER_QUESTION)
+    lines = [f"/mau: {total} lượt, tiết kiệm ~{total * len(CALLS_PER_QUESTION)} lượt gọi OpenAI"]
+    if tokens:
+        lines[0] += f" (~{int(total * tokens)} token)"
+    lines.extend(f"{name}: {n}" for name, n in hits)
+    return "\n".join(lines)
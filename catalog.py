@@ -0,0 +1,575 @@
+import os
+import io
+import json
+import mmap
+import time
+import struct
+import pickle
+import hashlib
+import sys
+import threading
+from contextlib import contextmanager
+
+from records import TextStore, build_combo_records, build_product_records
+
+# ============== ĐƯỜNG DẪN JSON ==============
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# tên logic -> (tên file, giá trị mặc định, key bọc list nếu có)
+CATALOG_FILES = {
+    "products": ("products.json", {"products": []}, "products"),
+    "combos": ("combos.json", {"combos": []}, "combos"),
+    "faq_buy": ("faq_buy.json", [], None),
+    "faq_payment": ("faq_payment.json", [], None),
+    "faq_business": ("faq_business.json", [], None),
+    "health_tags_map": ("health_tags_map.json", {}, None),
+    "synonyms": ("synonyms.json", {}, None),
+    "canned_responses": ("canned_responses.json", {}, None),
+    "rules": ("rules.json", {}, None),
+}
+
+
+class CatalogError(Exception):
+    """Dữ liệu catalog không đọc được hoặc không hợp lệ."""
+
+
+# ============== TẢI DỮ LIỆU JSON ==============
+def safe_load_json(path, default=None):
+    if default is None:
+        default = {}
+    try:
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data
+    except Exception as e:
+        print(f"[WARN] Không đọc được JSON {path}: {e}")
+        return default
+
+
+def strict_load_json(path):
+    """
+    Giống safe_load_json nhưng ném CatalogError thay vì trả default.
+    Dùng khi reload: file hỏng thì giữ nguyên snapshot cũ.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        raise CatalogError(f"Không đọc được JSON {path}: {e}")
+
+
+def extract_list(data, key=None):
+    """
+    combos.json: { "combos": [ ... ] }
+    products.json: { "products": [ ... ] }
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and key and isinstance(data.get(key), list):
+        return data[key]
+    return []
+
+
+def file_mtimes(base_dir):
+    res = {}
+    for name, (filename, _, _) in CATALOG_FILES.items():
+        try:
+            res[name] = os.path.getmtime(os.path.join(base_dir, filename))
+        except OSError:
+            res[name] = None
+    return res
+
+
+def validate_catalog(data):
+    """
+    Kiểm tra cấu trúc tối thiểu. Trả về list lỗi (rỗng = hợp lệ).
+    """
+    errors = []
+    for i, p in enumerate(data["products"]):
+        if not isinstance(p, dict):
+            errors.append(f"products[{i}] không phải object")
+        elif not p.get("code") or not p.get("name"):
+            errors.append(f"products[{i}] thiếu code/name")
+    for i, c in enumerate(data["combos"]):
+        if not isinstance(c, dict):
+            errors.append(f"combos[{i}] không phải object")
+        elif not c.get("id") or not c.get("name"):
+            errors.append(f"combos[{i}] thiếu id/name")
+    for name in ("faq_buy", "faq_payment", "faq_business"):
+        if not isinstance(data[name], list):
+            errors.append(f"{name} phải là list")
+    for name in ("health_tags_map", "synonyms", "canned_responses", "rules"):
+        if not isinstance(data[name], dict):
+            errors.append(f"{name} phải là object")
+    if isinstance(data["canned_responses"], dict):
+        for key, value in data["canned_responses"].items():
+            if not isinstance(value, str) or not value.strip():
+                errors.append(f"canned_responses[{key!r}] phải là chuỗi khác rỗng")
+    if isinstance(data["rules"], dict) and not isinstance(data["rules"].get("force_upline_for", []), list):
+        errors.append("rules.force_upline_for phải là list")
+    guard = data["rules"].get("claim_guard") if isinstance(data["rules"], dict) else None
+    if guard is not None:
+        if not isinstance(guard, dict) or not isinstance(guard.get("phrases", {}), dict):
+            errors.append("rules.claim_guard phải có dạng {\"phrases\": {action: [...]}, \"allow\": [...]}")
+        else:
+            unknown = set(guard.get("phrases", {})) - {"redact", "flag", "fallback"}
+            if unknown:
+                errors.append(f"rules.claim_guard.phrases: action không hợp lệ {sorted(unknown)}")
+    return errors
+
+
+def check_references(data):
+    """
+    Lỗi dữ liệu không làm hỏng bot nhưng cần sửa: mã trùng, combo trỏ tới mã không tồn tại...
+    Trả về list cảnh báo.
+    """
+    warnings = []
+    codes = {}
+    for p in data["products"]:
+        if isinstance(p, dict) and p.get("code"):
+            code = str(p["code"])
+            if code in codes:
+                warnings.append(f"Mã sản phẩm trùng {code}: {codes[code]!r} và {p.get('name')!r}")
+            codes.setdefault(code, p.get("name"))
+    combo_ids = set()
+    for c in data["combos"]:
+        if not isinstance(c, dict):
+            continue
+        if c.get("id") in combo_ids:
+            warnings.append(f"Combo id trùng: {c.get('id')}")
+        combo_ids.add(c.get("id"))
+        for item in c.get("products") or []:
+            code = str(item.get("product_code") or item.get("code") or "")
+            if not code:
+                warnings.append(f"Combo {c.get('id')}: sản phẩm {item.get('name')!r} thiếu product_code")
+            elif code not in codes:
+                warnings.append(f"Combo {c.get('id')}: product_code {code} ({item.get('name')}) không có trong products.json")
+    for key, tags in data["health_tags_map"].items() if isinstance(data["health_tags_map"], dict) else ():
+        if not isinstance(tags, (list, str)):
+            warnings.append(f"health_tags_map[{key!r}] phải là list hoặc chuỗi")
+    for key, value in data["synonyms"].items() if isinstance(data["synonyms"], dict) else ():
+        if not isinstance(value, str):
+            warnings.append(f"synonyms[{key!r}] phải là chuỗi")
+    for i, item in enumerate(data["faq_business"] if isinstance(data["faq_business"], list) else ()):
+        if not isinstance(item, dict) or not item.get("q_keywords") or not item.get("answer"):
+            warnings.append(f"faq_business[{i}] thiếu q_keywords/answer")
+    return warnings
+
+
+# ============== INDEX ==============
+# Các module tìm kiếm đăng ký hàm build index ở đây, mỗi snapshot build lại toàn bộ.
+_INDEX_BUILDERS = []
+
+
+def register_index(name):
+    """
+    Decorator: @register_index("ten_index") cho hàm build(snapshot) -> index.
+    """
+    def deco(fn):
+        for i, (n, _) in enumerate(_INDEX_BUILDERS):
+            if n == name:
+                _INDEX_BUILDERS[i] = (name, fn)
+                break
+        else:
+            _INDEX_BUILDERS.append((name, fn))
+        return fn
+    return deco
+
+
+class CatalogSnapshot:
+    """
+    Ảnh chụp bất biến của toàn bộ catalog + index đã build.
+    Request đang chạy giữ tham chiếu snapshot cũ, reload chỉ đổi con trỏ.
+    """
+
+    def __init__(self, data, version=1, mtimes=None):
+        self.version = version
+        self.loaded_at = time.time()
+        self.mtimes = dict(mtimes or {})
+        self.source = "json"
+        self.artifact = None  # header artifact nếu nạp từ file compile sẵn
+        # Bản ghi __slots__, trường mô tả dài nằm trong text_store (mmap)
+        self.products, self.text_store = build_product_records(data["products"])
+        self.combos = build_combo_records(data["combos"])
+        self.faq_buy = tuple(data["faq_buy"])
+        self.faq_payment = tuple(data["faq_payment"])
+        self.faq_business = tuple(data["faq_business"])
+        self.health_tags_map = dict(data["health_tags_map"])
+        self.synonyms = dict(data["synonyms"])
+        self.canned_responses = {
+            str(k): v for k, v in dict(data["canned_responses"]).items() if isinstance(v, str) and v.strip()
+        }
+        self.rules = dict(data["rules"])
+        self.products_by_code = {str(p.code): p for p in self.products}
+        self.combos_by_id = {str(c.id): c for c in self.combos}
+        self.indexes = {}
+        for name, builder in _INDEX_BUILDERS:
+            self.indexes[name] = builder(self)
+        self._frozen = True
+
+    def __setattr__(self, key, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("CatalogSnapshot là bất biến")
+        object.__setattr__(self, key, value)
+
+    def index(self, name):
+        return self.indexes.get(name)
+
+
+# ============== ARTIFACT ĐÃ COMPILE ==============
+# File nhị phân do compile_catalog.py tạo:
+#   MAGIC (8 byte) | độ dài header (uint32) | header JSON | payload pickle | text blob
+# payload = CatalogSnapshot đã build đủ index; text blob = nội dung TextStore,
+# được mmap thẳng từ file artifact khi nạp (không copy vào RAM).
+# Chỉ nạp artifact do chính mình build (pickle), không nhận file từ nguồn ngoài.
+ARTIFACT_MAGIC = b"WLCATv1\x00"
+# Tăng mỗi khi đổi class bản ghi / index được pickle (thêm bớt __slots__, đổi cấu trúc bên trong).
+# Ngoài ra header còn lưu checksum mã nguồn các module build index (index_code_checksum),
+# artifact build từ mã cũ bị từ chối dù quên tăng số này.
+# 2: index prefix / giá / cụm từ mới, PhraseFinder, text_norm dạng bảng
+ARTIFACT_FORMAT = 2
+
+
+def source_checksums(base_dir):
+    res = {}
+    for name, (filename, _, _) in CATALOG_FILES.items():
+        path = os.path.join(base_dir, filename)
+        try:
+            with open(path, "rb") as f:
+                res[name] = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            res[name] = None
+    return res
+
+
+def index_code_checksum():
+    """
+    sha256 mã nguồn catalog.py, records.py, mọi module đã đăng ký index và các module
+    trong repo mà chúng import (text_norm, keyword_flags...).
+    """
+    modules = {__name__, TextStore.__module__}
+    for _, builder in _INDEX_BUILDERS:
+        modules.add(builder.__module__)
+        for value in vars(sys.modules[builder.__module__]).values():
+            modules.add(value.__name__ if isinstance(value, type(sys)) else getattr(value, "__module__", None))
+    files = set()
+    for name in modules:
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == BASE_DIR:
+            files.add(os.path.abspath(path))
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class _ArtifactPickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        # TextStore không pickle được (mmap), chỉ lưu bảng offset, blob ghi riêng
+        if isinstance(obj, TextStore):
+            return ("text_store", obj.refs)
+        return None
+
+
+class _ArtifactUnpickler(pickle.Unpickler):
+    def __init__(self, f, buf, text_offset):
+        super().__init__(f)
+        self._buf = buf
+        self._text_offset = text_offset
+
+    def persistent_load(self, pid):
+        if pid[0] == "text_store":
+            return TextStore(self._buf, pid[1], base=self._text_offset)
+        raise pickle.UnpicklingError(f"persistent id lạ: {pid[0]}")
+
+
+def write_artifact(snapshot, path, sources=None):
+    """
+    Ghi snapshot ra artifact (ghi file tạm rồi rename để không bao giờ có file dở dang).
+    Trả về header.
+    """
+    buf = io.BytesIO()
+    _ArtifactPickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(snapshot)
+    payload = buf.getvalue()
+    store = snapshot.text_store
+    text = bytes(store._buf[store._base:]) if store is not None else b""
+
+    digest = hashlib.sha256(payload)
+    digest.update(text)
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "code": index_code_checksum(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "products": len(snapshot.products),
+        "combos": len(snapshot.combos),
+        "indexes": sorted(snapshot.indexes),
+        "sources": sources or {},
+        "payload_len": len(payload),
+        "text_len": len(text),
+        "sha256": digest.hexdigest(),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+        f.write(text)
+    os.replace(tmp, path)
+    return header
+
+
+def read_artifact_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+            raise CatalogError(f"{path} không phải artifact catalog")
+        (n,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(n).decode("utf-8"))
+    if header.get("format") != ARTIFACT_FORMAT:
+        raise CatalogError(f"Artifact format {header.get('format')} != {ARTIFACT_FORMAT}, cần compile lại")
+    if header.get("code") != index_code_checksum():
+        raise CatalogError("Artifact build từ mã index cũ (records/index đã đổi), cần compile lại")
+    return header, len(ARTIFACT_MAGIC) + 4 + n
+
+
+def load_artifact(path, verify=True):
+    """
+    Nạp snapshot từ artifact. Ném CatalogError nếu sai magic/format/checksum.
+    """
+    header, start = read_artifact_header(path)
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    payload_end = start + header["payload_len"]
+    text_end = payload_end + header["text_len"]
+    if len(buf) != text_end:
+        raise CatalogError(f"Artifact {path} bị cắt cụt ({len(buf)} != {text_end} byte)")
+    if verify:
+        digest = hashlib.sha256(buf[start:text_end]).hexdigest()
+        if digest != header["sha256"]:
+            raise CatalogError(f"Artifact {path} sai checksum")
+    snap = _ArtifactUnpickler(io.BytesIO(buf[start:payload_end]), buf, payload_end).load()
+    snap.__dict__.update(source=f"artifact:{os.path.basename(path)}", artifact=header)
+    # artifact compile trước khi có index mới: build bù phần thiếu thay vì chạy thiếu index
+    for name, builder in _INDEX_BUILDERS:
+        if name not in snap.indexes:
+            print(f"[WARN] Artifact thiếu index {name}, build lúc nạp (nên compile lại)")
+            snap.indexes[name] = builder(snap)
+    return snap
+
+
+def load_catalog_data(base_dir, strict=False):
+    data = {}
+    for name, (filename, default, key) in CATALOG_FILES.items():
+        path = os.path.join(base_dir, filename)
+        if strict:
+            raw = strict_load_json(path)
+        else:
+            raw = safe_load_json(path, default=default)
+        data[name] = extract_list(raw, key) if key else raw
+    errors = validate_catalog(data)
+    if errors:
+        if strict:
+            raise CatalogError("; ".join(errors[:10]))
+        for err in errors[:10]:
+            print(f"[WARN] Catalog: {err}")
+    return data
+
+
+def _fingerprints(items, key):
+    res = {}
+    for it in items:
+        res[str(it.get(key, ""))] = hashlib.md5(
+            json.dumps(it.to_dict(), sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+    return res
+
+
+def diff_snapshots(old, new):
+    """
+    Đếm số bản ghi thêm / xoá / sửa giữa 2 snapshot (để log khi reload).
+    """
+    diff = {}
+    for attr, key in (("products", "code"), ("combos", "id")):
+        a = _fingerprints(getattr(old, attr), key) if old else {}
+        b = _fingerprints(getattr(new, attr), key)
+        diff[attr] = {
+            "added": len(b.keys() - a.keys()),
+            "removed": len(a.keys() - b.keys()),
+            "changed": sum(1 for k in a.keys() & b.keys() if a[k] != b[k]),
+        }
+    for attr in (
+        "faq_buy", "faq_payment", "faq_business", "health_tags_map", "synonyms", "canned_responses", "rules",
+    ):
+        diff[attr] = getattr(old, attr, None) != getattr(new, attr, None)
+    return diff
+
+
+def format_diff(diff):
+    parts = []
+    for attr in ("products", "combos"):
+        d = diff[attr]
+        parts.append(f"{attr} +{d['added']} -{d['removed']} ~{d['changed']}")
+    changed = [k for k, v in diff.items() if v is True]
+    if changed:
+        parts.append("đổi: " + ", ".join(changed))
+    return "; ".join(parts)
+
+
+# ============== QUẢN LÝ SNAPSHOT ==============
+class CatalogManager:
+    """
+    Giữ snapshot hiện tại, reload off-thread và swap nguyên tử.
+    - current(): snapshot đang pin cho request (nếu có), nếu không thì bản mới nhất.
+    - reload(): đọc + validate + build index, lỗi thì giữ bản cũ.
+    - start_watcher(): thread nền theo dõi mtime các file JSON.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, artifact_path=None, dev_mode=True):
+        """
+        artifact_path: artifact do compile_catalog.py build; có thì ưu tiên nạp.
+        dev_mode: cho phép đọc thẳng JSON khi thiếu / hỏng artifact.
+            Production (dev_mode=False) mà không có artifact hợp lệ thì báo lỗi,
+            không âm thầm chạy với catalog rỗng.
+        """
+        self.base_dir = base_dir
+        self.artifact_path = artifact_path
+        self.dev_mode = dev_mode
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._local = threading.local()
+        self._watcher = None
+        self._failed_mtimes = None
+
+    def load(self):
+        mtimes = file_mtimes(self.base_dir)
+        t0 = time.perf_counter()
+        snap = self._load_artifact()
+        if snap is None:
+            snap = CatalogSnapshot(load_catalog_data(self.base_dir), version=1, mtimes=mtimes)
+        else:
+            snap.__dict__["mtimes"] = mtimes
+        self._snapshot = snap
+        print(
+            f"[INFO] Catalog v{snap.version} ({snap.source}): {len(snap.products)} sản phẩm, "
+            f"{len(snap.combos)} combo, {(time.perf_counter() - t0) * 1000:.1f}ms"
+        )
+        return snap
+
+    def _load_artifact(self):
+        path = self.artifact_path
+        if not path or not os.path.exists(path):
+            if self.dev_mode:
+                return None
+            raise CatalogError(f"Không có artifact catalog {path}, chạy: python compile_catalog.py")
+        try:
+            snap = load_artifact(path)
+        except Exception as e:
+            if not self.dev_mode:
+                raise CatalogError(f"Artifact catalog lỗi: {e}")
+            print(f"[WARN] Artifact catalog lỗi, dùng JSON (dev): {e}")
+            return None
+        if snap.artifact.get("sources") != source_checksums(self.base_dir):
+            if self.dev_mode:
+                print("[WARN] JSON đã đổi sau khi compile artifact, dùng JSON (dev)")
+                return None
+            print("[WARN] JSON khác với lúc compile artifact, vẫn dùng artifact")
+        return snap
+
+    def current(self):
+        pinned = getattr(self._local, "snapshot", None)
+        if pinned is not None:
+            return pinned
+        if self._snapshot is None:
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self.load()
+        return self._snapshot
+
+    def latest(self):
+        """
+        Snapshot mới nhất hoặc None nếu chưa nạp (không chờ, không tự nạp).
+        """
+        return self._snapshot
+
+    @contextmanager
+    def pinned(self, snapshot=None):
+        """
+        Pin snapshot cho toàn bộ request hiện tại (cùng thread),
+        để reload giữa chừng không làm lẫn dữ liệu cũ/mới.
+        snapshot: pin 1 snapshot cụ thể (bench / script), mặc định bản hiện tại.
+        """
+        prev = getattr(self._local, "snapshot", None)
+        self._local.snapshot = snapshot or prev or self.current()
+        try:
+            yield self._local.snapshot
+        finally:
+            self._local.snapshot = prev
+
+    def reload(self, reason="manual"):
+        """
+        Trả về (ok, message). Chỉ 1 lần reload chạy tại 1 thời điểm.
+        """
+        with self._reload_lock:
+            old = self._snapshot
+            t0 = time.perf_counter()
+            try:
+                mtimes = file_mtimes(self.base_dir)
+                data = load_catalog_data(self.base_dir, strict=True)
+                new = CatalogSnapshot(data, version=(old.version + 1 if old else 1), mtimes=mtimes)
+            except Exception as e:
+                self._failed_mtimes = file_mtimes(self.base_dir)
+                msg = f"Reload catalog ({reason}) lỗi, giữ bản v{old.version if old else 0}: {e}"
+                print(f"[ERROR] {msg}")
+                return False, msg
+
+            self._snapshot = new
+            elapsed = (time.perf_counter() - t0) * 1000
+            msg = f"Reload catalog ({reason}) v{new.version}: {elapsed:.1f}ms; {format_diff(diff_snapshots(old, new))}"
+            print(f"[INFO] {msg}")
+            return True, msg
+
+    def reload_async(self, reason="manual", callback=None):
+        def run():
+            ok, msg = self.reload(reason)
+            if callback:
+                try:
+                    callback(ok, msg)
+                except Exception as e:
+                    print("[WARN] reload callback lỗi:", e)
+
+        t = threading.Thread(target=run, name="catalog-reload", daemon=True)
+        t.start()
+        return t
+
+    def changed_files(self):
+        snap = self._snapshot
+        if snap is None:
+            return []
+        now = file_mtimes(self.base_dir)
+        if now == self._failed_mtimes:
+            # file vẫn là bản lỗi lần trước, không reload lại liên tục
+            return []
+        return [name for name, m in now.items() if m != snap.mtimes.get(name)]
+
+    def start_watcher(self, interval):
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    changed = self.changed_files()
+                    if changed:
+                        self.reload("mtime: " + ",".join(changed))
+                except Exception as e:
+                    print("[WARN] catalog watcher lỗi:", e)
+
+        self._watcher = threading.Thread(target=loop, name="catalog-watcher", daemon=True)
+        self._watcher.start()
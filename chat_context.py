@@ -0,0 +1,214 @@
+"""
+Ngữ cảnh hội thoại theo từng chat, đưa vào lượt phân loại intent để hiểu câu hỏi nối tiếp
+("cái đó giá bao nhiêu", "còn combo nào rẻ hơn không").
+
+- Giữ MAX_RECENT_TURNS lượt gần nhất dạng thô (câu TVV đã cắt ngắn + intent + mã đã trả lời),
+  lượt cũ hơn gộp vào tóm tắt có cấu trúc: đếm intent, vấn đề sức khoẻ, mã sản phẩm / combo
+  đã nhắc (mỗi loại giữ tối đa SUMMARY_ITEMS giá trị mới nhất) -> dung lượng không tăng theo
+  độ dài cuộc trò chuyện.
+- render() cắt theo ngân sách token cứng: ưu tiên sản phẩm/combo vừa trả lời, rồi lượt gần
+  nhất, rồi tóm tắt. Đếm token bằng tiktoken nếu có, không thì ước lượng theo số ký tự.
+- Lưu trong RAM của process (như LAST_USER_TEXT), tối đa MAX_CHATS chat, chat im lặng
+  quá IDLE_TTL giây thì bỏ.
+"""
+import time
+import threading
+from collections import Counter, OrderedDict, deque
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # chưa cài tiktoken / không tải được bảng mã
+    _ENCODING = None
+
+MAX_RECENT_TURNS = 4
+SUMMARY_ITEMS = 5
+MAX_TURN_CHARS = 160
+MAX_CHATS = 5000
+IDLE_TTL = 6 * 3600
+# tiếng Việt có dấu: ~3 ký tự / token với bảng mã của gpt-4o
+CHARS_PER_TOKEN = 3
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _remember(items, value, limit=SUMMARY_ITEMS):
+    """
+    Đưa value lên cuối danh sách (mới nhất), giữ tối đa limit phần tử.
+    """
+    if not value:
+        return
+    if value in items:
+        items.remove(value)
+    items.append(value)
+    del items[:-limit]
+
+
+class ChatContext:
+    __slots__ = (
+        "recent", "pending", "last_product", "last_combo", "turns_folded",
+        "intents", "health_issues", "products", "combos", "updated_at",
+    )
+
+    def __init__(self):
+        self.recent = deque()
+        self.pending = []        # (kind, id) trả lời trong lượt đang xử lý
+        self.last_product = None  # (code, tên)
+        self.last_combo = None    # (id, tên)
+        self.turns_folded = 0
+        self.intents = Counter()
+        self.health_issues = []
+        self.products = []
+        self.combos = []
+        self.updated_at = time.time()
+
+    def fold(self, turn):
+        text, intent, health_issue, refs = turn
+        self.turns_folded += 1
+        for name in intent.split("+"):
+            self.intents[name] += 1
+        for issue in health_issue.split("; "):
+            _remember(self.health_issues, issue)
+        for kind, ref in refs:
+            _remember(self.products if kind == "product" else self.combos, ref)
+
+
+class ContextStore:
+    def __init__(self, max_chats=MAX_CHATS, idle_ttl=IDLE_TTL):
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, chat_key, create=True):
+        ctx = self._chats.get(chat_key)
+        if ctx is not None and time.time() - ctx.updated_at > self.idle_ttl:
+            del self._chats[chat_key]
+            ctx = None
+        if ctx is None and create:
+            ctx = self._chats[chat_key] = ChatContext()
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        if ctx is not None:
+            self._chats.move_to_end(chat_key)
+        return ctx
+
+    def __len__(self):
+        return len(self._chats)
+
+    def note_product(self, chat_key, code, name=""):
+        with self._lock:
+            ctx = self._get(chat_key)
+            ctx.last_product = (str(code), name)
+            ctx.pending.append(("product", str(code)))
+
+    def note_combo(self, chat_key, combo_id, name=""):
+        with self._lock:
+            ctx = self._get(chat_key)
+            ctx.last_combo = (str(combo_id), name)
+            ctx.pending.append(("combo", str(combo_id)))
+
+    def add_turn(self, chat_key, text, intent, health_issue=""):
+        """
+        Ghi 1 lượt đã trả lời xong, kèm các mã note_* trong lượt.
+        """
+        with self._lock:
+            ctx = self._get(chat_key)
+            refs, ctx.pending = tuple(dict.fromkeys(ctx.pending)), []
+            ctx.recent.append((" ".join((text or "").split())[:MAX_TURN_CHARS], intent or "", health_issue or "", refs))
+            while len(ctx.recent) > MAX_RECENT_TURNS:
+                ctx.fold(ctx.recent.popleft())
+            ctx.updated_at = time.time()
+
+    def last_product(self, chat_key):
+        with self._lock:
+            ctx = self._get(chat_key, create=False)
+            return ctx.last_product if ctx else None
+
+    def last_combo(self, chat_key):
+        with self._lock:
+            ctx = self._get(chat_key, create=False)
+            return ctx.last_combo if ctx else None
+
+    def last_health_issue(self, chat_key):
+        with self._lock:
+            ctx = self._get(chat_key, create=False)
+            if ctx is None:
+                return None
+            for _, _, health_issue, _ in reversed(ctx.recent):
+                if health_issue:
+                    return health_issue.split("; ")[0]
+            return ctx.health_issues[-1] if ctx.health_issues else None
+
+    def clear(self, chat_key):
+        with self._lock:
+            self._chats.pop(chat_key, None)
+
+    def render(self, chat_key, budget):
+        """
+        Khối ngữ cảnh gọn (<= budget token) hoặc "" nếu chat chưa có gì.
+        """
+        with self._lock:
+            ctx = self._get(chat_key, create=False)
+            if ctx is None or not ctx.recent:
+                return ""
+            head = []
+            if ctx.last_product:
+                head.append("sp_vua_tra_loi: " + " ".join(filter(None, ctx.last_product)))
+            if ctx.last_combo:
+                head.append("combo_vua_tra_loi: " + " ".join(filter(None, ctx.last_combo)))
+            turns = []
+            for text, intent, _, refs in reversed(ctx.recent):
+                line = f"- TVV: {text} -> {intent}"
+                if refs:
+                    line += " [" + ", ".join(ref for _, ref in refs) + "]"
+                turns.append(line)
+            summary = []
+            if ctx.turns_folded:
+                summary.append(f"{ctx.turns_folded} lượt trước")
+                summary.append("intent " + ", ".join(f"{k}×{v}" for k, v in ctx.intents.most_common(3)))
+                if ctx.health_issues:
+                    summary.append("vấn đề: " + ", ".join(reversed(ctx.health_issues)))
+                if ctx.products:
+                    summary.append("sp: " + ", ".join(reversed(ctx.products)))
+                if ctx.combos:
+                    summary.append("combo: " + ", ".join(reversed(ctx.combos)))
+
+        used = count_tokens("[NGỮ CẢNH]\nluot_gan:\n")
+        kept_head, kept_turns = [], []
+        for line in head:
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept_head.append(line)
+            used += cost
+        for line in turns:
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept_turns.append(line)
+            used += cost
+        summary_line = ""
+        if summary:
+            # bỏ dần mục cuối tới khi vừa ngân sách
+            while summary:
+                summary_line = "tom_tat: " + "; ".join(summary)
+                if used + count_tokens(summary_line) + 1 <= budget:
+                    break
+                summary.pop()
+                summary_line = ""
+        if not (kept_head or kept_turns or summary_line):
+            return ""
+        lines = ["[NGỮ CẢNH]", *kept_head]
+        if summary_line:
+            lines.append(summary_line)
+        if kept_turns:
+            lines.append("luot_gan:")
+            lines.extend(reversed(kept_turns))
+        return "\n".join(lines)
@@ -0,0 +1,89 @@
+"""
+Compile catalog JSON -> artifact nhị phân (catalog.bin) cho production.
+
+- Đọc JSON ở chế độ strict: file hỏng / sai cấu trúc -> dừng, exit code 1.
+- Kiểm tra tham chiếu (mã trùng, combo trỏ mã không tồn tại...) và price_text không đọc
+  được giá -> in cảnh báo, --strict thì coi cảnh báo là lỗi.
+- --allow: cảnh báo đã biết, đang chờ chủ catalog xác nhận (vd mã thật của 1 sản phẩm) vẫn in
+  ra nhưng không làm --strict thất bại. Chỉ khớp đúng cảnh báo đó, cảnh báo mới vẫn chặn build.
+- Build CatalogSnapshot đủ index rồi ghi artifact có version format + sha256.
+
+    python compile_catalog.py                # ghi catalog.bin cạnh app.py
+    python compile_catalog.py --check        # chỉ kiểm tra, không ghi
+    python compile_catalog.py --out /tmp/catalog.bin --strict
+    python compile_catalog.py --strict --allow "Mã sản phẩm trùng 070717"
+"""
+import os
+import sys
+import time
+import argparse
+
+from catalog import (
+    BASE_DIR,
+    CatalogError,
+    CatalogSnapshot,
+    check_references,
+    file_mtimes,
+    load_artifact,
+    load_catalog_data,
+    source_checksums,
+    write_artifact,
+)
+import indexes  # noqa: F401  (đăng ký đủ index như app)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile catalog JSON thành artifact nhị phân")
+    parser.add_argument("--src", default=BASE_DIR, help="thư mục chứa các file JSON")
+    parser.add_argument("--out", default=os.getenv("CATALOG_ARTIFACT", os.path.join(BASE_DIR, "catalog.bin")))
+    parser.add_argument("--check", action="store_true", help="chỉ kiểm tra dữ liệu, không ghi artifact")
+    parser.add_argument("--strict", action="store_true", help="cảnh báo tham chiếu cũng làm compile thất bại")
+    parser.add_argument(
+        "--allow", action="append", default=[], metavar="TEXT",
+        help="cảnh báo chứa TEXT không làm --strict thất bại (lặp lại được)",
+    )
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        data = load_catalog_data(args.src, strict=True)
+    except CatalogError as e:
+        print(f"[ERROR] Catalog không hợp lệ: {e}")
+        return 1
+
+    warnings = check_references(data)
+    snap = CatalogSnapshot(data, version=1, mtimes=file_mtimes(args.src))
+    for kind, key, name, price_text in snap.index("prices").unparsed:
+        warnings.append(f"Giá không đọc được ({kind} {key}, {name!r}): price_text={price_text!r}")
+    blocking = 0
+    for w in warnings:
+        if any(a in w for a in args.allow):
+            print(f"[WARN] (--allow, chờ xác nhận) {w}")
+        else:
+            blocking += 1
+            print(f"[WARN] {w}")
+    if blocking and args.strict:
+        print(f"[ERROR] {blocking} cảnh báo dữ liệu (--strict)")
+        return 1
+
+    t_build = time.perf_counter() - t0
+    if args.check:
+        print(f"[INFO] OK: {len(snap.products)} sản phẩm, {len(snap.combos)} combo, {len(warnings)} cảnh báo")
+        return 0
+
+    header = write_artifact(snap, args.out, sources=source_checksums(args.src))
+    # đọc lại để chắc artifact dùng được trước khi deploy
+    t1 = time.perf_counter()
+    load_artifact(args.out)
+    t_load = time.perf_counter() - t1
+    size = os.path.getsize(args.out)
+    print(
+        f"[INFO] {args.out}: {header['products']} sản phẩm, {header['combos']} combo, "
+        f"{size / 1024:.1f} KB, sha256 {header['sha256'][:12]}; build {t_build * 1000:.0f}ms, "
+        f"nạp lại {t_load * 1000:.1f}ms; {len(warnings)} cảnh báo"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
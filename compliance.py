@@ -0,0 +1,323 @@
+"""
+Chuyển thẳng tuyến trên theo rules.json (force_upline_for): khiếu nại, bồi hoàn, tố cáo...
+
+- Cụm từ trong force_upline_for được compile cùng snapshot catalog (index "force_upline")
+  thành regex khớp cụm từ trọn vẹn, ĐÚNG DẤU (chỉ bỏ qua hoa/thường): bỏ dấu thì "tố cáo"
+  trùng "to cao" (cao lớn). TVV gõ không dấu: đoạn khớp không có dấu nào thì so theo dạng
+  bỏ dấu, trừ cụm trong force_upline_accent_required (dạng không dấu là cụm thường gặp).
+- Chạy trên mọi tin TVV TRƯỚC khi phân loại: khớp là chuyển tuyến trên luôn,
+  không gọi OpenAI. Mỗi cờ là chính cụm từ trong rules.json để log biết rule nào bắt.
+
+Chặn khẳng định y khoa trong câu trả lời model viết lại (rules.json claim_guard, index
+"claim_guard"):
+- Mọi cụm cấm + cụm được phép (lời nhắc của chính bot: "không thay thế thuốc") compile
+  thành 1 regex dạng cây tiền tố, khớp ĐÚNG DẤU (mỗi chữ chỉ là class hoa/thường): model
+  luôn viết có dấu, còn bỏ dấu thì "thầy thuốc" trùng "thay thuốc", "chưa khỏi" trùng
+  "chữa khỏi". Quét thẳng chuỗi gốc 1 lượt, vị trí khớp dùng luôn để redact. Cụm được
+  phép dài hơn và bắt đầu sớm hơn nên "nuốt" cụm cấm nằm bên trong.
+- Action theo cụm: redact (thay bằng redact_with), flag (gửi vẫn gửi, báo tuyến trên),
+  fallback (bỏ bản model, dùng reply_text_core). Cụm có sẵn trong nội dung gốc không tính
+  (model chỉ chép lại catalog).
+- ClaimStream: cùng logic cho từng chunk khi stream, giữ lại đuôi ngắn nhất đủ để cụm
+  nằm vắt qua 2 chunk vẫn bắt được.
+"""
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from catalog import register_index
+from text_norm import FOLD_TABLE, fold_case, normalize_text
+
+RULE_HITS = Counter()
+CLAIM_HITS = Counter()
+_hits_lock = threading.Lock()
+
+# thứ tự nặng -> nhẹ: 1 cụm fallback là bỏ cả bản model
+CLAIM_ACTIONS = ("fallback", "flag", "redact")
+_SEP_RE = re.compile(r"[^0-9a-z]+")
+_WORD_SPLIT_RE = re.compile(r"[\W_]+")
+
+
+def _exact_key(text):
+    """
+    Cụm giữ dấu: chữ thường NFC, các từ cách nhau 1 dấu cách.
+    """
+    return " ".join(w for w in _WORD_SPLIT_RE.split(fold_case(text)) if w)
+
+
+def _exact_char(ch):
+    if ch == " ":
+        return r"\W+"
+    if ch.upper() != ch:
+        return f"[{ch}{ch.upper()}]"
+    return re.escape(ch)
+
+
+class ForceUpline:
+    __slots__ = ("_exact", "_exact_phrases", "_folded", "_folded_phrases")
+
+    def __init__(self, phrases, accent_required=()):
+        required = {_exact_key(p) for p in accent_required}
+        self._exact_phrases = {}
+        self._folded_phrases = {}
+        for phrase in phrases:
+            key = _exact_key(phrase)
+            if not key:
+                continue
+            self._exact_phrases[key] = phrase
+            if key not in required:
+                self._folded_phrases[normalize_text(key)] = phrase
+        self._exact = self._folded = None
+        if self._exact_phrases:
+            self._exact = re.compile(rf"(?<!\w)(?:{_trie_pattern(self._exact_phrases)})(?!\w)")
+        if self._folded_phrases:
+            keys = sorted(self._folded_phrases, key=len, reverse=True)
+            alternation = "|".join(r"[^0-9a-z]+".join(map(re.escape, k.split())) for k in keys)
+            self._folded = re.compile(rf"(?<![0-9a-z])(?:{alternation})(?![0-9a-z])")
+
+    def match(self, text):
+        """
+        Tập cụm (như trong rules.json) có trong tin gốc.
+        """
+        if not text or self._exact is None:
+            return frozenset()
+        text = unicodedata.normalize("NFC", text)
+        hits = {self._exact_phrases[_exact_key(m.group())] for m in self._exact.finditer(text)}
+        if self._folded is not None:
+            folded = text.lower().translate(FOLD_TABLE)
+            if len(folded) == len(text):
+                for m in self._folded.finditer(folded):
+                    # chỉ nhận đoạn gõ không dấu; đoạn có dấu mà khác dấu là từ khác
+                    if text[m.start():m.end()].isascii():
+                        hits.add(self._folded_phrases[_SEP_RE.sub(" ", m.group())])
+        return frozenset(hits)
+
+
+@register_index("force_upline")
+def build_force_upline(snapshot):
+    # artifact compile trước khi có rules thì snapshot không có thuộc tính này
+    rules = getattr(snapshot, "rules", {}) or {}
+    phrases = [str(p) for p in rules.get("force_upline_for") or [] if str(p).strip()]
+    return ForceUpline(phrases, [str(p) for p in rules.get("force_upline_accent_required") or []])
+
+
+def match_force_upline(snapshot, text: str):
+    """
+    Các cụm force_upline_for có trong tin (nguyên văn, giữ dấu), theo thứ tự trong rules.json.
+    """
+    matcher = snapshot.index("force_upline")
+    if matcher is None:
+        return []
+    hits = matcher.match(text)
+    if not hits:
+        return []
+    order = (getattr(snapshot, "rules", {}) or {}).get("force_upline_for") or []
+    return [p for p in order if p in hits]
+
+
+def _trie_pattern(keys):
+    """
+    Regex dạng cây tiền tố cho các cụm (_exact_key, cách nhau 1 dấu cách): mỗi vị trí
+    chỉ thử 1 nhánh theo ký tự kế tiếp thay vì thử lần lượt từng cụm. Nhánh dài hơn được
+    thử trước, khớp hụt thì lùi về cụm ngắn hơn -> giống alternation xếp dài trước.
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        end = node.get("") is True
+        branches = [_exact_char(ch) + build(node[ch]) for ch in sorted(k for k in node if k)]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+def _stronger(current, action):
+    if current == "pass" or CLAIM_ACTIONS.index(action) < CLAIM_ACTIONS.index(current):
+        return action
+    return current
+
+
+class ClaimGuard:
+    # regex compile mất vài chục ms: không pickle vào catalog.bin, compile ở lần dùng đầu
+    # (warm_up gọi compile() trước khi fork) để nạp / reload snapshot vẫn nhanh
+    __slots__ = ("_pattern", "_regex", "_actions", "redact_with", "hold")
+
+    def __init__(self, config):
+        config = config or {}
+        actions = {}
+        for action in reversed(CLAIM_ACTIONS):
+            for phrase in (config.get("phrases") or {}).get(action) or []:
+                key = _exact_key(str(phrase))
+                if key:
+                    actions[key] = action
+        for phrase in config.get("allow") or []:
+            key = _exact_key(str(phrase))
+            if key:
+                actions[key] = None
+        self._actions = actions
+        self.redact_with = str(config.get("redact_with", "…"))
+        # đuôi phải giữ lại khi stream: đủ chứa cụm dài nhất (+ khoảng trắng thừa)
+        self.hold = max((len(k) for k in actions), default=0) + 8
+        self._regex = None
+        self._pattern = rf"(?<!\w)(?:{_trie_pattern(actions)})(?!\w)" if actions else None
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != "_regex"}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+        self._regex = None
+
+    def compile(self):
+        if self._regex is None and self._pattern is not None:
+            self._regex = re.compile(self._pattern)
+        return self._regex
+
+    def _scan(self, text, pos=0):
+        """
+        (start, end, cụm, action) từ pos; action None = cụm được phép.
+        """
+        for m in (self._regex or self.compile()).finditer(text, pos):
+            key = _exact_key(m.group())
+            yield m.start(), m.end(), key, self._actions.get(key)
+
+    def phrases_in(self, text):
+        """
+        Tập cụm cấm có trong text (dùng cho nội dung gốc: model chép lại thì không tính).
+        """
+        if not text or self._pattern is None:
+            return frozenset()
+        text = unicodedata.normalize("NFC", text)
+        return frozenset(key for _, _, key, action in self._scan(text) if action)
+
+    def _redact(self, text, edits, start=0, stop=None):
+        out = []
+        cursor = start
+        for s, e in edits:
+            out.append(text[cursor:s])
+            out.append(self.redact_with)
+            cursor = e
+        out.append(text[cursor:stop])
+        return "".join(out)
+
+    def stream(self, exempt=frozenset()):
+        return ClaimStream(self, exempt)
+
+    def check(self, text, core=""):
+        """
+        Kiểm tra cả câu trả lời 1 lần. Trả dict: action (pass/redact/flag/fallback),
+        hits [(cụm, action)], text (đã redact nếu có, fallback thì là core).
+        """
+        hits = []
+        action = "pass"
+        if not text or self._pattern is None:
+            return {"action": action, "hits": hits, "text": text}
+        exempt = self.phrases_in(core) if core else frozenset()
+        text = unicodedata.normalize("NFC", text)
+        edits = []
+        for start, end, key, kind in self._scan(text):
+            if not kind or key in exempt:
+                continue
+            hits.append((key, kind))
+            action = _stronger(action, kind)
+            if kind == "redact":
+                edits.append((start, end))
+        if action == "fallback":
+            return {"action": action, "hits": hits, "text": core}
+        if edits:
+            text = self._redact(text, edits)
+        return {"action": action, "hits": hits, "text": text}
+
+
+class ClaimStream:
+    """
+    feed(chunk) -> phần đã kiểm tra xong, được phép gửi; close() -> phần còn lại.
+    Gặp cụm fallback thì ngừng trả chữ (người gọi thay bằng reply_text_core).
+    """
+
+    def __init__(self, guard, exempt=frozenset()):
+        self.guard = guard
+        self.exempt = exempt
+        self.hits = []
+        self.action = "pass"
+        self._text = ""
+        self._emitted = 0
+        self._pos = 0
+
+    def _process(self, final):
+        guard = self.guard
+        text = self._text
+        safe_end = len(text) if final else max(self._pos, len(text) - guard.hold)
+        last_end = self._pos
+        edits = []
+        if guard._pattern is not None:
+            # cụm bắt đầu trước safe_end đã nằm trọn trong buffer (hold >= cụm dài nhất)
+            for start, end, key, action in guard._scan(text, self._pos):
+                if start >= safe_end:
+                    break
+                last_end = end
+                if not action or key in self.exempt:
+                    continue
+                self.hits.append((key, action))
+                self.action = _stronger(self.action, action)
+                if action == "redact":
+                    edits.append((start, end))
+        self._pos = max(safe_end, last_end)
+        if self.action == "fallback":
+            return ""
+        emit_to = len(text) if final else self._pos
+        out = guard._redact(text, edits, self._emitted, emit_to)
+        self._emitted = emit_to
+        return out
+
+    def feed(self, chunk):
+        if not chunk:
+            return ""
+        self._text += unicodedata.normalize("NFC", chunk)
+        return self._process(final=False)
+
+    def close(self):
+        return self._process(final=True)
+
+@register_index("claim_guard")
+def build_claim_guard(snapshot):
+    rules = getattr(snapshot, "rules", {}) or {}
+    return ClaimGuard(rules.get("claim_guard"))
+
+
+def record_claim_hits(hits):
+    with _hits_lock:
+        CLAIM_HITS.update(f"{action}: {key}" for key, action in hits)
+
+
+def record_rule_hits(phrases):
+    with _hits_lock:
+        RULE_HITS.update(phrases)
+
+
+def format_rule_stats():
+    with _hits_lock:
+        hits = RULE_HITS.most_common()
+    if not hits:
+        return "Rule chuyển tuyến trên: chưa có tin nào khớp."
+    return "Rule chuyển tuyến trên (rules.json):\n" + "\n".join(f"{p}: {n}" for p, n in hits)
+
+
+def format_claim_stats():
+    with _hits_lock:
+        hits = CLAIM_HITS.most_common()
+    if not hits:
+        return "Chặn khẳng định y khoa: chưa bắt cụm nào."
+    return "Chặn khẳng định y khoa (action: cụm): số lần\n" + "\n".join(f"{k}: {n}" for k, n in hits)
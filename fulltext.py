@@ -0,0 +1,159 @@
+"""
+BM25 full-text trên các trường mô tả dài của sản phẩm
+(benefits_text, ingredients_text, usage_text...).
+
+- Tokenize không dấu (kể cả đ -> d), mỗi âm tiết là 1 token + bigram 2 âm tiết liền nhau
+  ("giun san" -> giun, san, giun_san) để cụm từ khớp đúng thứ tự được điểm cao hơn.
+- Postings lưu dạng CSR: 1 array doc id uint32 + 1 array điểm BM25 tính sẵn float32 cho
+  mọi term, offsets đánh dấu đoạn của từng term. Lúc query chỉ còn cộng dồn, và vì chỉ có
+  vài object lớn nên các worker gunicorn fork ra không ghi refcount lên trang dùng chung.
+- Index build 1 lần cho mỗi snapshot catalog (xem catalog.register_index).
+"""
+import re
+import heapq
+from array import array
+from math import log
+
+from catalog import register_index
+from text_norm import normalize_text
+
+# Trường được index, kèm trọng số (lặp token theo trọng số)
+FULLTEXT_FIELDS = (
+    ("name", 2),
+    ("benefits_text", 1),
+    ("ingredients_text", 1),
+    ("usage_text", 1),
+    ("notes_for_tvv", 1),
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Term xuất hiện ở quá nhiều doc (vd "dau", "giup") bị bỏ qua nếu query còn term khác
+COMMON_TERM_RATIO = 0.3
+
+# Âm tiết gần như không mang nghĩa khi TVV hỏi ("sản phẩm nào cho ... không")
+QUERY_STOPWORDS = frozenset(
+    """
+    san pham nao cho khong co gi la va cua cac nhung mot bi de ve voi
+    em anh chi hoi tu van loai gi giup minh nhe a ak nha
+    """.split()
+)
+
+_NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+
+
+def fold_text(text: str) -> str:
+    """
+    Chữ thường, bỏ dấu tiếng Việt (gồm cả đ/Đ), ký tự không phải chữ/số -> khoảng trắng.
+    """
+    if not text:
+        return ""
+    return _NON_WORD_RE.sub(" ", normalize_text(text)).strip()
+
+
+def tokenize(text: str, stopwords=None):
+    """
+    Âm tiết + bigram âm tiết. Stopwords (nếu có) chỉ bỏ ở unigram,
+    bigram vẫn giữ để cụm "san pham" không mất hẳn khi cần.
+    """
+    syllables = fold_text(text).split()
+    tokens = [s for s in syllables if not stopwords or s not in stopwords]
+    tokens.extend(f"{a}_{b}" for a, b in zip(syllables, syllables[1:]))
+    return tokens
+
+
+class BM25Index:
+    __slots__ = ("vocab", "offsets", "doc_ids", "impacts", "dfs", "n_docs")
+
+    def __init__(self, docs):
+        """
+        docs: list token-list, vị trí trong list chính là doc id.
+        """
+        postings = {}
+        lengths = []
+        for doc_id, tokens in enumerate(docs):
+            lengths.append(len(tokens))
+            counts = {}
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, tf in counts.items():
+                postings.setdefault(tok, []).append((doc_id, tf))
+
+        n = len(docs)
+        avgdl = (sum(lengths) / n) if n else 0.0
+        # K = k1 * (1 - b + b * dl / avgdl) cho từng doc
+        norms = [BM25_K1 * (1 - BM25_B + BM25_B * (dl / avgdl if avgdl else 0)) for dl in lengths]
+
+        self.n_docs = n
+        self.vocab = {}
+        # postings của term t: doc_ids[offsets[t]:offsets[t + 1]]
+        self.offsets = array("I", [0])
+        self.doc_ids = array("I")
+        self.impacts = array("f")
+        self.dfs = array("I")
+        for term_id, (tok, plist) in enumerate(sorted(postings.items())):
+            df = len(plist)
+            idf = log(1.0 + (n - df + 0.5) / (df + 0.5))
+            self.vocab[tok] = term_id
+            self.dfs.append(df)
+            self.doc_ids.extend(d for d, _ in plist)
+            self.impacts.extend(idf * tf * (BM25_K1 + 1) / (tf + norms[d]) for d, tf in plist)
+            self.offsets.append(len(self.doc_ids))
+
+    def search(self, query_tokens, k=10):
+        """
+        Trả về list (doc_id, score) giảm dần theo score.
+        """
+        term_ids = []
+        for tok in query_tokens:
+            term_id = self.vocab.get(tok)
+            if term_id is not None and term_id not in term_ids:
+                term_ids.append(term_id)
+        if not term_ids:
+            return []
+
+        common = self.n_docs * COMMON_TERM_RATIO
+        rare = [t for t in term_ids if self.dfs[t] <= common]
+        if rare:
+            term_ids = rare
+
+        scores = {}
+        get = scores.get
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            for doc_id, w in zip(self.doc_ids[start:end], self.impacts[start:end]):
+                scores[doc_id] = get(doc_id, 0.0) + w
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+
+def product_document(product):
+    tokens = []
+    for field, weight in FULLTEXT_FIELDS:
+        value = product.get(field) or ""
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        field_tokens = tokenize(str(value))
+        for _ in range(weight):
+            tokens.extend(field_tokens)
+    return tokens
+
+
+@register_index("product_fulltext")
+def build_product_fulltext(snapshot):
+    return BM25Index([product_document(p) for p in snapshot.products])
+
+
+def search_products_fulltext(snapshot, query: str, k=5, min_ratio=0.0):
+    """
+    Tìm sản phẩm theo nội dung mô tả. Trả về list (product, score).
+    min_ratio: bỏ các kết quả có score < min_ratio * score cao nhất.
+    """
+    index = snapshot.index("product_fulltext")
+    if index is None or not query:
+        return []
+    hits = index.search(tokenize(query, QUERY_STOPWORDS), k=k)
+    if not hits:
+        return []
+    cutoff = hits[0][1] * min_ratio
+    return [(snapshot.products[doc_id], score) for doc_id, score in hits if score >= cutoff]
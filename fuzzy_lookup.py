@@ -0,0 +1,161 @@
+"""
+Tra cứu tên / mã sản phẩm chịu lỗi gõ ("antigem 01", mã sai 1 chữ số).
+
+- Khoá: code, short_name, name, aliases dạng không dấu, bỏ khoảng trắng/dấu câu
+  ("ANTIGELM-01" -> "antigelm01").
+- Lọc ứng viên bằng trigram chung (inverted index trigram -> key id), chỉ giữ
+  MAX_CANDIDATES khoá có nhiều trigram chung nhất.
+- Xác minh bằng Damerau-Levenshtein (optimal string alignment) có ngưỡng, dừng sớm
+  khi cả hàng DP vượt ngưỡng.
+Chi phí 1 lần tra bị chặn bởi độ dài posting list + MAX_CANDIDATES, không quét cả catalog.
+"""
+import heapq
+from array import array
+
+from catalog import register_index
+from fulltext import fold_text
+
+FUZZY_FIELDS = ("code", "short_name", "name", "aliases")
+
+MAX_CANDIDATES = 40
+# Trigram có posting dài hơn ngưỡng này (vd "070" ở mọi mã) chỉ dùng khi query không còn trigram nào khác
+MAX_POSTING = 2000
+
+
+def compact_key(text: str) -> str:
+    return fold_text(text).replace(" ", "")
+
+
+def key_trigrams(key: str):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance_for(key: str) -> int:
+    """
+    Ngưỡng sai số theo độ dài: <=4 ký tự: 0, <=8: 1, dài hơn: 2.
+    """
+    n = len(key)
+    if n <= 4:
+        return 0
+    if n <= 8:
+        return 1
+    return 2
+
+
+def damerau_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """
+    Khoảng cách OSA (chèn, xoá, thay, đảo 2 ký tự kề nhau).
+    Trả về max_dist + 1 nếu chắc chắn vượt ngưỡng.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if a == b:
+        return 0
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        ca = a[i - 1]
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_dist:
+            return max_dist + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    __slots__ = ("keys", "key_items", "gram_ids", "offsets", "postings", "items")
+
+    def __init__(self, items, fields=FUZZY_FIELDS):
+        self.items = tuple(items)
+        key_ids = {}
+        key_items = []
+        postings = {}
+        for item_id, item in enumerate(self.items):
+            for field in fields:
+                values = item.get(field) or []
+                if not isinstance(values, (list, tuple)):
+                    values = [values]
+                for v in values:
+                    key = compact_key(str(v))
+                    if not key:
+                        continue
+                    kid = key_ids.get(key)
+                    if kid is None:
+                        kid = key_ids[key] = len(key_items)
+                        key_items.append([])
+                        for g in key_trigrams(key):
+                            postings.setdefault(g, array("I")).append(kid)
+                    if item_id not in key_items[kid]:
+                        key_items[kid].append(item_id)
+        self.keys = tuple(sorted(key_ids, key=key_ids.get))
+        self.key_items = tuple(tuple(x) for x in key_items)
+        # CSR: key id của trigram g nằm ở postings[offsets[gid]:offsets[gid + 1]]
+        self.gram_ids = {}
+        self.offsets = array("I", [0])
+        self.postings = array("I")
+        for gid, (g, kids) in enumerate(postings.items()):
+            self.gram_ids[g] = gid
+            self.postings.extend(kids)
+            self.offsets.append(len(self.postings))
+
+    def candidates(self, key: str):
+        spans = []
+        for g in key_trigrams(key):
+            gid = self.gram_ids.get(g)
+            if gid is not None:
+                spans.append((self.offsets[gid], self.offsets[gid + 1]))
+        short = [(a, b) for a, b in spans if b - a <= MAX_POSTING]
+        counts = {}
+        get = counts.get
+        for start, end in short or spans:
+            for kid in self.postings[start:end]:
+                counts[kid] = get(kid, 0) + 1
+        return heapq.nlargest(MAX_CANDIDATES, counts, key=counts.get)
+
+    def lookup(self, query: str, k=3, max_dist=None):
+        """
+        Trả về list (item, distance, matched_key) tăng dần theo distance,
+        mỗi item xuất hiện 1 lần.
+        """
+        key = compact_key(query)
+        if not key:
+            return []
+        if max_dist is None:
+            max_dist = max_distance_for(key)
+        scored = []
+        for kid in self.candidates(key):
+            d = damerau_levenshtein(key, self.keys[kid], max_dist)
+            if d <= max_dist:
+                scored.append((d, kid))
+        scored.sort()
+        res = []
+        seen = set()
+        for d, kid in scored:
+            for item_id in self.key_items[kid]:
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                res.append((self.items[item_id], d, self.keys[kid]))
+        return res[:k]
+
+
+@register_index("product_fuzzy")
+def build_product_fuzzy(snapshot):
+    return FuzzyIndex(snapshot.products)
+
+
+def find_similar_products(snapshot, query: str, k=3, max_dist=None):
+    index = snapshot.index("product_fuzzy")
+    if index is None or not query:
+        return []
+    return index.lookup(query, k=k, max_dist=max_dist)
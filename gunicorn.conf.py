@@ -0,0 +1,74 @@
+"""
+Chạy production:  gunicorn app:app  (file này được gunicorn tự đọc)
+
+Mặc định 1 worker, tăng tải bằng thread (GUNICORN_THREADS). State theo chat vẫn nằm trong RAM
+của process (PENDING_UPLINE_STATE / PENDING_UPLINE_TEXT, LAST_USER_TEXT, CHAT_CONTEXT): nhiều
+worker thì tin kế tiếp của 1 chat có thể rơi vào worker khác -> mất bước xác nhận "ok gửi" với
+tuyến trên, mất ngữ cảnh hỏi tiếp; /reload, /profile cũng chỉ tới 1 worker.
+Chỉ đặt WEB_CONCURRENCY > 1 khi các state đó đã chuyển sang store dùng chung.
+Cần thêm CPU mà vẫn giữ state: chạy nhiều node sau ingress (BOT_ROLE=ingress bên dưới), mỗi node
+BOT_ROLE=node -> luôn 1 worker, bỏ qua WEB_CONCURRENCY (ingress ghim chat theo node, không theo worker).
+
+- preload_app: master import app, nạp catalog (artifact) + build index + OpenAI client
+  1 lần trước khi fork -> worker (kể cả worker respawn sau timeout / crash) nhận sẵn catalog,
+  nhiều worker thì dùng chung trang nhớ copy-on-write thay vì mỗi worker build bản riêng.
+- gc.freeze(): chuyển mọi object đã có sang "permanent generation" ngay trước khi fork,
+  GC ở worker không duyệt (và không ghi header) các object đó nên trang không bị copy.
+  gc tắt từ lúc nạp tới lúc fork để không có đợt collect nào làm bẩn trang trước đó.
+- Thread (watcher catalog, broadcast) không sống qua fork: mỗi worker tự bật ở post_fork.
+  Lưu ý: /reload chỉ tới 1 worker; các worker khác nhận file mới qua watcher
+  (CATALOG_WATCH_INTERVAL, mặc định 30s khi chạy gunicorn).
+
+Đo bộ nhớ từng worker: python bench/bench_workers.py
+
+BOT_ROLE=ingress gunicorn ingress:app -> ingress chia tải theo chat_id (ingress.py):
+1 process nhiều thread (vòng băm + khoá theo chat nằm trong RAM), không preload bot.
+"""
+import gc
+import os
+
+BOT_ROLE = os.getenv("BOT_ROLE", "")
+INGRESS = BOT_ROLE == "ingress"
+# node sau ingress: state theo chat phải nằm trong đúng 1 process
+SINGLE_WORKER = INGRESS or BOT_ROLE == "node"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = 1 if SINGLE_WORKER else int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "64" if INGRESS else "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "90" if INGRESS else "60"))
+preload_app = not INGRESS and os.getenv("GUNICORN_PRELOAD", "1") == "1"
+accesslog = None
+
+if preload_app:
+    os.environ.setdefault("EAGER_WARMUP", "preload")
+    os.environ.setdefault("CATALOG_WATCH_INTERVAL", "30")
+    gc.disable()
+
+
+def when_ready(server):
+    # Arbiter gọi sau khi đã preload app, trước khi spawn worker đầu tiên
+    if BOT_ROLE == "node" and int(os.getenv("WEB_CONCURRENCY", "1") or 1) > 1:
+        server.log.warning("BOT_ROLE=node: bỏ qua WEB_CONCURRENCY=%s, chạy 1 worker", os.getenv("WEB_CONCURRENCY"))
+    if workers > 1:
+        server.log.warning(
+            "%d worker: state theo chat (xác nhận tuyến trên, ngữ cảnh) nằm riêng từng worker", workers
+        )
+    if preload_app and os.getenv("GC_FREEZE", "1") == "1":
+        gc.freeze()
+        server.log.info("gc.freeze(): %d object", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    gc.enable()
+    if preload_app:
+        import app as bot
+
+        bot.start_background_jobs()
+
+
+def worker_exit(server, worker):
+    # dừng êm (deploy, max_requests, HUP): trả lease broadcast để worker mới nhận ngay
+    if not INGRESS:
+        import app as bot
+
+        bot.stop_background_jobs()
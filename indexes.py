@@ -0,0 +1,79 @@
+"""
+Đăng ký toàn bộ index của catalog. Import module này là đủ để CatalogSnapshot
+build đúng bộ index mà app dùng (app.py và compile_catalog.py đều import).
+"""
+import re
+
+from catalog import register_index
+from text_norm import normalize_many
+
+# Các module tự đăng ký index khi import
+import fulltext  # noqa: F401  (product_fulltext)
+import ngram_search  # noqa: F401  (product_ngram, combo_ngram)
+import fuzzy_lookup  # noqa: F401  (product_fuzzy)
+import inline_search  # noqa: F401  (product_prefix)
+import canned  # noqa: F401  (canned)
+import compliance  # noqa: F401  (force_upline, claim_guard)
+import pricing  # noqa: F401  (prices)
+import speculation  # noqa: F401  (health_phrases)
+
+
+@register_index("synonyms")
+def build_synonym_patterns(snapshot):
+    """
+    Compile sẵn regex cho từng cặp synonyms (giữ đúng thứ tự trong file).
+    """
+    patterns = []
+    for k, v in snapshot.synonyms.items():
+        if not k or not v:
+            continue
+        try:
+            patterns.append((re.compile(re.escape(k), flags=re.IGNORECASE), v))
+        except re.error:
+            continue
+    return tuple(patterns)
+
+
+def _norm_rows(rows):
+    """
+    Mỗi row là list giá trị của 1 bản ghi -> tuple các chuỗi đã chuẩn hoá (bỏ rỗng).
+    Cả cột được chuẩn hoá 1 lượt bằng normalize_many.
+    """
+    rows = [[str(v) for v in row if v] for row in rows]
+    flat = iter(normalize_many([v for row in rows for v in row]))
+    return tuple(tuple(n for n in (next(flat) for _ in row) if n) for row in rows)
+
+
+@register_index("search_fields")
+def build_search_fields(snapshot):
+    """
+    normalize_text sẵn các trường mà vòng lặp tìm kiếm so khớp chuỗi con,
+    xếp cùng thứ tự với snapshot.products / snapshot.combos.
+    """
+    tags_items = list(snapshot.health_tags_map.items())
+    tags_map = []
+    for key_norm, (_, tags) in zip(_norm_rows([key] for key, _ in tags_items), tags_items):
+        if not key_norm:
+            continue
+        key_norm = key_norm[0]
+        if not isinstance(tags, list):
+            tags = [tags]
+        tags_map.append((key_norm, tuple(t for t in tags if t)))
+
+    faq_items = [
+        item for item in snapshot.faq_business if isinstance(item, dict) and item.get("q_keywords")
+    ]
+    faq_business = [
+        (keywords, item.get("answer"))
+        for keywords, item in zip(_norm_rows(item["q_keywords"] for item in faq_items), faq_items)
+    ]
+
+    return {
+        "combo_health": _norm_rows([c.name, *c.aliases, *c.health_tags] for c in snapshot.combos),
+        "product_health": _norm_rows(
+            [p.name, *p.aliases, *p.health_tags, p.main_health_tag] for p in snapshot.products
+        ),
+        "product_name": _norm_rows([p.code, p.name, *p.aliases] for p in snapshot.products),
+        "health_tags_map": tuple(tags_map),
+        "faq_business": tuple(faq_business),
+    }
@@ -0,0 +1,342 @@
+"""
+Ingress chia tải nhiều node bot theo chat_id (consistent hashing).
+
+Telegram chỉ gọi 1 webhook -> ingress nhận rồi chuyển nguyên update sang /webhook của 1 node,
+node chọn theo hash(chat_id) trên vòng băm. Mỗi chat luôn về cùng 1 node nên state trong RAM
+(PENDING_UPLINE_STATE, ngữ cảnh hội thoại...) và thứ tự tin trong chat vẫn giữ như chạy 1 node.
+
+- Vòng băm có SHARD_VNODES node ảo / node: thêm / bớt 1 node trong N chỉ chuyển ~1/N số chat.
+- Tin cùng 1 chat được chuyển tuần tự (khoá theo chat); chat đang có tin chưa xử lý xong
+  được "ghim" vào node hiện tại -> đổi vòng băm giữa chừng thì chat đó xử lý nốt ở node cũ
+  (drain), tin đầu tiên sau khi rảnh mới sang node mới.
+- Bỏ node: gỡ khỏi vòng băm ngay (không nhận chat mới), chờ các chat đang ghim vào node đó
+  xong (tối đa SHARD_DRAIN_TIMEOUT giây) rồi mới báo đã gỡ.
+- Node không kết nối được: thử node kế tiếp trên vòng băm, chat được ghim sang node đó.
+  Mọi node lỗi -> 502 để Telegram tự gửi lại update. Node nhận rồi mà trả lời quá hạn thì
+  không gửi lại (tránh trả lời 2 lần).
+
+Chạy (1 process, nhiều thread: vòng băm + khoá theo chat nằm trong RAM của ingress):
+
+    SHARD_NODES=http://node-a:8000,http://node-b:8000 BOT_ROLE=ingress gunicorn ingress:app
+
+Thêm / bỏ node (cần INGRESS_ADMIN_TOKEN):
+
+    curl -X POST -H "X-Admin-Token: ..." -d '{"add": "http://node-c:8000"}' <ingress>/shard/nodes
+    curl -X POST -H "X-Admin-Token: ..." -d '{"remove": "http://node-a:8000"}' <ingress>/shard/nodes
+
+Các node là app.py bình thường, chạy BOT_ROLE=node gunicorn app:app: gunicorn.conf.py ép
+1 worker / node (bỏ qua WEB_CONCURRENCY). Ingress chỉ ghim chat vào node, nhiều worker trong
+1 node thì tin của cùng chat rơi vào worker khác nhau -> mất state trong RAM và thứ tự tin.
+Cần thêm CPU thì thêm node, không thêm worker. Lưu ý: known_chats / lịch nhắc nằm trong
+SQLite của từng node, /broadcast từ tuyến trên chỉ tới các chat node nhận lệnh đã biết.
+"""
+import os
+import hmac
+import time
+import hashlib
+import threading
+from bisect import bisect_right
+
+import requests
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+
+load_dotenv()
+
+SHARD_NODES = [n.strip().rstrip("/") for n in os.getenv("SHARD_NODES", "").split(",") if n.strip()]
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "160") or 160)
+SHARD_FORWARD_TIMEOUT = float(os.getenv("SHARD_FORWARD_TIMEOUT", "60") or 60)
+SHARD_DRAIN_TIMEOUT = float(os.getenv("SHARD_DRAIN_TIMEOUT", "30") or 30)
+# Kết nối keep-alive node vừa đóng (reset ngay khi gửi) -> thử lại cùng node trước khi sang node khác
+SHARD_CONNECT_RETRIES = int(os.getenv("SHARD_CONNECT_RETRIES", "1") or 0)
+INGRESS_ADMIN_TOKEN = os.getenv("INGRESS_ADMIN_TOKEN", "")
+# Header Telegram gửi kèm khi setWebhook có secret_token: chuyển nguyên sang node
+_FORWARD_HEADERS = ("X-Telegram-Bot-Api-Secret-Token",)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# ============== VÒNG BĂM ==============
+class HashRing:
+    """
+    Consistent hashing: mỗi node có `vnodes` điểm trên vòng 64 bit, key thuộc node của
+    điểm đầu tiên theo chiều kim đồng hồ.
+    """
+
+    def __init__(self, nodes=(), vnodes=SHARD_VNODES):
+        self.vnodes = vnodes
+        self._nodes = []
+        self._points = ()
+        self._owners = ()
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return list(self._nodes)
+
+    def _rebuild(self):
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self._nodes for i in range(self.vnodes)
+        )
+        self._points = tuple(p for p, _ in points)
+        self._owners = tuple(n for _, n in points)
+
+    def add(self, node):
+        if node in self._nodes:
+            return False
+        self._nodes.append(node)
+        self._rebuild()
+        return True
+
+    def remove(self, node):
+        if node not in self._nodes:
+            return False
+        self._nodes.remove(node)
+        self._rebuild()
+        return True
+
+    def node_for(self, key):
+        if not self._points:
+            return None
+        i = bisect_right(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+    def successors(self, key):
+        """
+        Các node khác nhau theo thứ tự trên vòng kể từ key (node chính đứng đầu).
+        """
+        if not self._points:
+            return []
+        start = bisect_right(self._points, _hash(key))
+        seen = []
+        for k in range(len(self._points)):
+            node = self._owners[(start + k) % len(self._points)]
+            if node not in seen:
+                seen.append(node)
+                if len(seen) == len(self._nodes):
+                    break
+        return seen
+
+
+# ============== ĐỊNH TUYẾN + DRAIN ==============
+class _ChatSlot:
+    """
+    Hàng đợi tin của 1 chat: tin lấy số thứ tự (issued) lúc tới, chờ tới lượt (serving)
+    -> đúng thứ tự tới ingress (threading.Lock không đảm bảo FIFO khi nhiều tin cùng chờ).
+    """
+    __slots__ = ("node", "issued", "serving", "turn")
+
+    def __init__(self, node, lock):
+        self.node = node
+        self.issued = 0
+        self.serving = 0
+        self.turn = threading.Condition(lock)
+
+
+class ShardRouter:
+    def __init__(self, nodes=(), vnodes=SHARD_VNODES, drain_timeout=SHARD_DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self._ring = HashRing(nodes, vnodes=vnodes)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._chats = {}
+        self._stats = {}
+
+    def _count(self, node, field, n=1):
+        # gọi khi đang giữ self._lock
+        row = self._stats.get(node)
+        if row is None:
+            row = self._stats[node] = {"forwarded": 0, "errors": 0, "failover": 0}
+        row[field] += n
+
+    def dispatch(self, chat_key, send):
+        """
+        send(node) chuyển update tới node, ném requests.ConnectionError nếu không kết nối được
+        (node chưa nhận update -> an toàn thử node khác). Trả (node, kết quả của send).
+        Không còn node nào -> RuntimeError.
+        """
+        with self._lock:
+            slot = self._chats.get(chat_key)
+            if slot is None:
+                slot = self._chats[chat_key] = _ChatSlot(self._ring.node_for(chat_key), self._lock)
+            ticket = slot.issued
+            slot.issued += 1
+            while slot.serving != ticket:
+                slot.turn.wait()
+        try:
+            return self._send(chat_key, slot, send)
+        finally:
+            with self._lock:
+                slot.serving += 1
+                if slot.serving == slot.issued:
+                    self._chats.pop(chat_key, None)
+                    self._idle.notify_all()
+                else:
+                    slot.turn.notify_all()
+
+    def _send(self, chat_key, slot, send):
+        with self._lock:
+            candidates = [slot.node] if slot.node else []
+            candidates += [n for n in self._ring.successors(chat_key) if n not in candidates]
+        last_error = None
+        for node in candidates:
+            for attempt in range(1 + SHARD_CONNECT_RETRIES):
+                try:
+                    result = send(node)
+                    break
+                except requests.ConnectionError as e:
+                    last_error = e
+                    with self._lock:
+                        self._count(node, "errors")
+            else:
+                print(f"[WARN] Node {node} lỗi ({last_error.__class__.__name__}), thử node kế tiếp")
+                continue
+            with self._lock:
+                self._count(node, "forwarded")
+                if node != slot.node:
+                    self._count(node, "failover")
+                    slot.node = node
+            return node, result
+        raise RuntimeError(f"không node nào nhận được update: {last_error}")
+
+    def node_for(self, chat_key):
+        with self._lock:
+            slot = self._chats.get(chat_key)
+            return slot.node if slot else self._ring.node_for(chat_key)
+
+    def add_node(self, node):
+        with self._lock:
+            return self._ring.add(node)
+
+    def remove_node(self, node, drain=True, timeout=None):
+        """
+        Gỡ node khỏi vòng băm; drain=True thì chờ chat đang ghim vào node xử lý xong.
+        Trả số chat còn đang ghim vào node khi hết thời gian chờ (0 = drain xong).
+        """
+        timeout = self.drain_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            removed = self._ring.remove(node)
+            if not removed or not drain:
+                return self._pinned(node)
+            while True:
+                left = self._pinned(node)
+                remaining = deadline - time.monotonic()
+                if not left or remaining <= 0:
+                    return left
+                self._idle.wait(remaining)
+
+    def _pinned(self, node):
+        return sum(1 for slot in self._chats.values() if slot.node == node)
+
+    def status(self):
+        with self._lock:
+            nodes = self._ring.nodes
+            in_flight = {}
+            for slot in self._chats.values():
+                in_flight[slot.node] = in_flight.get(slot.node, 0) + 1
+            return {
+                "nodes": nodes,
+                "in_flight_chats": in_flight,
+                "stats": {node: dict(row) for node, row in sorted(self._stats.items())},
+            }
+
+
+def update_shard_key(update):
+    """
+    Khoá chia shard của 1 update Telegram: chat_id của tin nhắn, với inline / callback
+    không có chat thì theo id người gửi.
+    """
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = update.get(field)
+        if msg and (msg.get("chat") or {}).get("id") is not None:
+            return str(msg["chat"]["id"])
+    callback = update.get("callback_query")
+    if callback:
+        chat = ((callback.get("message") or {}).get("chat") or {}).get("id")
+        if chat is not None:
+            return str(chat)
+    for field in ("callback_query", "inline_query", "chosen_inline_result", "my_chat_member"):
+        obj = update.get(field)
+        if obj and (obj.get("from") or {}).get("id") is not None:
+            return str(obj["from"]["id"])
+    return f"update:{update.get('update_id', '')}"
+
+
+# ============== FLASK APP ==============
+app = Flask(__name__)
+ROUTER = ShardRouter(SHARD_NODES)
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64))
+
+if not SHARD_NODES:
+    print("[WARN] SHARD_NODES trống: ingress chưa có node nào, thêm qua POST /shard/nodes")
+
+
+@app.route("/webhook", methods=["POST"])
+def webhook():
+    body = request.get_data()
+    update = request.get_json(force=True, silent=True) or {}
+    headers = {"Content-Type": "application/json"}
+    for name in _FORWARD_HEADERS:
+        if name in request.headers:
+            headers[name] = request.headers[name]
+
+    def send(node):
+        return _session.post(f"{node}/webhook", data=body, headers=headers, timeout=SHARD_FORWARD_TIMEOUT)
+
+    try:
+        node, resp = ROUTER.dispatch(update_shard_key(update), send)
+    except RuntimeError as e:
+        print("[ERROR] Ingress:", e)
+        return jsonify({"ok": False, "error": "no node available"}), 502
+    except requests.Timeout as e:
+        # node đã nhận update và vẫn đang xử lý: không để Telegram gửi lại (trả lời 2 lần)
+        print("[WARN] Ingress: node trả lời quá hạn:", e)
+        return jsonify({"ok": True})
+    # trả nguyên phản hồi của node (inline query trả kết quả ngay trong response webhook)
+    return Response(resp.content, status=resp.status_code, content_type=resp.headers.get("Content-Type"))
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    status = ROUTER.status()
+    return jsonify({"role": "ingress", **status}), (200 if status["nodes"] else 503)
+
+
+@app.route("/shard/status", methods=["GET"])
+def shard_status():
+    return jsonify(ROUTER.status())
+
+
+@app.route("/shard/nodes", methods=["POST"])
+def shard_nodes():
+    token = request.headers.get("X-Admin-Token", "")
+    if not INGRESS_ADMIN_TOKEN or not hmac.compare_digest(token.encode(), INGRESS_ADMIN_TOKEN.encode()):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    payload = request.get_json(force=True, silent=True) or {}
+    result = {"ok": True}
+    if payload.get("add"):
+        node = str(payload["add"]).strip().rstrip("/")
+        result["added"] = ROUTER.add_node(node)
+        print(f"[INFO] Ingress: thêm node {node}")
+    if payload.get("remove"):
+        node = str(payload["remove"]).strip().rstrip("/")
+        t0 = time.monotonic()
+        timeout = payload.get("timeout")
+        left = ROUTER.remove_node(
+            node, drain=bool(payload.get("drain", True)), timeout=float(timeout) if timeout is not None else None
+        )
+        result["still_pinned"] = left
+        result["drain_s"] = round(time.monotonic() - t0, 3)
+        print(f"[INFO] Ingress: gỡ node {node}, còn {left} chat đang xử lý sau {result['drain_s']}s")
+    result.update(ROUTER.status())
+    return jsonify(result)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")), threaded=True)
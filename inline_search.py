@@ -0,0 +1,128 @@
+"""
+Gợi ý sản phẩm cho inline mode (`@bot antig` trong chat với khách).
+
+- Khoá: code, short_name, name, aliases dạng không dấu; với name/short_name/aliases
+  index thêm từ mỗi đầu từ ("welllab antigelm 01" -> "antigelm 01", "01") để gõ giữa tên vẫn ra.
+- Thay cho trie node-dict: mảng khoá đã sort + bisect cho cùng phép "mọi khoá có tiền tố q"
+  (1 đoạn liên tiếp), song song là array uint32 product id. Gọn RAM, pickle vào artifact được.
+- Xếp hạng theo độ phổ biến: lượt tra / chọn thực tế (PRODUCT_HITS, đếm trong process)
+  rồi tới số combo có chứa sản phẩm (độ phổ biến nền tính lúc build).
+Không gọi OpenAI, không quét cả catalog.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from catalog import register_index
+from fulltext import fold_text
+
+INLINE_FIELDS = ("code", "short_name", "name", "aliases")
+# Trường được index thêm từ mỗi đầu từ (code thì chỉ khớp từ đầu)
+_WORD_FIELDS = frozenset(("short_name", "name", "aliases"))
+
+# Tiền tố quá ngắn khớp nửa catalog: chỉ xét tối đa chừng này khoá đầu đoạn
+MAX_SCAN = 2000
+
+# Lượt tra theo mã sản phẩm trong process này (trả lời PRODUCT_DETAIL, chọn từ inline)
+PRODUCT_HITS = Counter()
+_hits_lock = threading.Lock()
+
+
+def record_product_hit(code, n=1):
+    if not code:
+        return
+    with _hits_lock:
+        PRODUCT_HITS[str(code)] += n
+
+
+def _word_suffixes(folded: str):
+    words = folded.split()
+    for i in range(len(words)):
+        yield " ".join(words[i:])
+
+
+class PrefixIndex:
+    __slots__ = ("keys", "item_ids", "items", "codes", "code_ids", "base_popularity", "by_base")
+
+    def __init__(self, items, base_popularity=None):
+        self.items = tuple(items)
+        self.codes = tuple(str(it.get("code") or "") for it in self.items)
+        self.code_ids = {}
+        for item_id, code in enumerate(self.codes):
+            self.code_ids.setdefault(code, item_id)
+        self.base_popularity = array("I", base_popularity or [0] * len(self.items))
+        # item id xếp theo độ phổ biến nền giảm dần (cho query rỗng)
+        self.by_base = array("I", sorted(range(len(self.items)), key=lambda i: -self.base_popularity[i]))
+        pairs = set()
+        for item_id, item in enumerate(self.items):
+            for field in INLINE_FIELDS:
+                values = item.get(field) or []
+                if not isinstance(values, (list, tuple)):
+                    values = [values]
+                for v in values:
+                    folded = fold_text(str(v))
+                    if not folded:
+                        continue
+                    keys = _word_suffixes(folded) if field in _WORD_FIELDS else (folded,)
+                    for key in keys:
+                        pairs.add((key, item_id))
+        pairs = sorted(pairs)
+        self.keys = tuple(k for k, _ in pairs)
+        self.item_ids = array("I", (i for _, i in pairs))
+
+    def popularity(self, item_id):
+        return (PRODUCT_HITS.get(self.codes[item_id], 0), self.base_popularity[item_id])
+
+    def search_ids(self, query: str, k=10):
+        """
+        Trả về tối đa k item id (vị trí trong items) có khoá bắt đầu bằng query, phổ biến nhất trước.
+        Query rỗng -> k item phổ biến nhất cả catalog.
+        """
+        q = fold_text(query)
+        if not q:
+            # top theo nền + các mã được tra nhiều nhất, không xếp hạng cả catalog
+            ids = set(self.by_base[:k])
+            ids.update(self.code_ids[c] for c, _ in PRODUCT_HITS.most_common(k) if c in self.code_ids)
+            return heapq.nlargest(k, ids, key=self.popularity)
+        start = bisect_left(self.keys, q)
+        # mọi khoá có tiền tố q nằm liền nhau sau start
+        end = bisect_left(self.keys, q + "\uffff", lo=start, hi=min(len(self.keys), start + MAX_SCAN))
+        ids = set(self.item_ids[start:end])
+        return heapq.nlargest(k, ids, key=self.popularity)
+
+    def search(self, query: str, k=10):
+        return [self.items[i] for i in self.search_ids(query, k=k)]
+
+
+@register_index("product_prefix")
+def build_product_prefix(snapshot):
+    in_combos = Counter()
+    for combo in snapshot.combos:
+        for item in combo.products:
+            in_combos[str(item.get("product_code") or item.get("code") or "")] += 1
+    return PrefixIndex(
+        snapshot.products,
+        base_popularity=[in_combos.get(str(p.code), 0) for p in snapshot.products],
+    )
+
+
+def search_inline(snapshot, query: str, k=10, with_ids=False):
+    """
+    with_ids: trả [(result id, sản phẩm)]; id duy nhất trong 1 snapshot kể cả khi
+    catalog có mã trùng (Telegram từ chối cả answerInlineQuery nếu 2 result trùng id).
+    """
+    index = snapshot.index("product_prefix")
+    if index is None:
+        return []
+    if with_ids:
+        return [(f"{index.codes[i]}-{i}"[-64:], index.items[i]) for i in index.search_ids(query, k=k)]
+    return index.search(query, k=k)
+
+
+def code_from_result_id(result_id):
+    """
+    "070717-41" -> "070717" (id do search_inline(with_ids=True) tạo).
+    """
+    return str(result_id or "").rsplit("-", 1)[0]
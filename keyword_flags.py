@@ -0,0 +1,80 @@
+"""
+Từ khoá điều khiển luồng (huỷ / xác nhận gửi tuyến trên, hỏi lịch sử, fallback phân loại
+intent khi không có OpenAI) nằm trong keywords.json, compile 1 lần lúc khởi động thành
+1 regex nhiều mẫu -> 1 lượt quét tin nhắn đã normalize trả về mọi cờ cùng lúc.
+
+keywords.json: {"<cờ>": {"match": "word" | "exact", "keywords": [...]}}
+- word: cờ bật khi tin chứa từ khoá như 1 cụm từ trọn vẹn ("huy" khớp "huỷ giúp em"
+  nhưng không khớp "chuyển khoản", "huyết áp" như phép `kw in text` trước đây)
+- exact: cờ bật khi cả tin đúng bằng 1 từ khoá ("ok", "đồng ý")
+Từ khoá được normalize_text lúc compile nên viết có dấu hay không dấu đều được.
+Bộ câu mẫu + cờ mong đợi ở bench/keyword_cases.json (kiểm tra: python bench/bench_keywords.py).
+
+Quét: regex (?<!\w)(?=(kw dài|...|kw ngắn)(?!\w)) thử ở mọi đầu từ, mỗi vị trí lấy từ khoá
+dài nhất; cờ của 1 từ khoá đã gộp sẵn cờ của mọi từ khoá là cụm từ đầu của nó
+("dong y gui" gộp cờ của "dong y"), nên kết quả giống kiểm tra từng từ khoá riêng.
+"""
+import os
+import re
+
+from catalog import BASE_DIR, safe_load_json
+from text_norm import normalize_text
+
+KEYWORDS_PATH = os.path.join(BASE_DIR, "keywords.json")
+_WORD_CHAR = re.compile(r"[0-9a-z]")
+
+
+class KeywordMatcher:
+    __slots__ = ("_regex", "_words", "_exact", "flags_known")
+
+    def __init__(self, groups):
+        words = {}
+        exact = {}
+        for flag, spec in groups.items():
+            if isinstance(spec, list):
+                spec = {"keywords": spec}
+            target = exact if spec.get("match") == "exact" else words
+            for kw in spec.get("keywords") or []:
+                kw = normalize_text(str(kw))
+                if kw:
+                    target.setdefault(kw, set()).add(flag)
+        # khớp "dong y gui" thì "dong y" (cụm từ đầu, cùng vị trí) cũng khớp
+        for kw, flags in words.items():
+            for other, other_flags in words.items():
+                if other != kw and kw.startswith(other) and not _WORD_CHAR.match(kw[len(other)]):
+                    flags |= other_flags
+        self._words = {kw: frozenset(flags) for kw, flags in words.items()}
+        self._exact = {kw: frozenset(flags) for kw, flags in exact.items()}
+        self.flags_known = frozenset(groups)
+        self._regex = None
+        if self._words:
+            alternation = "|".join(re.escape(kw) for kw in sorted(self._words, key=len, reverse=True))
+            self._regex = re.compile(f"(?<![0-9a-z])(?=({alternation})(?![0-9a-z]))")
+
+    def match(self, text_norm: str) -> frozenset:
+        """
+        Mọi cờ khớp với tin đã normalize_text.
+        """
+        if not text_norm:
+            return frozenset()
+        flags = set(self._exact.get(text_norm, ()))
+        if self._regex is not None:
+            words = self._words
+            for kw in set(self._regex.findall(text_norm)):
+                flags |= words[kw]
+        return frozenset(flags)
+
+
+def load_matcher(path=KEYWORDS_PATH):
+    groups = safe_load_json(path, default={}) or {}
+    matcher = KeywordMatcher(groups)
+    if not groups:
+        print(f"[WARN] Không có từ khoá điều khiển ({path}), các cờ luôn tắt")
+    return matcher
+
+
+KEYWORDS = load_matcher()
+
+
+def keyword_flags(text_norm: str) -> frozenset:
+    return KEYWORDS.match(text_norm)
@@ -0,0 +1,196 @@
+"""
+Tìm kiếm gần đúng bằng TF-IDF ký tự 3-gram (NumPy).
+
+TVV hay gõ không dấu, viết tắt, sai chính tả ("bao tu", "tieu duong type 2", "antigem")
+nên so khớp chuỗi con (text_contains) không bắt được. Ở đây mỗi trường
+(code, tên, alias, tag...) của sản phẩm/combo là 1 dòng trong ma trận thưa TF-IDF
+trigram, chuẩn hoá L2. Chấm điểm 1 query = 1 phép nhân ma trận thưa x vector
+(gom bằng np.bincount theo cột của query), sau đó lấy max theo từng sản phẩm/combo.
+
+Ma trận lưu dạng CSC (mỗi trigram -> các dòng chứa nó) bằng mảng int32/float32:
+khoảng 8 byte / phần tử khác 0. Ngân sách bộ nhớ: catalog hiện tại ~0.1 MB,
+10k SKU ~2M phần tử ~16 MB (đo bằng bench/bench_ngram.py).
+NumPy là tuỳ chọn: không cài thì index = None và hàm search trả list rỗng.
+"""
+from math import log
+
+# NumPy import lười (~100ms) để không làm chậm lúc khởi động, xem _numpy()
+np = None
+_numpy_checked = False
+
+from catalog import register_index
+from fulltext import fold_text
+
+PRODUCT_NGRAM_FIELDS = ("code", "name", "short_name", "aliases", "health_tags", "main_health_tag")
+COMBO_NGRAM_FIELDS = ("name", "header_text", "aliases", "health_tags")
+
+# Dưới ngưỡng cosine này coi như không khớp
+NGRAM_MIN_SCORE = 0.35
+
+
+def _numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np
+
+
+def char_trigrams(text: str):
+    """
+    Trigram ký tự trên chuỗi không dấu, mỗi từ được đệm khoảng trắng 2 đầu
+    ("da day" -> " da", "da ", " day", "day", "ay ").
+    """
+    grams = []
+    for word in fold_text(text).replace("_", " ").split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _field_values(item, fields):
+    for field in fields:
+        value = item.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            for v in value:
+                if v:
+                    yield str(v)
+        else:
+            yield str(value)
+
+
+class NgramIndex:
+    """
+    entities: list item (product/combo dict). rows: (entity_id, text) đã sắp theo entity_id.
+    """
+
+    __slots__ = ("entities", "vocab", "idf", "col_ptr", "row_idx", "values", "entity_starts", "n_rows")
+
+    def __init__(self, entities, fields):
+        self.entities = tuple(entities)
+        rows = []
+        for entity_id, item in enumerate(self.entities):
+            for text in _field_values(item, fields):
+                rows.append((entity_id, text))
+
+        vocab = {}
+        row_grams = []
+        df = {}
+        for _, text in rows:
+            counts = {}
+            for g in char_trigrams(text):
+                counts[g] = counts.get(g, 0) + 1
+            row_grams.append(counts)
+            for g in counts:
+                df[g] = df.get(g, 0) + 1
+                if g not in vocab:
+                    vocab[g] = len(vocab)
+
+        n_rows = len(rows)
+        self.n_rows = n_rows
+        self.vocab = vocab
+        self.idf = np.zeros(len(vocab), dtype=np.float32)
+        for g, col in vocab.items():
+            self.idf[col] = log((1 + n_rows) / (1 + df[g])) + 1.0
+
+        # Gom theo cột (CSC)
+        cols, rws, vals = [], [], []
+        for row_id, counts in enumerate(row_grams):
+            weights = {vocab[g]: (1.0 + log(tf)) * float(self.idf[vocab[g]]) for g, tf in counts.items()}
+            norm = sum(w * w for w in weights.values()) ** 0.5 or 1.0
+            for col, w in weights.items():
+                cols.append(col)
+                rws.append(row_id)
+                vals.append(w / norm)
+
+        cols = np.asarray(cols, dtype=np.int32)
+        order = np.argsort(cols, kind="stable")
+        self.row_idx = np.asarray(rws, dtype=np.int32)[order]
+        self.values = np.asarray(vals, dtype=np.float32)[order]
+        self.col_ptr = np.zeros(len(vocab) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(cols, minlength=len(vocab)), out=self.col_ptr[1:])
+
+        # Vị trí dòng đầu tiên của mỗi entity (dùng cho np.maximum.reduceat)
+        entity_of_row = np.asarray([e for e, _ in rows], dtype=np.int32)
+        self.entity_starts = np.searchsorted(entity_of_row, np.arange(len(self.entities)))
+
+    def nbytes(self):
+        return int(self.row_idx.nbytes + self.values.nbytes + self.col_ptr.nbytes + self.idf.nbytes)
+
+    def query_vector(self, text: str):
+        grams = char_trigrams(text)
+        counts = {}
+        for g in grams:
+            col = self.vocab.get(g)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        if not counts:
+            return None, None
+        cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tfs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        w = (1.0 + np.log(tfs)) * self.idf[cols]
+        # chuẩn hoá theo toàn bộ trigram của query (kể cả trigram không có trong vocab)
+        n_unknown = len(grams) - int(tfs.sum())
+        norm = float(np.sqrt((w * w).sum() + n_unknown)) or 1.0
+        return cols, w / norm
+
+    def scores(self, text: str):
+        """
+        Cosine của query với từng entity (max theo các trường). None nếu query rỗng.
+        """
+        cols, qw = self.query_vector(text)
+        if cols is None or not self.n_rows:
+            return None
+        starts = self.col_ptr[cols]
+        lens = self.col_ptr[cols + 1] - starts
+        # chỉ số phần tử của tất cả các cột query, nối liền nhau
+        idx = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+        row_scores = np.bincount(
+            self.row_idx[idx],
+            weights=self.values[idx] * np.repeat(qw, lens),
+            minlength=self.n_rows,
+        )
+        return np.maximum.reduceat(row_scores, self.entity_starts)
+
+    def search(self, text: str, k=5, min_score=NGRAM_MIN_SCORE):
+        """
+        Trả về list (entity, score) giảm dần.
+        """
+        scores = self.scores(text)
+        if scores is None:
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.entities[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+@register_index("product_ngram")
+def build_product_ngram(snapshot):
+    if _numpy() is None or not snapshot.products:
+        return None
+    return NgramIndex(snapshot.products, PRODUCT_NGRAM_FIELDS)
+
+
+@register_index("combo_ngram")
+def build_combo_ngram(snapshot):
+    if _numpy() is None or not snapshot.combos:
+        return None
+    return NgramIndex(snapshot.combos, COMBO_NGRAM_FIELDS)
+
+
+def search_ngram(snapshot, kind: str, text: str, k=5, min_score=NGRAM_MIN_SCORE):
+    """
+    kind: "product" hoặc "combo". Trả về list (item, score), rỗng nếu không có NumPy.
+    """
+    index = snapshot.index(f"{kind}_ngram")
+    # index nạp từ artifact (unpickle) không đi qua builder nên phải gán np ở đây
+    if index is None or not text or _numpy() is None:
+        return []
+    return index.search(text, k=k, min_score=min_score)
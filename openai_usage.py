@@ -0,0 +1,99 @@
+"""
+Thống kê token / độ trễ của từng lượt gọi OpenAI, gộp theo (loại call, intent).
+
+prompt_tokens gồm cả cached_tokens (phần prefix provider cache lại, tính giá rẻ hơn),
+nên tỉ lệ cached / prompt cho biết prefix tĩnh có được cache không.
+Sự kiện không phải lượt gọi (model làm mất placeholder...) đếm riêng qua record_event,
+không cộng vào số lượt / lỗi của call.
+"""
+import threading
+
+_FIELDS = ("calls", "errors", "prompt_tokens", "cached_tokens", "completion_tokens", "latency_ms", "latency_ms_max")
+
+
+def usage_counts(usage):
+    """
+    (prompt, cached, completion) từ resp.usage của openai SDK, thiếu thì 0.
+    """
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return (
+        getattr(usage, "prompt_tokens", 0) or 0,
+        cached or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+
+class UsageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._events = {}
+
+    def record(self, call, intent, usage=None, latency_ms=0.0, error=False):
+        prompt, cached, completion = usage_counts(usage)
+        key = (call, intent or "-")
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = dict.fromkeys(_FIELDS, 0)
+            row["calls"] += 1
+            row["errors"] += 1 if error else 0
+            row["prompt_tokens"] += prompt
+            row["cached_tokens"] += cached
+            row["completion_tokens"] += completion
+            row["latency_ms"] += latency_ms
+            row["latency_ms_max"] = max(row["latency_ms_max"], latency_ms)
+
+    def record_event(self, call, event):
+        key = (call, event)
+        with self._lock:
+            self._events[key] = self._events.get(key, 0) + 1
+
+    def events(self):
+        with self._lock:
+            return dict(sorted(self._events.items()))
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(call=c, intent=i, **row) for (c, i), row in sorted(self._rows.items())]
+
+    def average_tokens(self, call):
+        """
+        Số token (prompt + completion) trung bình mỗi lượt thành công của loại call, chưa có thì 0.
+        """
+        calls = tokens = 0
+        with self._lock:
+            for (c, _), row in self._rows.items():
+                if c == call:
+                    calls += row["calls"] - row["errors"]
+                    tokens += row["prompt_tokens"] + row["completion_tokens"]
+        return tokens / calls if calls > 0 else 0
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+            self._events.clear()
+
+    def format_table(self):
+        rows = self.snapshot()
+        if not rows:
+            return "Chưa có lượt gọi OpenAI nào."
+        lines = ["call/intent: lượt | prompt (cached) | completion | ms tb/max"]
+        for r in rows:
+            avg = r["latency_ms"] / r["calls"] if r["calls"] else 0
+            lines.append(
+                f"{r['call']}/{r['intent']}: {r['calls']}"
+                f"{' (' + str(r['errors']) + ' lỗi)' if r['errors'] else ''}"
+                f" | {r['prompt_tokens']} ({r['cached_tokens']}) | {r['completion_tokens']}"
+                f" | {avg:.0f}/{r['latency_ms_max']:.0f}"
+            )
+        events = self.events()
+        if events:
+            lines.append("sự kiện: " + ", ".join(f"{c}/{e}: {n}" for (c, e), n in events.items()))
+        return "\n".join(lines)
+
+
+USAGE = UsageStats()
@@ -0,0 +1,299 @@
+"""
+Giá có cấu trúc từ price_text ("434.000/1 lọ", "135.000/30 Gói", "342.000/105g", "445.000/Lõi").
+
+- Parse 1 lần lúc build snapshot (index "prices"): (số tiền VNĐ, số lượng, đơn vị).
+  Dòng không đọc được giá nằm trong PriceIndex.unparsed (compile_catalog in cảnh báo).
+- Tổng giá combo = cộng giá từng sản phẩm trong combo (mỗi sản phẩm 1 đơn vị như price_text),
+  sản phẩm thiếu giá thì lấy giá ở products.json theo product_code, vẫn không có thì bỏ qua và ghi số
+  sản phẩm chưa tính.
+- Mảng giá đã sort (toàn bộ + theo nhóm/health tag) -> "dưới 500k", "từ 300k đến 1 triệu" trả
+  bằng bisect, không cần OpenAI.
+- Chỉ nhận là số tiền khi có đơn vị tiền ("500k", "1tr2"), hoặc số >= MIN_BARE_AMOUNT ("500.000")
+  VÀ tin có từ chỉ tiền (giá, tiền, rẻ, đắt, ngân sách) hay số khác có đơn vị tiền. Tin sức khoẻ
+  đầy số trần ("tiểu cầu dưới 150000", "trên 10000 IU", "hơn 10000 bước") và chạy trước phân
+  loại: đoán sai là trả danh sách giá thay câu trả lời. Số đứng trước đơn vị đếm (hộp, viên,
+  tuổi, tháng...) không bao giờ là tiền.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+from catalog import register_index
+from keyword_flags import KeywordMatcher
+from text_norm import fold_case
+
+_PRICE_RE = re.compile(
+    r"^\s*(\d{1,3}(?:[.,]\d{3})+|\d+)\s*(k|nghìn|ngàn|triệu|tr|đồng|đ|vnđ|vnd)?\s*"
+    r"(?:/\s*(\d+)?\s*(.*?))?\s*$"
+)
+_UNIT_MULTIPLIER = {"k": 1000, "nghìn": 1000, "ngàn": 1000, "triệu": 1000000, "tr": 1000000}
+
+# Câu hỏi khoảng giá, chạy trên tin đã normalize_text (không dấu)
+_AMOUNT = r"(\d+(?:[.,]\d+)*)\s*(k|nghin|ngan|trieu|tr|cu|dong|d|vnd)?(?:(?<=[a-z])(\d{1,3})(?!\d))?"
+_BETWEEN_RE = re.compile(
+    rf"(?<![0-9a-z])(?:tu|khoang tu|trong khoang)\s+{_AMOUNT}\s*(?:den|toi|-|->)\s*{_AMOUNT}(?![0-9a-z])"
+)
+_DASH_RE = re.compile(rf"(?<![0-9a-z.,]){_AMOUNT}\s*(?:-|den|toi)\s*{_AMOUNT}(?![0-9a-z])")
+_BOUND_RE = re.compile(
+    r"(?<![0-9a-z])(duoi|nho hon|it hon|khong qua|toi da|re hon|tren|lon hon|hon|tu|"
+    rf"khoang|tam|quanh|<=|>=|<|>)\s*{_AMOUNT}(?![0-9a-z])(\s+tro len|\s+tro xuong)?"
+)
+_TRAILING_RE = re.compile(rf"(?<![0-9a-z.,]){_AMOUNT}\s+(tro len|tro xuong|do lai)(?![0-9a-z])")
+_UPPER_WORDS = frozenset(("duoi", "nho hon", "it hon", "khong qua", "toi da", "re hon", "<", "<="))
+_AROUND_WORDS = frozenset(("khoang", "tam", "quanh"))
+# số ngay trước các từ này là số lượng / tuổi / thời gian, không phải tiền
+_COUNT_UNIT_RE = re.compile(
+    r"\s*(?:hop|vien|goi|lo|chai|tuyp|tui|cai|sp|san pham|lieu|lan|tuoi|thang|tuan|ngay|nam|"
+    r"gio|tieng|phut|nguoi|kg|g|mg|ml|cm)(?![0-9a-z])"
+)
+# số có đơn vị tiền ở bất kỳ đâu trong tin (trên bản normalize_text)
+_MONEY_AMOUNT_RE = re.compile(r"(?<![0-9a-z.,])\d+(?:[.,]\d+)*\s*(?:k|nghin|ngan|trieu|tr|cu|dong|d|vnd)(?![a-z])")
+# từ chỉ tiền, chạy trên fold_case (giữ dấu): "đắt"/"đồng" bỏ dấu trùng "đạt", "đông" nên chỉ
+# nhận dạng có dấu; gõ không dấu chỉ nhận gia / tien / re / ngan sach ("gia đình" không tính)
+_PRICE_WORD_RE = re.compile(
+    r"(?<!\w)(?:giá|tiền|rẻ|đắt|ngân sách|đồng|vnđ|vnd|tien|re|ngan sach|"
+    r"gia(?!\s+(?:đình|dinh|tăng|tang|vị|vi|hạn|han|sư|su)(?!\w)))(?!\w)"
+)
+_COMBO_WORD_RE = re.compile(r"(?<![0-9a-z])combo(?![0-9a-z])")
+AROUND_RATIO = 0.2
+# số không kèm đơn vị tiền nhỏ hơn mức này không tính là giá ("giá khoảng 400" -> hỏi OpenAI),
+# lớn hơn thì cần tin có từ chỉ tiền (_money_context)
+MIN_BARE_AMOUNT = 10000
+
+
+def parse_price(text):
+    """
+    "434.000/1 lọ" -> (434000, 1, "lọ"); "342.000/105g" -> (342000, 105, "g").
+    Không đọc được -> None.
+    """
+    if not text:
+        return None
+    m = _PRICE_RE.match(str(text).lower())
+    if not m:
+        return None
+    digits, unit_word, qty, unit = m.groups()
+    amount = int(re.sub(r"[.,]", "", digits)) * _UNIT_MULTIPLIER.get(unit_word or "", 1)
+    if amount <= 0:
+        return None
+    return amount, int(qty) if qty else 1, " ".join((unit or "").split())
+
+
+def format_vnd(amount):
+    return f"{amount:,}".replace(",", ".") + "đ"
+
+
+def _amount(digits, unit, tail, money_context):
+    """
+    Số tiền trong câu hỏi: "500k", "1 trieu", "1,5tr", "1tr2", "500.000".
+    Số trần dưới MIN_BARE_AMOUNT ("500", "2"), hoặc tin không nói tới tiền -> None.
+    """
+    if unit in ("k", "nghin", "ngan"):
+        mult = 1000
+    elif unit in ("tr", "trieu", "cu"):
+        mult = 1000000
+    else:
+        mult = 1
+    if mult > 1 and re.fullmatch(r"\d+[.,]\d{1,2}", digits):
+        value = float(digits.replace(",", "."))
+    else:
+        value = int(re.sub(r"[.,]", "", digits))
+    if tail and mult == 1000000:
+        # 1tr2 = 1.200.000, 1tr25 = 1.250.000
+        value += int(tail) / (10 ** len(tail))
+    amount = int(round(value * mult))
+    if not unit and (amount < MIN_BARE_AMOUNT or not money_context):
+        return None
+    return amount
+
+
+def _money_context(text_norm, text=None):
+    """
+    Tin có nói tới tiền: có số kèm đơn vị tiền, hoặc từ chỉ tiền (so trên text gốc nếu có).
+    """
+    if _MONEY_AMOUNT_RE.search(text_norm):
+        return True
+    return bool(_PRICE_WORD_RE.search(fold_case(text) if text else text_norm))
+
+
+def _count_follows(text_norm, m, first_group):
+    """
+    Ngay sau số tiền (nhóm first_group..first_group+2 của m) là đơn vị đếm: "2-3 hop", "60 tuoi".
+    """
+    end = max(m.end(g) for g in range(first_group, first_group + 3) if m.group(g) is not None)
+    return bool(_COUNT_UNIT_RE.match(text_norm, end))
+
+
+def parse_price_range(text_norm, text=None):
+    """
+    Khoảng giá trong câu hỏi (đã normalize_text) -> (lo, hi), hai đầu tính cả bằng;
+    không có đầu nào thì là None. Không thấy câu hỏi khoảng giá -> None.
+    text: tin gốc (còn dấu) để nhận "đắt", "đồng"; không có thì chỉ xét bản không dấu.
+    """
+    if not text_norm or not any(ch.isdigit() for ch in text_norm):
+        return None
+    money_context = _money_context(text_norm, text)
+    for regex in (_BETWEEN_RE, _DASH_RE):
+        m = regex.search(text_norm)
+        if m and not _count_follows(text_norm, m, 4):
+            b = _amount(*m.group(4, 5, 6), money_context)
+            # "300-500k": đơn vị chỉ viết ở số sau
+            unit = m.group(2) or m.group(5)
+            a = _amount(m.group(1), unit, m.group(3), money_context)
+            if a is not None and b is not None:
+                return (min(a, b), max(a, b))
+    lo = hi = None
+    for m in _BOUND_RE.finditer(text_norm):
+        word, digits, unit, tail, direction = m.groups()
+        amount = _amount(digits, unit, tail, money_context)
+        if amount is None or _count_follows(text_norm, m, 2):
+            continue
+        if word in _AROUND_WORDS:
+            lo, hi = int(amount * (1 - AROUND_RATIO)), int(amount * (1 + AROUND_RATIO))
+        elif word in _UPPER_WORDS or (direction and "xuong" in direction):
+            hi = amount
+        else:
+            lo = amount
+    if lo is None and hi is None:
+        for m in _TRAILING_RE.finditer(text_norm):
+            digits, unit, tail, direction = m.groups()
+            amount = _amount(digits, unit, tail, money_context)
+            if amount is None:
+                continue
+            if direction == "tro len":
+                lo = amount
+            else:
+                hi = amount
+    if lo is None and hi is None:
+        return None
+    return lo, hi
+
+
+def wants_combo(text_norm):
+    return bool(_COMBO_WORD_RE.search(text_norm or ""))
+
+
+class _SortedPrices:
+    __slots__ = ("amounts", "keys")
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.amounts = tuple(a for a, _ in pairs)
+        self.keys = tuple(k for _, k in pairs)
+
+    def between(self, lo=None, hi=None):
+        start = 0 if lo is None else bisect_left(self.amounts, lo)
+        end = len(self.amounts) if hi is None else bisect_right(self.amounts, hi)
+        return list(zip(self.amounts[start:end], self.keys[start:end]))
+
+
+class PriceIndex:
+    __slots__ = ("prices", "combo_totals", "products", "combos", "product_tags", "combo_tags", "tags", "unparsed")
+
+    def __init__(self, snapshot):
+        # theo vị trí trong snapshot.products (products.json có thể trùng mã)
+        prices = []
+        by_code = {}
+        self.combo_totals = {}
+        self.unparsed = []
+        product_pairs = []
+        by_tag = {}
+        for pos, p in enumerate(snapshot.products):
+            price = parse_price(p.get("price_text"))
+            prices.append(price)
+            if price is None:
+                self.unparsed.append(("product", str(p.code), p.get("name", ""), p.get("price_text") or ""))
+                continue
+            by_code.setdefault(str(p.code), price)
+            product_pairs.append((price[0], pos))
+            for tag in {p.get("group"), p.get("main_health_tag"), *(p.get("health_tags") or ())}:
+                if tag:
+                    by_tag.setdefault(tag, []).append((price[0], pos))
+        self.prices = tuple(prices)
+        self.products = _SortedPrices(product_pairs)
+        self.product_tags = {tag: _SortedPrices(pairs) for tag, pairs in by_tag.items()}
+
+        combo_pairs = []
+        by_tag = {}
+        for c in snapshot.combos:
+            cid = str(c.id)
+            total = counted = missing = 0
+            for item in c.get("products") or ():
+                price = parse_price(item.get("price_text"))
+                if price is None:
+                    code = str(item.get("product_code") or item.get("code") or "")
+                    price = by_code.get(code)
+                    if price is None:
+                        missing += 1
+                        self.unparsed.append(("combo", cid, item.get("name", ""), item.get("price_text") or ""))
+                        continue
+                total += price[0]
+                counted += 1
+            if not counted:
+                continue
+            self.combo_totals[cid] = (total, counted, missing)
+            combo_pairs.append((total, cid))
+            for tag in c.get("health_tags") or ():
+                by_tag.setdefault(tag, []).append((total, cid))
+        self.combos = _SortedPrices(combo_pairs)
+        self.combo_tags = {tag: _SortedPrices(pairs) for tag, pairs in by_tag.items()}
+
+        # "gan", "tim mach" (tên nhóm) + các cụm health_tags_map ("men gan cao" -> gan)
+        groups = {}
+        for tag in set(self.product_tags) | set(self.combo_tags):
+            groups.setdefault(tag, {"keywords": []})["keywords"].append(tag.replace("_", " "))
+        for phrase, tags in snapshot.health_tags_map.items():
+            for tag in tags if isinstance(tags, list) else [tags]:
+                if tag in groups:
+                    groups[tag]["keywords"].append(phrase)
+        self.tags = KeywordMatcher(groups)
+
+    def price(self, pos):
+        """
+        (số tiền, số lượng, đơn vị) của snapshot.products[pos] hoặc None.
+        """
+        return self.prices[pos]
+
+    def combo_total(self, combo_id):
+        """
+        (tổng tiền, số sản phẩm đã tính, số sản phẩm thiếu giá) hoặc None.
+        """
+        return self.combo_totals.get(str(combo_id))
+
+    def tags_in(self, text_norm):
+        return self.tags.match(text_norm)
+
+    def search(self, lo=None, hi=None, tags=(), combos=False):
+        """
+        [(giá, vị trí trong snapshot.products | id combo)] trong [lo, hi], rẻ trước.
+        Có tags -> chỉ trong các nhóm đó.
+        """
+        if not tags:
+            return (self.combos if combos else self.products).between(lo, hi)
+        table = self.combo_tags if combos else self.product_tags
+        seen = set()
+        results = []
+        for tag in tags:
+            sorted_prices = table.get(tag)
+            if sorted_prices is None:
+                continue
+            for amount, key in sorted_prices.between(lo, hi):
+                if key not in seen:
+                    seen.add(key)
+                    results.append((amount, key))
+        results.sort()
+        return results
+
+
+@register_index("prices")
+def build_price_index(snapshot):
+    index = PriceIndex(snapshot)
+    if index.unparsed:
+        print(f"[WARN] {len(index.unparsed)} dòng giá không đọc được (price_text), bỏ khỏi index giá")
+    return index
+
+
+def describe_range(lo, hi):
+    if lo is not None and hi is not None:
+        return f"từ {format_vnd(lo)} đến {format_vnd(hi)}"
+    if hi is not None:
+        return f"dưới {format_vnd(hi)}"
+    return f"từ {format_vnd(lo)} trở lên"
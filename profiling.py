@@ -0,0 +1,404 @@
+"""
+Profile theo yêu cầu khi độ trễ tăng bất thường (tuyến trên /profile hoặc POST /debug/profile).
+
+- cpu: cProfile cho N request tới hoặc T giây. Mỗi lúc chỉ profile 1 request (cProfile không
+  chạy song song nhiều thread an toàn), request đến lúc đó chạy bình thường và được đếm là bỏ qua.
+  Báo cáo: top hàm theo thời gian tích luỹ (cpu-*.txt) + file pstats (cpu-*.prof, mở bằng snakeviz).
+- sample: thread lấy mẫu stack các thread đang xử lý request mỗi PROFILE_SAMPLE_INTERVAL giây
+  (sys._current_frames, request không bị chậm thêm) -> collapsed stacks (sample-*.collapsed,
+  dùng với flamegraph.pl / speedscope) + top hàm tự chiếm thời gian.
+- mem: bật tracemalloc trong T giây, chụp snapshot mỗi PROFILE_MEM_INTERVAL giây. Báo cáo (mem-*.txt):
+  kích thước các state global (dict/cache) qua từng lần chụp + top dòng code cấp phát tăng so với
+  lần chụp đầu.
+
+Mỗi lúc 1 phiên, tự dừng khi đủ N request / hết T giây (tối đa PROFILE_MAX_SECONDS) hoặc /profile stop.
+Tắt (mặc định): webhook chỉ kiểm tra Profiler.active, không cài hook profile / tracemalloc nào.
+Gunicorn nhiều worker: phiên chạy trong worker nhận lệnh; tên file có pid.
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005") or 0.005)
+PROFILE_MEM_INTERVAL = float(os.getenv("PROFILE_MEM_INTERVAL", "10") or 10)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "600") or 600)
+PROFILE_TOP = 30
+MODES = ("cpu", "sample", "mem")
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class _Session:
+    """
+    1 phiên profile: giới hạn số request / thời gian, ghi báo cáo khi dừng.
+    """
+    mode = ""
+    wraps_requests = True
+
+    def __init__(self, profiler, requests=None, seconds=None):
+        self.profiler = profiler
+        self.requests_left = requests
+        self.seconds = seconds
+        self.started = time.time()
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.handled = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def path(self, suffix):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        return os.path.join(self.profiler.out_dir, f"{self.mode}-{os.getpid()}-{stamp}.{suffix}")
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def count_request(self):
+        """
+        Đếm 1 request xong; True khi đã đủ N request.
+        """
+        with self.lock:
+            self.handled += 1
+            if self.requests_left is None:
+                return False
+            self.requests_left -= 1
+            return self.requests_left <= 0
+
+    def start(self):
+        pass
+
+    def run(self, fn, args, kwargs):
+        return fn(*args, **kwargs)
+
+    def stop(self):
+        """
+        Dừng + ghi báo cáo, trả (các file đã ghi, tóm tắt).
+        """
+        return [], ""
+
+    def describe(self):
+        limit = []
+        if self.requests_left is not None:
+            limit.append(f"còn {self.requests_left} request")
+        if self.deadline is not None:
+            limit.append(f"còn {max(0, self.deadline - time.monotonic()):.0f}s")
+        return f"{self.mode}: đã chạy {time.time() - self.started:.0f}s, {self.handled} request ({', '.join(limit)})"
+
+
+class _CpuSession(_Session):
+    mode = "cpu"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = None
+        self.busy = threading.Lock()
+
+    def run(self, fn, args, kwargs):
+        if not self.busy.acquire(blocking=False):
+            with self.lock:
+                self.skipped += 1
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fn, *args, **kwargs)
+        finally:
+            self.busy.release()
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(prof)
+                else:
+                    self.stats.add(prof)
+
+    def stop(self):
+        with self.lock:
+            stats = self.stats
+        if stats is None:
+            return [], "cpu: chưa profile được request nào."
+        prof_path = self.path("prof")
+        stats.dump_stats(prof_path)
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        report_path = self.path("txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"{self.describe()}, bỏ qua {self.skipped} request (đang profile request khác)\n\n")
+            f.write(out.getvalue())
+        top = Counter({
+            f"{os.path.basename(fn[0])}:{fn[2]}": row[3] for fn, row in stats.stats.items()
+            if not fn[0].startswith("~")
+        })
+        summary = "\n".join(f"{name}: {t * 1000:.0f} ms" for name, t in top.most_common(5))
+        return [report_path, prof_path], f"Top thời gian tích luỹ:\n{summary}"
+
+
+class _SampleSession(_Session):
+    mode = "sample"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stacks = Counter()
+        self.samples = 0
+        self.threads = set()
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        self.sampler = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+        self.sampler.start()
+
+    def _loop(self):
+        interval = self.profiler.sample_interval
+        while not self.stopped.wait(interval):
+            if self.expired():
+                self.profiler.stop(reason="hết thời gian")
+                return
+            idents = tuple(self.threads)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[_collapse(frame)] += 1
+                    self.samples += 1
+
+    def run(self, fn, args, kwargs):
+        ident = threading.get_ident()
+        self.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.threads.discard(ident)
+
+    def stop(self):
+        self.stopped.set()
+        if self.sampler is not None and self.sampler is not threading.current_thread():
+            self.sampler.join(timeout=1)
+        if not self.samples:
+            return [], "sample: chưa lấy được mẫu nào (không có request trong lúc chạy)."
+        path = self.path("collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        leaf = Counter()
+        for stack, n in self.stacks.items():
+            leaf[stack.rsplit(";", 1)[-1]] += n
+        ms = self.profiler.sample_interval * 1000
+        summary = "\n".join(
+            f"{name}: {n / self.samples * 100:.0f}% (~{n * ms:.0f} ms)" for name, n in leaf.most_common(5)
+        )
+        return [path], f"{self.samples} mẫu, hàm đang chạy nhiều nhất:\n{summary}"
+
+
+class _MemSession(_Session):
+    mode = "mem"
+    wraps_requests = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.was_tracing = tracemalloc.is_tracing()
+        self.first = None
+        self.rows = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _checkpoint(self):
+        current, peak = tracemalloc.get_traced_memory()
+        gauges = {}
+        for name, fn in self.profiler.gauges.items():
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = f"lỗi: {e}"
+        self.rows.append((time.time() - self.started, current, peak, gauges))
+
+    def start(self):
+        if not self.was_tracing:
+            tracemalloc.start()
+        self.first = tracemalloc.take_snapshot()
+        self._checkpoint()
+        self.thread = threading.Thread(target=self._loop, name="profile-mem", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        interval = min(self.profiler.mem_interval, self.seconds or self.profiler.mem_interval)
+        while not self.stopped.wait(interval):
+            self._checkpoint()
+            if self.expired():
+                self.profiler.stop(reason="hết thời gian")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self._checkpoint()
+        last = tracemalloc.take_snapshot()
+        if not self.was_tracing:
+            tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = last.filter_traces(ignore).compare_to(self.first.filter_traces(ignore), "lineno")
+        growth = [d for d in diff if d.size_diff > 0][:PROFILE_TOP]
+
+        path = self.path("txt")
+        names = list(self.profiler.gauges)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("State global theo thời gian (số phần tử)\n")
+            f.write("\t".join(["giây", "tracemalloc MB", "đỉnh MB", *names]) + "\n")
+            for elapsed, current, peak, gauges in self.rows:
+                f.write("\t".join([
+                    f"{elapsed:.0f}", f"{current / 1e6:.2f}", f"{peak / 1e6:.2f}",
+                    *(str(gauges.get(n, "")) for n in names),
+                ]) + "\n")
+            f.write(f"\nTop {PROFILE_TOP} dòng cấp phát tăng so với lần chụp đầu\n")
+            for d in growth:
+                f.write(f"{d}\n")
+
+        first_gauges, last_gauges = self.rows[0][3], self.rows[-1][3]
+        changed = [
+            f"{n}: {first_gauges.get(n)} -> {last_gauges.get(n)}" for n in names
+            if first_gauges.get(n) != last_gauges.get(n)
+        ]
+        top = "\n".join(
+            f"{os.path.basename(d.traceback[0].filename)}:{d.traceback[0].lineno}: +{d.size_diff / 1024:.0f} KB"
+            for d in growth[:5]
+        )
+        summary = (
+            f"tracemalloc {self.rows[0][1] / 1e6:.1f} -> {self.rows[-1][1] / 1e6:.1f} MB\n"
+            + ("State tăng/giảm: " + "; ".join(changed) if changed else "State global không đổi")
+            + (f"\nTop tăng:\n{top}" if top else "")
+        )
+        return [path], summary
+
+
+_SESSIONS = {"cpu": _CpuSession, "sample": _SampleSession, "mem": _MemSession}
+
+
+class Profiler:
+    """
+    gauges: {tên: hàm trả kích thước} của các state global cần theo dõi ở chế độ mem.
+    on_report(text): gọi khi 1 phiên dừng (ví dụ gửi tóm tắt cho tuyến trên).
+    """
+
+    def __init__(self, out_dir, gauges=None, on_report=None,
+                 sample_interval=PROFILE_SAMPLE_INTERVAL, mem_interval=PROFILE_MEM_INTERVAL):
+        self.out_dir = out_dir
+        self.gauges = dict(gauges or {})
+        self.on_report = on_report
+        self.sample_interval = sample_interval
+        self.mem_interval = mem_interval
+        self.active = False  # webhook chỉ đọc cờ này khi không profile
+        self._session = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def start(self, mode, requests=None, seconds=None):
+        """
+        Bắt đầu 1 phiên, trả câu báo kết quả. Không ghi gì ra đĩa cho tới khi dừng.
+        """
+        if mode not in MODES:
+            return f"Chế độ không hợp lệ: {mode} (chọn {', '.join(MODES)})"
+        requests = int(requests) if requests else None
+        if mode == "mem" and not seconds:
+            seconds = 60
+        if not requests and not seconds:
+            seconds = 30
+        seconds = min(float(seconds), PROFILE_MAX_SECONDS) if seconds else None
+        with self._lock:
+            if self._session is not None:
+                return f"Đang có phiên {self._session.describe()}. Dừng trước: /profile stop"
+            os.makedirs(self.out_dir, exist_ok=True)
+            session = _SESSIONS[mode](self, requests=requests, seconds=seconds)
+            session.start()
+            self._session = session
+            self.active = session.wraps_requests
+            if seconds and mode == "cpu":
+                # cpu không có thread riêng: hẹn giờ dừng kể cả khi không còn request nào
+                self._timer = threading.Timer(seconds, self.stop, kwargs={"reason": "hết thời gian"})
+                self._timer.daemon = True
+                self._timer.start()
+        print(f"[INFO] Bật profile {session.describe()}")
+        return f"Đã bật profile {session.describe()}"
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Chạy 1 request trong phiên đang bật (gọi khi active).
+        """
+        session = self._session
+        if session is None or not session.wraps_requests:
+            return fn(*args, **kwargs)
+        try:
+            return session.run(fn, args, kwargs)
+        finally:
+            if session.count_request() or session.expired():
+                self.stop(reason="đủ số request" if not session.expired() else "hết thời gian")
+
+    def stop(self, reason="dừng tay"):
+        with self._lock:
+            session, self._session = self._session, None
+            self.active = False
+            timer, self._timer = self._timer, None
+        if session is None:
+            return "Không có phiên profile nào đang chạy."
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        try:
+            paths, summary = session.stop()
+        except Exception as e:
+            print("[ERROR] Ghi báo cáo profile:", e)
+            paths, summary = [], f"lỗi ghi báo cáo: {e}"
+        counted = f": {session.handled} request" if session.wraps_requests else ""
+        text = f"Profile {session.mode} đã dừng ({reason}){counted}.\n{summary}"
+        if paths:
+            text += "\nBáo cáo: " + ", ".join(paths)
+        print(f"[INFO] {text}")
+        if self.on_report is not None:
+            try:
+                self.on_report(text)
+            except Exception as e:
+                print("[WARN] Không gửi được báo cáo profile:", e)
+        return text
+
+    def status(self):
+        with self._lock:
+            session = self._session
+        return f"Đang profile {session.describe()}" if session else "Không có phiên profile nào đang chạy."
+
+
+def parse_profile_command(text):
+    """
+    "/profile cpu 50" -> ("cpu", 50 request, None); "/profile sample 30s" -> ("sample", None, 30);
+    "/profile stop" -> ("stop", None, None); "/profile" -> ("status", None, None).
+    """
+    parts = text.split()[1:]
+    if not parts:
+        return "status", None, None
+    mode = parts[0].lower()
+    requests = seconds = None
+    for arg in parts[1:]:
+        arg = arg.lower()
+        try:
+            if arg.endswith("s"):
+                seconds = float(arg[:-1])
+            elif arg.endswith("m"):
+                seconds = float(arg[:-1]) * 60
+            else:
+                requests = int(arg)
+        except ValueError:
+            return "invalid", None, None
+    return mode, requests, seconds
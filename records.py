@@ -0,0 +1,248 @@
+"""
+Bản ghi gọn cho catalog: ProductRecord / ComboRecord dùng __slots__ thay cho dict lồng nhau.
+
+- Các trường tìm kiếm cần (code, name, aliases, tags...) giữ trong RAM,
+  tag/nhóm được sys.intern, aliases/tags là tuple.
+- Các trường mô tả dài (benefits_text, ingredients_text, usage_text, notes_for_tvv)
+  nằm trong TextStore: 1 file nhị phân map bằng mmap + bảng offset, bản ghi chỉ giữ vị trí.
+  Chỉ đọc khi format_product_reply cần.
+- Vẫn hỗ trợ .get(key, default) / [key] như dict để code cũ chạy nguyên.
+"""
+import os
+import sys
+import mmap
+import tempfile
+from array import array
+
+PRODUCT_LONG_FIELDS = ("ingredients_text", "usage_text", "benefits_text", "notes_for_tvv")
+PRODUCT_FIELDS = (
+    "code", "name", "short_name", "brand", "form", "group", "price_text", "product_url",
+    "aliases", "health_tags", "main_health_tag", "search_keywords",
+)
+COMBO_FIELDS = ("id", "name", "aliases", "header_text", "duration_text", "health_tags", "combo_url")
+COMBO_ITEM_FIELDS = (
+    "product_code", "code", "name", "product_name", "price_text", "product_url",
+    "dose_text", "role_text", "optional_note",
+)
+
+# Trường có tập giá trị nhỏ, lặp lại nhiều -> intern
+_INTERN_FIELDS = frozenset(("brand", "form", "group", "main_health_tag"))
+
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", "") or tempfile.gettempdir()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _as_tuple(value, intern=False):
+    if not value:
+        return ()
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    if intern:
+        return tuple(_intern(str(v)) for v in value)
+    return tuple(value)
+
+
+# ============== TEXT STORE ==============
+class TextStore:
+    """
+    Kho chuỗi UTF-8 chỉ đọc. refs: array uint32 phẳng [offset0, length0, offset1, length1, ...].
+    buf có thể là bytes, mmap của file tạm, hoặc mmap của artifact đã compile (base = vị trí blob).
+    """
+
+    __slots__ = ("_buf", "_base", "refs")
+
+    def __init__(self, buf, refs, base=0):
+        self._buf = buf
+        self._base = base
+        self.refs = refs
+
+    @classmethod
+    def from_texts(cls, texts):
+        """
+        Ghi toàn bộ chuỗi vào 1 file tạm (unlink ngay, chỉ còn mmap giữ)
+        -> các trang chỉ nạp vào RAM khi thật sự đọc.
+        """
+        refs = array("I")
+        pos = 0
+        fd, path = tempfile.mkstemp(prefix="catalog-text-", dir=CATALOG_CACHE_DIR)
+        try:
+            # ghi từng chuỗi thẳng xuống file, không gom thành 1 bytes lớn trong RAM
+            with os.fdopen(fd, "wb") as f:
+                for t in texts:
+                    b = (t or "").encode("utf-8")
+                    refs.append(pos)
+                    refs.append(len(b))
+                    f.write(b)
+                    pos += len(b)
+            if not pos:
+                return cls(b"", refs)
+            with open(path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return cls(buf, refs)
+
+    def get(self, slot):
+        length = self.refs[2 * slot + 1]
+        if not length:
+            return ""
+        start = self._base + self.refs[2 * slot]
+        return self._buf[start:start + length].decode("utf-8")
+
+    def nbytes(self):
+        return len(self._buf) - self._base
+
+
+class _Record:
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is None else value
+        extra = self.extra
+        if extra and key in extra:
+            return extra[key]
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def to_dict(self):
+        d = {}
+        for f in self._fields:
+            v = getattr(self, f)
+            if isinstance(v, tuple):
+                v = [x.to_dict() if isinstance(x, _Record) else x for x in v]
+            d[f] = v
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {getattr(self, self._fields[0])!r}>"
+
+    def __reduce__(self):
+        # __setattr__ bị khoá nên tự khôi phục slot khi unpickle (artifact compile sẵn)
+        cls = type(self)
+        return (_restore_record, (cls, tuple(getattr(self, s) for s in cls.__slots__)))
+
+
+def _restore_record(cls, values):
+    obj = cls.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        object.__setattr__(obj, name, value)
+    return obj
+
+
+_MISSING = object()
+
+
+# ============== SẢN PHẨM ==============
+class ProductRecord(_Record):
+    __slots__ = PRODUCT_FIELDS + ("extra", "_store", "_text_slot")
+    _fields = PRODUCT_FIELDS + PRODUCT_LONG_FIELDS
+
+    def __init__(self, data, store=None, text_slot=0):
+        for f in PRODUCT_FIELDS:
+            v = data.get(f)
+            if f in ("aliases", "search_keywords"):
+                v = _as_tuple(v)
+            elif f == "health_tags":
+                v = _as_tuple(v, intern=True)
+            elif f in _INTERN_FIELDS:
+                v = _intern(v)
+            elif v is None:
+                v = ""
+            object.__setattr__(self, f, v)
+        extra = {k: v for k, v in data.items() if k not in self._fields}
+        object.__setattr__(self, "extra", extra or None)
+        object.__setattr__(self, "_store", store)
+        # vị trí trường dài đầu tiên của sản phẩm này trong store.refs
+        object.__setattr__(self, "_text_slot", text_slot)
+
+    def __getattr__(self, name):
+        # Chỉ gọi khi không có slot: trường dài đọc từ store
+        if name in PRODUCT_LONG_FIELDS:
+            return self.long_text(name)
+        raise AttributeError(name)
+
+    def long_text(self, field):
+        if self._store is None:
+            return ""
+        return self._store.get(self._text_slot + PRODUCT_LONG_FIELDS.index(field))
+
+
+def build_product_records(products, store=None):
+    """
+    products: list dict. Trả về (tuple ProductRecord, TextStore).
+    Truyền store (vd từ artifact đã compile) thì không tạo file tạm.
+    """
+    products = [p for p in products if isinstance(p, dict)]
+    if store is None:
+        store = TextStore.from_texts(p.get(f) or "" for p in products for f in PRODUCT_LONG_FIELDS)
+    n = len(PRODUCT_LONG_FIELDS)
+    records = tuple(ProductRecord(p, store, i * n) for i, p in enumerate(products))
+    return records, store
+
+
+# ============== COMBO ==============
+class ComboItemRecord(_Record):
+    __slots__ = COMBO_ITEM_FIELDS + ("extra",)
+    _fields = COMBO_ITEM_FIELDS
+
+    def __init__(self, data):
+        for f in COMBO_ITEM_FIELDS:
+            v = data.get(f)
+            object.__setattr__(self, f, _intern(v) if f in ("product_code", "code") else v)
+        extra = {k: v for k, v in data.items() if k not in self._fields}
+        object.__setattr__(self, "extra", extra or None)
+
+
+class ComboRecord(_Record):
+    __slots__ = COMBO_FIELDS + ("products", "extra")
+    _fields = COMBO_FIELDS + ("products",)
+
+    def __init__(self, data):
+        for f in COMBO_FIELDS:
+            v = data.get(f)
+            if f == "aliases":
+                v = _as_tuple(v)
+            elif f == "health_tags":
+                v = _as_tuple(v, intern=True)
+            elif v is None:
+                v = ""
+            object.__setattr__(self, f, v)
+        items = data.get("products") or []
+        object.__setattr__(
+            self, "products", tuple(ComboItemRecord(x) for x in items if isinstance(x, dict))
+        )
+        extra = {k: v for k, v in data.items() if k not in self._fields}
+        object.__setattr__(self, "extra", extra or None)
+
+
+def build_combo_records(combos):
+    return tuple(ComboRecord(c) for c in combos if isinstance(c, dict))
+
+
+def _readonly(self, key, value):
+    raise AttributeError("Bản ghi catalog là bất biến")
+
+
+for _cls in (ProductRecord, ComboItemRecord, ComboRecord):
+    _cls.__setattr__ = _readonly
@@ -0,0 +1,207 @@
+"""
+Nhắc lịch cho TVV (hẹn hỏi lại khách, nhắc khách uống đều...).
+
+- Nguồn sự thật là bảng reminders (SQLite, bot_store); trong RAM chỉ có heap (due_at, id)
+  -> thêm 1 lịch O(log n), lấy lịch gần nhất O(1), vài chục nghìn lịch chờ vẫn nhẹ.
+- 1 thread chờ tới lịch gần nhất (Condition, có thêm lịch sớm hơn thì được đánh thức).
+- Không gửi trùng: trước khi gửi phải "nhận" lịch bằng UPDATE pending -> sending
+  (chỉ 1 process thắng). Process chết giữa lúc gửi thì lịch đó thành unknown, không gửi lại.
+- Mỗi RESYNC_INTERVAL giây nạp thêm lịch do process khác tạo (gunicorn nhiều worker,
+  worker đã chết), lịch đã huỷ chỉ bị bỏ qua khi tới giờ (claim thất bại).
+- Gửi qua TelegramSender với limiter riêng REMINDER_RATE tin/giây (dưới limiter chung).
+"""
+import os
+import re
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta, timezone
+
+from telegram_sender import RateLimiter
+
+REMINDER_RATE = float(os.getenv("REMINDER_RATE", "10") or 10)
+RESYNC_INTERVAL = 300
+# lịch kẹt ở "sending" lâu hơn chừng này coi như process đã chết
+STUCK_AFTER = 120
+
+
+class ReminderScheduler:
+    def __init__(self, store, sender, rate=REMINDER_RATE):
+        self.store = store
+        self.sender = sender
+        self.limiter = RateLimiter(rate)
+        self._heap = []
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.fired = 0
+
+    # ===== API =====
+    def add(self, chat_id, text, due_at, interval_s=0, repeat_left=0):
+        rid = self.store.add_reminder(chat_id, text, due_at, interval_s, repeat_left)
+        self._push(due_at, rid)
+        return rid
+
+    def cancel(self, rid, chat_id):
+        # còn nằm trong heap, tới giờ claim thất bại thì bỏ qua
+        return self.store.cancel_reminder(rid, chat_id)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self.store.expire_stuck_reminders(time.time() - STUCK_AFTER)
+        self._load(self.store.pending_reminders())
+        self._thread = threading.Thread(target=self._loop, name="reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def pending(self):
+        return len(self._heap)
+
+    # ===== NỘI BỘ =====
+    def _push(self, due_at, rid):
+        with self._cond:
+            if rid in self._queued:
+                return
+            self._queued.add(rid)
+            heapq.heappush(self._heap, (due_at, rid))
+            if self._heap[0][1] == rid:
+                self._cond.notify()
+
+    def _load(self, rows):
+        with self._cond:
+            fresh = [(due, rid) for due, rid in rows if rid not in self._queued]
+            if not fresh:
+                return
+            self._queued.update(rid for _, rid in fresh)
+            self._heap.extend(fresh)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def _next_due(self):
+        """
+        Chờ tới khi có lịch đến hạn. Trả về id hoặc None (dừng / tới lúc resync).
+        """
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    _, rid = heapq.heappop(self._heap)
+                    self._queued.discard(rid)
+                    return rid
+                wait = RESYNC_INTERVAL if not self._heap else min(self._heap[0][0] - now, RESYNC_INTERVAL)
+                if not self._cond.wait(wait) and wait == RESYNC_INTERVAL:
+                    return None
+            return None
+
+    def _loop(self):
+        last_sync = time.time()
+        while not self._stopped:
+            try:
+                rid = self._next_due()
+                if rid is not None:
+                    self._fire(rid)
+                if time.time() - last_sync >= RESYNC_INTERVAL:
+                    last_sync = time.time()
+                    self.store.expire_stuck_reminders(last_sync - STUCK_AFTER)
+                    self._load(self.store.pending_reminders(before=last_sync + 2 * RESYNC_INTERVAL))
+            except Exception as e:
+                print("[ERROR] Scheduler nhắc lịch lỗi:", e)
+                time.sleep(1)
+
+    def _fire(self, rid):
+        row = self.store.claim_reminder(rid)
+        if row is None:
+            return  # đã huỷ hoặc process khác đã gửi
+        rid, chat_id, text, due_at, interval_s, repeat_left = row
+        if interval_s > 0 and repeat_left > 0:
+            # lần kế tiếp là 1 lịch mới, tạo ngay khi nhận lịch này (chỉ 1 process nhận được)
+            self.add(chat_id, text, due_at + interval_s, interval_s, repeat_left - 1)
+        res = self.sender.send_message(chat_id, text, parse_mode=None, limiter=self.limiter)
+        self.store.finish_reminder(rid, res.ok, None if res.ok else f"{res.status} {res.error}"[:200])
+        if res.blocked:
+            self.store.mark_blocked([chat_id])
+        self.fired += 1
+
+
+# ============== PARSE THỜI GIAN ==============
+REMINDER_TZ = timezone(timedelta(hours=float(os.getenv("REMINDER_TZ_OFFSET", "7") or 7)))  # giờ VN
+
+_UNITS = {
+    "p": 60, "ph": 60, "phut": 60, "m": 60,
+    "h": 3600, "g": 3600, "gio": 3600,
+    "d": 86400, "n": 86400, "ngay": 86400,
+    "w": 604800, "t": 604800, "tuan": 604800,
+}
+_RELATIVE_RE = re.compile(r"^(\d{1,4})(ph|phut|p|m|h|gio|g|d|ngay|n|w|tuan|t)$")
+_CLOCK_RE = re.compile(r"^(\d{1,2})[:h](\d{2})$")
+_DATE_RE = re.compile(r"^(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?$")
+_REPEAT_RE = re.compile(r"^x(\d{1,3})$")
+DEFAULT_HOUR = 9
+
+
+def parse_when(tokens, now=None):
+    """
+    tokens: các từ đầu lệnh (không dấu, chữ thường). Hỗ trợ:
+      30p / 2h / 3d / 1w            (sau khoảng thời gian)
+      20:30                         (hôm nay, qua giờ thì ngày mai)
+      25/12 | 25/12/2025 [20:30]    (ngày, mặc định 9:00)
+    rồi tuỳ chọn x<N>: lặp thêm N lần cùng khoảng (chỉ với dạng tương đối).
+    Trả về (due_at, interval_s, repeat, số token đã dùng) hoặc None.
+    """
+    if not tokens:
+        return None
+    now = now or time.time()
+    local_now = datetime.fromtimestamp(now, REMINDER_TZ)
+    first = tokens[0]
+    interval = 0
+    used = 1
+
+    m = _RELATIVE_RE.match(first)
+    if m:
+        interval = int(m.group(1)) * _UNITS[m.group(2)]
+        due = now + interval
+    elif _CLOCK_RE.match(first):
+        hh, mm = map(int, _CLOCK_RE.match(first).groups())
+        if hh > 23 or mm > 59:
+            return None
+        dt = local_now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+        if dt.timestamp() <= now:
+            dt += timedelta(days=1)
+        due = dt.timestamp()
+    elif _DATE_RE.match(first):
+        day, month, year = _DATE_RE.match(first).groups()
+        year = int(year) if year else local_now.year
+        if year < 100:
+            year += 2000
+        hh, mm = DEFAULT_HOUR, 0
+        if len(tokens) > 1 and _CLOCK_RE.match(tokens[1]):
+            hh, mm = map(int, _CLOCK_RE.match(tokens[1]).groups())
+            used = 2
+        try:
+            dt = datetime(year, int(month), int(day), hh, mm, tzinfo=REMINDER_TZ)
+        except ValueError:
+            return None
+        due = dt.timestamp()
+        if due <= now:
+            return None
+    else:
+        return None
+
+    repeat = 0
+    if interval and len(tokens) > used:
+        r = _REPEAT_RE.match(tokens[used])
+        if r:
+            repeat = int(r.group(1))
+            used += 1
+    return due, interval, repeat, used
+
+
+def format_due(ts):
+    return datetime.fromtimestamp(ts, REMINDER_TZ).strftime("%H:%M %d/%m/%Y")
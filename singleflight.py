@@ -0,0 +1,93 @@
+"""
+Gộp các lượt gọi giống hệt nhau đang chạy cùng lúc (single-flight).
+
+Tuyến trên vừa đăng thông báo -> hàng chục TVV hỏi gần như cùng 1 câu trong vài giây.
+Lượt đầu tiên với 1 key (leader) gọi OpenAI thật, các lượt cùng key đến trong lúc đó
+chờ và dùng chung kết quả. Không phải cache: leader xong là key được xoá ngay.
+
+- Chờ có giới hạn: quá wait_timeout giây thì lượt chờ tự gọi riêng (không treo theo leader).
+- Leader lỗi -> mọi lượt đang chờ nhận lại đúng exception đó.
+- Đếm: leader (lượt gọi thật), coalesced (lượt tiết kiệm), timeouts, errors.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, wait_timeout=30.0):
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, group, field):
+        # gọi khi đang giữ self._lock
+        row = self._stats.get(group)
+        if row is None:
+            row = self._stats[group] = {"leader": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+        row[field] += 1
+
+    def do(self, key, fn, group="-"):
+        """
+        Chạy fn() 1 lần cho mỗi key đang bay, trả kết quả (dùng chung, đừng sửa tại chỗ)
+        hoặc ném lại exception của fn.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self._count(group, "leader")
+            else:
+                leader = False
+                call.waiters += 1
+
+        if not leader:
+            if call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self._count(group, "coalesced")
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            with self._lock:
+                self._count(group, "timeouts")
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._count(group, "errors")
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def snapshot(self):
+        with self._lock:
+            return {group: dict(row) for group, row in sorted(self._stats.items())}
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def format_stats(self):
+        rows = self.snapshot()
+        if not rows:
+            return "Single-flight: chưa có lượt gọi nào."
+        lines = ["Single-flight (gộp lượt gọi trùng): gọi thật | tiết kiệm | chờ quá hạn | lỗi"]
+        for group, r in rows.items():
+            lines.append(f"{group}: {r['leader']} | {r['coalesced']} | {r['timeouts']} | {r['errors']}")
+        return "\n".join(lines)
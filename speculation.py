@@ -0,0 +1,206 @@
+"""
+Tra cứu local chạy trước (speculative), song song với lượt phân loại OpenAI.
+
+Tin vừa tới là app.py đoán sẵn các tra cứu có thể cần (combo / sản phẩm theo vấn đề sức khoẻ
+nhắc trong tin, mã sản phẩm, FAQ kinh doanh...) và chạy chúng trên pool thread trong lúc chờ
+OpenAI. Phân loại xong, resolve_intent hỏi lại đúng tra cứu cần dùng:
+- trúng (hit): key đã chạy trước -> lấy kết quả (đang chạy dở thì chờ nốt)
+- trượt (miss): key không nằm trong dự đoán -> tra cứu như cũ
+- thừa (wasted): chạy trước mà không dùng tới (chưa chạy thì huỷ)
+Key = (loại tra cứu, tham số đã normalize_text). Tiết kiệm của 1 lượt trúng = thời gian tra cứu
+trừ phần còn phải chờ.
+
+Chỉ chạy hàm không có side-effect (ghi ngữ cảnh chat, đếm lượt xem... vẫn làm ở resolve_intent).
+Index "health_phrases" / "product_phrases": cụm vấn đề sức khoẻ (health_tags_map) / tên sản phẩm,
+tìm trong tin bằng 1 lượt quét (PhraseFinder).
+"""
+import re
+import time
+import threading
+
+from catalog import register_index
+from keyword_flags import KeywordMatcher
+from text_norm import normalize_text
+
+
+class _Pending:
+    __slots__ = ("future", "elapsed_ms")
+
+    def __init__(self):
+        self.future = None
+        self.elapsed_ms = 0.0
+
+
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds = {}
+        self.messages = 0
+        self.full_hits = 0
+
+    def _row(self, kind):
+        # gọi khi đang giữ self._lock
+        row = self._kinds.get(kind)
+        if row is None:
+            row = self._kinds[kind] = {"hits": 0, "misses": 0, "wasted": 0, "saved_ms": 0.0}
+        return row
+
+    def record(self, kind, field, saved_ms=0.0):
+        with self._lock:
+            row = self._row(kind)
+            row[field] += 1
+            row["saved_ms"] += saved_ms
+
+    def record_message(self, hits, misses):
+        with self._lock:
+            if hits or misses:
+                self.messages += 1
+                if not misses:
+                    self.full_hits += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "full_hits": self.full_hits,
+                "kinds": {kind: dict(row) for kind, row in sorted(self._kinds.items())},
+            }
+
+    def format_stats(self):
+        snap = self.snapshot()
+        if not snap["kinds"]:
+            return "Tra cứu trước (song song OpenAI): chưa có lượt nào."
+        rate = snap["full_hits"] / snap["messages"] * 100 if snap["messages"] else 0.0
+        lines = [
+            f"Tra cứu trước (song song OpenAI): {snap['messages']} tin, "
+            f"{snap['full_hits']} tin trúng hết ({rate:.0f}%)",
+            "loại: trúng | trượt | thừa | tiết kiệm",
+        ]
+        for kind, r in snap["kinds"].items():
+            lines.append(f"{kind}: {r['hits']} | {r['misses']} | {r['wasted']} | {r['saved_ms']:.1f} ms")
+        return "\n".join(lines)
+
+
+class SpeculativeLookups:
+    """
+    Tra cứu của 1 tin nhắn. start() trước lượt gọi OpenAI, get() khi đã biết intent,
+    finish() lúc trả lời xong (huỷ / đếm phần thừa).
+    """
+
+    def __init__(self, pool, stats, wrap=None):
+        self._pool = pool
+        self._stats = stats
+        self._wrap = wrap
+        self._pending = {}
+        self._used = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, key, fn):
+        if key in self._pending:
+            return
+        pending = self._pending[key] = _Pending()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return self._wrap(fn) if self._wrap else fn()
+            finally:
+                pending.elapsed_ms = (time.perf_counter() - started) * 1000
+
+        pending.future = self._pool.submit(run)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get(self, key, fn):
+        """
+        Kết quả của key: lấy từ lượt chạy trước nếu có, không thì gọi fn().
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            waited = time.perf_counter()
+            try:
+                result = pending.future.result()
+            except Exception as e:
+                print(f"[WARN] Tra cứu trước {key[0]} lỗi, tra lại:", e)
+                pending = None
+            else:
+                waited = (time.perf_counter() - waited) * 1000
+                with self._lock:
+                    self._used.add(key)
+                    self.hits += 1
+                self._stats.record(key[0], "hits", max(0.0, pending.elapsed_ms - waited))
+                return result
+        with self._lock:
+            self.misses += 1
+        self._stats.record(key[0], "misses")
+        return fn()
+
+    def finish(self):
+        for key, pending in self._pending.items():
+            if key not in self._used:
+                pending.future.cancel()
+                self._stats.record(key[0], "wasted")
+        self._stats.record_message(self.hits, self.misses)
+
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+_PAREN_RE = re.compile(r"\s*\(.*?\)")
+
+
+def loose_text(text_norm: str) -> str:
+    """
+    Bỏ dấu câu: "antigelm-01", "antigelm – 01" -> "antigelm 01".
+    """
+    return " ".join(_TOKEN_RE.findall(text_norm or ""))
+
+
+class PhraseFinder:
+    """
+    Tìm cụm của catalog (tên sản phẩm, cụm vấn đề sức khoẻ) trong tin đã normalize_text,
+    không phân biệt dấu câu. Trả (cụm đúng như trong tin, cụm của catalog), dài trước.
+    """
+    __slots__ = ("_matcher", "_canonical", "_spans")
+
+    def __init__(self, phrases):
+        self._canonical = {}
+        for phrase in phrases:
+            phrase = normalize_text(str(phrase))
+            key = loose_text(phrase)
+            if key and not key.isdigit():
+                self._canonical.setdefault(key, phrase)
+        self._matcher = KeywordMatcher({key: [key] for key in self._canonical})
+        self._spans = {}
+
+    def find(self, text_norm: str):
+        found = []
+        for key in sorted(self._matcher.match(loose_text(text_norm)), key=len, reverse=True):
+            regex = self._spans.get(key)
+            if regex is None:
+                regex = self._spans[key] = re.compile(
+                    r"(?<![0-9a-z])" + r"[^0-9a-z]+".join(key.split()) + r"(?![0-9a-z])"
+                )
+            m = regex.search(text_norm)
+            if m:
+                found.append((m.group(0), self._canonical[key]))
+        return found
+
+
+@register_index("health_phrases")
+def build_health_phrases(snapshot):
+    return PhraseFinder(snapshot.health_tags_map)
+
+
+@register_index("product_phrases")
+def build_product_phrases(snapshot):
+    """
+    Tên + alias sản phẩm, bỏ phần chú thích trong ngoặc ("ANTIGELM-01 (Ký sinh trùng)" -> "ANTIGELM-01").
+    """
+    phrases = []
+    for p in snapshot.products:
+        for name in (p.name, *p.aliases):
+            if name:
+                phrases.append(_PAREN_RE.sub("", str(name)))
+    return PhraseFinder(phrases)
@@ -0,0 +1,113 @@
+"""
+Đường gửi Telegram dùng chung: giới hạn tốc độ toàn cục + tự chờ khi bị 429.
+
+Telegram cho bot khoảng 30 tin/giây tổng (gửi hàng loạt), vượt là nhận 429 kèm
+retry_after. Mọi tin nhắn của bot (trả lời, broadcast, nhắc lịch) đi qua 1 RateLimiter
+chung; broadcast / nhắc lịch dùng thêm limiter riêng thấp hơn để luôn chừa chỗ cho
+câu trả lời TVV đang chờ.
+"""
+import time
+import threading
+
+import requests
+
+MAX_RETRIES = 3
+
+
+class RateLimiter:
+    """
+    Token bucket: rate token/giây, tối đa burst token dồn lại. acquire() chặn tới khi có token.
+    burst mặc định 1: tin cách đều nhau, không có giây nào vượt rate kể cả sau lúc rảnh.
+    """
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Telegram báo 429: không phát token nào trong seconds giây tới.
+        """
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+            self._updated = time.monotonic()
+
+
+class SendResult:
+    __slots__ = ("ok", "status", "error", "retry_after")
+
+    def __init__(self, ok, status=0, error="", retry_after=0):
+        self.ok = ok
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+    @property
+    def blocked(self):
+        # 403: TVV đã chặn bot / xoá tài khoản, 400 chat not found: chat không còn
+        return self.status == 403 or (self.status == 400 and "chat not found" in self.error)
+
+
+class TelegramSender:
+    def __init__(self, api_base, token, rate=30.0):
+        self.url = f"{api_base}/bot{token}/sendMessage"
+        self.limiter = RateLimiter(rate)
+        self._local = threading.local()
+
+    def _session(self):
+        # giữ kết nối keep-alive theo từng thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send_message(self, chat_id, text, parse_mode="HTML", reply_to_message_id=None,
+                     disable_web_page_preview=False, limiter=None):
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": disable_web_page_preview,
+        }
+        if reply_to_message_id:
+            payload["reply_to_message_id"] = reply_to_message_id
+
+        result = SendResult(False)
+        for _ in range(MAX_RETRIES):
+            if limiter is not None:
+                limiter.acquire()
+            self.limiter.acquire()
+            try:
+                resp = self._session().post(self.url, json=payload, timeout=15)
+            except Exception as e:
+                result = SendResult(False, 0, str(e))
+                time.sleep(1)
+                continue
+            if resp.status_code == 200:
+                return SendResult(True, 200)
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            retry_after = (body.get("parameters") or {}).get("retry_after", 0)
+            result = SendResult(False, resp.status_code, body.get("description") or resp.text[:200], retry_after)
+            if resp.status_code == 429:
+                self.limiter.pause(retry_after or 1)
+                continue
+            break
+        return result
@@ -0,0 +1,86 @@
+"""
+Chuẩn hoá chuỗi tiếng Việt dùng chung cho app và các index catalog.
+
+- Bỏ dấu bằng bảng str.translate tính sẵn 1 lần lúc import (chạy ở C), thay cho
+  NFD + vòng lặp Python gọi unicodedata.category từng ký tự.
+  Bảng phủ mọi chữ Latin có dấu (gồm đủ bảng chữ tiếng Việt, cả đ/Đ -> d) và xoá
+  dấu rời (U+0300–U+036F) để chuỗi đã ở dạng NFD (gõ từ macOS/iOS) cũng ra giống hệt.
+- normalize_text: chuỗi ngắn (tin nhắn, từ khoá) được nhớ LRU, cùng 1 từ khoá bị
+  chuẩn hoá hàng chục lần mỗi tin nhắn.
+- normalize_many: chuẩn hoá cả cột catalog trong 1 lượt lower() + translate().
+- fold_case: chữ thường + NFC, GIỮ dấu. Dùng khi bỏ dấu làm 2 câu khác nghĩa trùng nhau
+  ("bán"/"bạn", "tố cáo"/"to cao"): key gộp lượt gọi OpenAI, rule so khớp đúng dấu.
+"""
+import unicodedata
+from functools import lru_cache
+
+# Chuỗi dài hơn (mô tả sản phẩm) hiếm khi lặp lại, không đưa vào cache
+MEMO_MAX_LEN = 256
+MEMO_SIZE = 8192
+
+_COMBINING_MARKS = range(0x0300, 0x0370)
+# Latin-1 Supplement, Latin Extended-A/B, Latin Extended Additional (ạ ả ấ ầ ... ỹ)
+_LATIN_RANGES = (range(0x00C0, 0x0250), range(0x1E00, 0x1F00))
+
+
+def _build_table():
+    table = {cp: None for cp in _COMBINING_MARKS}
+    for block in _LATIN_RANGES:
+        for cp in block:
+            ch = chr(cp)
+            base = unicodedata.normalize("NFD", ch.lower())[0]
+            if base != ch and base.isascii():
+                table[cp] = base
+    # đ/Đ không tách được bằng NFD
+    table[ord("đ")] = "d"
+    table[ord("Đ")] = "d"
+    return table
+
+
+FOLD_TABLE = _build_table()
+_BATCH_SEP = "\x00"
+
+
+def _normalize(text: str) -> str:
+    return text.lower().translate(FOLD_TABLE).strip()
+
+
+_normalize_memo = lru_cache(maxsize=MEMO_SIZE)(_normalize)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chữ thường, bỏ dấu (đ -> d), bỏ khoảng trắng đầu/cuối. Dấu câu giữ nguyên.
+    """
+    if not text:
+        return ""
+    if len(text) <= MEMO_MAX_LEN:
+        return _normalize_memo(text)
+    return _normalize(text)
+
+
+def fold_case(text: str) -> str:
+    """
+    Chữ thường, NFC (dấu gõ rời trên macOS/iOS ra giống dấu dựng sẵn), gộp khoảng trắng.
+    """
+    if not text:
+        return ""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def normalize_many(texts):
+    """
+    Chuẩn hoá cả list chuỗi (vd 1 cột catalog) -> list cùng thứ tự, None/"" -> "".
+    Nối bằng \\x00 rồi lower + translate 1 lần thay vì gọi từng chuỗi.
+    """
+    texts = [t if isinstance(t, str) else ("" if t is None else str(t)) for t in texts]
+    if not texts:
+        return []
+    if any(_BATCH_SEP in t for t in texts):
+        return [_normalize(t) for t in texts]
+    joined = _BATCH_SEP.join(texts).lower().translate(FOLD_TABLE)
+    return [t.strip() for t in joined.split(_BATCH_SEP)]
+
+
+def normalize_cache_info():
+    return _normalize_memo.cache_info()